@@ -0,0 +1,99 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Several commands per host, one blast each versus one batch message.
+
+   usage: python blaster_batch.py [-n hosts] [-m commands] [-l milliseconds]
+              [-x milliseconds] [-k keyfile]
+
+   Sends ``commands`` commands to ``hosts`` servers of the stand-in DroneD
+   from blaster_fanout.py three ways: a separate blast per command, the way
+   orchestration scripts did it, and one batch message per host run in
+   sequential and in concurrent mode.  ``-l`` delays every response and
+   ``-x`` is the time the stand-in takes to run one command.  Reports the
+   run time, the prime and command requests made and the signatures
+   computed.
+"""
+
+import sys
+import time
+import getopt
+
+from blaster_fanout import standIn, privateKey, hosts
+from twisted.internet import reactor, defer
+from droned.clients.blaster import DroneBlaster, SEQUENTIAL, CONCURRENT
+
+COMMANDS = ['app status', 'app version', 'list', 'tasks', 'version']
+
+
+@defer.deferredGenerator
+def run(hostList, commands, key):
+    results = []
+    #one blast per command
+    blaster = DroneBlaster(hostList)
+    requests = errors = 0
+    started = time.time()
+    for command in commands:
+        wfd = defer.waitForDeferred(blaster(command, key, timeout=30.0))
+        yield wfd
+        errors += len([ v for v in wfd.getResult().values() if v['error'] ])
+        requests += blaster.attempts['prime'] + blaster.attempts['command']
+    results.append(('separate', time.time() - started, errors, requests,
+            len(commands) * len(hostList)))
+    for mode in (SEQUENTIAL, CONCURRENT):
+        blaster = DroneBlaster(hostList)
+        started = time.time()
+        wfd = defer.waitForDeferred(blaster(commands, key, timeout=30.0,
+                mode=mode))
+        yield wfd
+        result = wfd.getResult()
+        errors = len([ v for v in result.values() if v['error'] or \
+                len(v.get('results', ())) != len(commands) ])
+        results.append(('batch ' + mode, time.time() - started, errors,
+                blaster.attempts['prime'] + blaster.attempts['command'],
+                len(hostList)))
+    yield results
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'n:m:l:x:k:')
+    opts = dict(optList)
+    count = int(opts.get('-n', 200))
+    commands = COMMANDS[:int(opts.get('-m', 3))]
+    port = standIn(float(opts.get('-l', 20)) / 1000.0,
+            work=float(opts.get('-x', 10)) / 1000.0)
+    key = privateKey(opts.get('-k'))
+
+    def report(results):
+        sys.stdout.write('hosts : %d, commands : %s\n' % \
+                (count, ', '.join(commands)))
+        for name, elapsed, errors, requests, signatures in results:
+            sys.stdout.write('%-18s: %.3f seconds, %d errors, %d requests, ' \
+                    '%d signatures\n' % (name, elapsed, errors, requests,
+                    signatures))
+        reactor.stop()
+
+    def failed(failure):
+        failure.printTraceback()
+        reactor.stop()
+
+    reactor.callWhenRunning(lambda: run(hosts(count, port), commands, key
+            ).addCallbacks(report, failed))
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Blaster fan-out against many hosts served by a local stand-in DroneD.
+
+   usage: python blaster_fanout.py [-n hosts] [-w window,window...]
+              [-l milliseconds] [-k keyfile]
+
+   The stand-in answers ``/_getprime`` and ``/_command`` for every loopback
+   address 127.0.x.y, so each of the ``hosts`` looks like its own server.
+   Every response is delayed by ``milliseconds`` to look like a remote
+   host.  For each window size the benchmark reports the run time, how many
+   hosts failed, the most connections the stand-in saw at once and the per
+   phase latencies.  A window as large as the host list behaves like the
+   blaster did before it had a window.
+"""
+
+import os
+import sys
+import time
+import getopt
+import tempfile
+import subprocess
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY, '..', '..', 'droned', 'lib'))
+
+from twisted.internet import reactor, defer
+from twisted.web import server, resource, http
+from droned.clients.blaster import DroneBlaster
+from kitt.blaster import Serialize, Deserialize, MIMESerialize, CONCURRENT
+from kitt.util import unpackify
+from kitt import rsa
+import urllib
+
+MIME = 'application/droned-pickle'
+PRIMES = [ p for p in xrange(3, 20000, 2) \
+        if all(p % d for d in xrange(3, int(p ** 0.5) + 1, 2)) ]
+
+
+class Channel(http.HTTPChannel):
+    """counts the connections the stand-in has open, a new connection is
+       not read from for ``setup`` seconds to stand in for the round trips
+       of connecting over a real network
+    """
+    setup = 0.0
+
+    def connectionMade(self):
+        http.HTTPChannel.connectionMade(self)
+        stats['open'] += 1
+        stats['accepted'] += 1
+        stats['peak'] = max(stats['peak'], stats['open'])
+        if self.setup:
+            self.transport.pauseProducing()
+            reactor.callLater(self.setup, self.transport.resumeProducing)
+
+    def connectionLost(self, reason):
+        stats['open'] -= 1
+        http.HTTPChannel.connectionLost(self, reason)
+
+stats = {'open': 0, 'peak': 0, 'accepted': 0}
+
+
+class Delayed(resource.Resource):
+    isLeaf = True
+    latency = 0.0
+
+    def answer(self, request):
+        raise NotImplementedError()
+
+    def _respond(self, request):
+        if request.finished: return
+        try:
+            request.write(self.answer(request))
+        except Exception, e:
+            request.setResponseCode(500)
+            request.write(str(e))
+        request.finish()
+
+    def delay(self, request):
+        return self.latency
+
+    def render(self, request):
+        reactor.callLater(self.delay(request), self._respond, request)
+        return server.NOT_DONE_YET
+
+
+class Prime(Delayed):
+    """hands out primes per client address"""
+    def __init__(self, outstanding):
+        Delayed.__init__(self)
+        self.outstanding = outstanding
+        self.next = 0
+
+    def answer(self, request):
+        prime = PRIMES[self.next % len(PRIMES)]
+        self.next += 1
+        self.outstanding.setdefault(request.getClientIP(), set()).add(prime)
+        return str(prime)
+
+
+class Command(Delayed):
+    """checks the magic number and pretends to run the command, or every
+       command of a batch, each command takes ``work`` seconds
+    """
+    work = 0.0
+
+    def __init__(self, outstanding):
+        Delayed.__init__(self)
+        self.outstanding = outstanding
+
+    def message(self, request):
+        request.content.seek(0, 0)
+        return Deserialize().execute(MIME,
+                urllib.unquote(request.content.read()))
+
+    def delay(self, request):
+        message = self.message(request)
+        commands = len(message.get('commands', [None]))
+        if message['argstr'] == CONCURRENT:
+            commands = 1
+        return self.latency + self.work * commands
+
+    def answer(self, request):
+        message = self.message(request)
+        magic = abs(unpackify(message['magic']))
+        primes = self.outstanding.get(request.getClientIP(), set())
+        for prime in primes:
+            if magic % prime == 0: break
+        else:
+            raise AssertionError('Invalid Magic String')
+        primes.discard(prime)
+        response = {'description': 'pong', 'code': 0}
+        if 'commands' in message:
+            response['results'] = [ {'command': c, 'description': 'pong',
+                    'code': 0} for c in message['commands'] ]
+        return urllib.quote(Serialize().execute(MIME, response))
+
+
+def hosts(count, port):
+    return [ '127.0.%d.%d:%d' % (i // 250, i % 250 + 1, port) \
+            for i in xrange(count) ]
+
+
+@defer.deferredGenerator
+def run(hostList, windows, key):
+    results = []
+    for window in windows:
+        stats['peak'] = 0
+        blaster = DroneBlaster(hostList, window=window)
+        started = time.time()
+        wfd = defer.waitForDeferred(blaster('ping', key, timeout=30.0))
+        yield wfd
+        result = wfd.getResult()
+        elapsed = time.time() - started
+        failed = len([ v for v in result.values() if v['error'] ])
+        results.append((window, elapsed, failed, stats['peak'],
+                blaster.summary()))
+    yield results
+
+
+def standIn(latency=0.0, setup=0.0, work=0.0):
+    """listen with a stand-in DroneD on every loopback address
+
+       @return (int) port
+    """
+    Delayed.latency = latency
+    Channel.setup = setup
+    Command.work = work
+    outstanding = {}
+    root = resource.Resource()
+    root.putChild('_getprime', Prime(outstanding))
+    root.putChild('_command', Command(outstanding))
+    site = server.Site(root)
+    site.protocol = Channel
+    site.log = lambda request: None
+    return reactor.listenTCP(0, site, backlog=4096).getHost().port
+
+
+def privateKey(keyfile=None):
+    """load ``keyfile`` or a freshly generated key"""
+    if not keyfile:
+        keyfile = os.path.join(tempfile.mkdtemp(), 'bench.private')
+        subprocess.check_call(['openssl', 'genrsa', '-out', keyfile, '2048'],
+                stderr=open(os.devnull, 'w'))
+    return rsa.PrivateKey(keyfile)
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'n:w:l:k:')
+    opts = dict(optList)
+    count = int(opts.get('-n', 2000))
+    windows = [ int(w) for w in opts.get('-w', '%d,256,64' % count).split(',') ]
+    port = standIn(float(opts.get('-l', 20)) / 1000.0)
+    key = privateKey(opts.get('-k'))
+
+    def report(results):
+        sys.stdout.write('hosts : %d, %.0fms per response\n' % \
+                (count, Delayed.latency * 1000))
+        for window, elapsed, failed, peak, phases in results:
+            sys.stdout.write('window %5d: %.3f seconds, %d failed, ' \
+                    'peak %d connections\n' % (window, elapsed, failed, peak))
+            for name in ('prime', 'command', 'server'):
+                sys.stdout.write('    %-8s mean %.3fs p90 %.3fs max %.3fs ' \
+                        '(%d attempts)\n' % (name, phases[name]['mean'],
+                        phases[name]['p90'], phases[name]['max'],
+                        phases[name].get('attempts', phases[name]['count'])))
+        reactor.stop()
+
+    def failed(failure):
+        failure.printTraceback()
+        reactor.stop()
+
+    reactor.callWhenRunning(lambda: run(hosts(count, port), windows, key
+            ).addCallbacks(report, failed))
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Commands/sec of repeated blasts with and without keep-alive connections.
+
+   usage: python blaster_keepalive.py [-n hosts] [-r rounds]
+              [-l milliseconds] [-c milliseconds] [-k keyfile]
+
+   Polls ``hosts`` servers of the stand-in DroneD from blaster_fanout.py
+   ``rounds`` times in a row, the way status polling and rolling restarts
+   do, once with a new connection per request and once through the shared
+   keep-alive pool.  Reports commands/sec and how many connections the
+   stand-in had to accept.  ``-l`` delays every response and ``-c`` every
+   new connection, loopback connections are otherwise almost free.
+"""
+
+import sys
+import time
+import getopt
+
+from blaster_fanout import standIn, privateKey, hosts, stats
+from twisted.internet import reactor, defer
+from droned.clients.blaster import blast
+
+
+@defer.deferredGenerator
+def run(hostList, rounds, key):
+    results = []
+    for persistent in (False, True):
+        stats['accepted'] = 0
+        errors = 0
+        started = time.time()
+        for i in xrange(rounds):
+            wfd = defer.waitForDeferred(blast('ping', hostList, key,
+                    timeout=30.0, persistent=persistent))
+            yield wfd
+            errors += len([ v for v in wfd.getResult().values() \
+                    if v['error'] ])
+        results.append((persistent, time.time() - started, errors,
+                stats['accepted']))
+    yield results
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'n:r:l:c:k:')
+    opts = dict(optList)
+    count = int(opts.get('-n', 100))
+    rounds = int(opts.get('-r', 20))
+    port = standIn(float(opts.get('-l', 0)) / 1000.0,
+            float(opts.get('-c', 0)) / 1000.0)
+    key = privateKey(opts.get('-k'))
+
+    def report(results):
+        sys.stdout.write('hosts : %d x %d rounds\n' % (count, rounds))
+        for persistent, elapsed, errors, accepted in results:
+            sys.stdout.write('%-11s: %.3f seconds, %.1f commands/sec, ' \
+                    '%d errors, %d connections\n' % (persistent and \
+                    'keep-alive' or 'per request', elapsed,
+                    count * rounds / elapsed, errors, accepted))
+        reactor.stop()
+
+    def failed(failure):
+        failure.printTraceback()
+        reactor.stop()
+
+    reactor.callWhenRunning(lambda: run(hosts(count, port), rounds, key
+            ).addCallbacks(report, failed))
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
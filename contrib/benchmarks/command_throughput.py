@@ -0,0 +1,111 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Sustained commands/sec through a DroneD ``/_command`` resource.
+
+   usage: python command_throughput.py [-h host:port] [-k keyfile]
+              [-n commands] [-c concurrency] [command]
+
+   Keeps ``concurrency`` blaster sessions in flight against the target until
+   ``commands`` have completed and reports the sustained rate.  The default
+   command is ``ping`` so that the measurement is dominated by the blaster
+   exchange (prime allocation, signature verification, dispatch) rather than
+   by the action itself.
+"""
+
+import os
+import sys
+import time
+import getopt
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY, '..', '..', 'droned', 'lib'))
+
+from twisted.internet import reactor, defer
+from droned.clients.blaster import blast
+from kitt import rsa
+
+
+class Throughput(object):
+    """drives the benchmark and collects the results"""
+    def __init__(self, command, hosts, key, total, concurrency):
+        self.command = command
+        self.hosts = hosts
+        self.key = key
+        self.total = total
+        self.concurrency = concurrency
+        self.issued = 0
+        self.completed = 0
+        self.errors = 0
+        self.latencies = []
+        self.start = None
+        self.finished = defer.Deferred()
+
+    def run(self):
+        self.start = time.time()
+        for i in range(min(self.concurrency, self.total)):
+            self.issue()
+        return self.finished
+
+    def issue(self):
+        self.issued += 1
+        started = time.time()
+        d = blast(self.command, self.hosts, self.key, timeout=30.0)
+        d.addBoth(self.collect, started)
+
+    def collect(self, result, started):
+        self.latencies.append(time.time() - started)
+        self.completed += 1
+        if not isinstance(result, dict) or \
+                [v for v in result.values() if v.get('error')]:
+            self.errors += 1
+        if self.issued < self.total:
+            self.issue()
+        elif self.completed == self.total:
+            self.finished.callback(time.time() - self.start)
+
+    def report(self, elapsed):
+        lat = sorted(self.latencies)
+        pct = lambda p: lat[min(len(lat) - 1, int(len(lat) * p))] * 1000.0
+        sys.stdout.write('commands     : %d (%d errors)\n' % \
+                (self.completed, self.errors))
+        sys.stdout.write('concurrency  : %d\n' % (self.concurrency,))
+        sys.stdout.write('elapsed      : %.3f seconds\n' % (elapsed,))
+        sys.stdout.write('throughput   : %.1f commands/sec\n' % \
+                (self.completed / elapsed,))
+        sys.stdout.write('latency (ms) : p50 %.1f  p90 %.1f  p99 %.1f\n' % \
+                (pct(0.50), pct(0.90), pct(0.99)))
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'h:k:n:c:')
+    opts = dict(optList)
+    hosts = opts.get('-h', '127.0.0.1:5500').split(',')
+    keyfile = opts.get('-k', '/etc/pki/droned/local.private')
+    command = ' '.join(args) or 'ping'
+    bench = Throughput(command, hosts, rsa.PrivateKey(keyfile),
+            int(opts.get('-n', 1000)), int(opts.get('-c', 50)))
+
+    def done(elapsed):
+        bench.report(elapsed)
+        reactor.stop()
+
+    reactor.callWhenRunning(lambda: bench.run().addCallback(done))
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
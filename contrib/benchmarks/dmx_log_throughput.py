@@ -0,0 +1,115 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Lines/sec dmx can log for a child that writes to stdout flat out.
+
+   usage: python dmx_log_throughput.py [-n lines] [-w width] [-i interval]
+              [-t timeformat]
+
+   Runs the same child twice, once through the per-event log observer dmx
+   used to route application output through and once through the buffered
+   writer it uses now, and reports the rate at which lines reached the log.
+"""
+
+import os
+import sys
+import time
+import shutil
+import getopt
+import tempfile
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY, '..', '..', 'droned', 'lib'))
+
+from twisted.internet import reactor, protocol, defer
+from twisted.python.log import FileLogObserver, textFromEventDict
+from twisted.python.util import untilConcludes
+import droned.logging
+
+CHILD = """
+import sys
+line = 'x' * %d + '\\n'
+write = sys.stdout.write
+for i in xrange(%d): write(line)
+"""
+
+
+class EventLogger(FileLogObserver):
+    """the observer dmx used before output was buffered"""
+    timeFormat = ""
+
+    def emit(self, eventDict):
+        text = textFromEventDict(eventDict)
+        if text is None: return
+        untilConcludes(self.write, text)
+        untilConcludes(self.flush)
+
+
+class Child(protocol.ProcessProtocol):
+    def __init__(self, write, finished):
+        self.write = write
+        self.finished = finished
+
+    def outReceived(self, data):
+        self.write(data)
+
+    def processEnded(self, reason):
+        self.finished.callback(time.time())
+
+
+def run(name, write, lines, width):
+    finished = defer.Deferred()
+    source = CHILD % (width, lines)
+    started = time.time()
+    reactor.spawnProcess(Child(write, finished), sys.executable,
+            args=[sys.executable, '-c', source], env=os.environ)
+    return finished.addCallback(lambda ended: (name, ended - started))
+
+
+@defer.inlineCallbacks
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'n:w:i:t:')
+    opts = dict(optList)
+    lines = int(opts.get('-n', 500000))
+    width = int(opts.get('-w', 80))
+    interval = float(opts.get('-i', 1.0))
+    timeFormat = opts.get('-t', None)
+    logdir = tempfile.mkdtemp(prefix='dmxlog')
+    results = []
+    try:
+        droned.logging.logToDir(directory=logdir, LOG_TYPE=('app-0_out',),
+                OBSERVER=EventLogger)
+        emit = droned.logging.logWithContext(type='app-0_out')
+        results.append((yield run('event logger', lambda d: emit(str(d)),
+                lines, width)))
+
+        writer = droned.logging.bufferedLogToDir(logdir, 'app-1_out',
+                interval=interval, timeFormat=timeFormat, reactor=reactor)
+        result = yield run('buffered writer', writer.write, lines, width)
+        writer.close()
+        results.append(result)
+    finally:
+        shutil.rmtree(logdir, True)
+        reactor.stop()
+    sys.stdout.write('lines        : %d x %d bytes\n' % (lines, width + 1))
+    for name, elapsed in results:
+        sys.stdout.write('%-16s: %.3f seconds, %.0f lines/sec\n' % \
+                (name, elapsed, lines / elapsed))
+
+
+if __name__ == '__main__':
+    reactor.callWhenRunning(main)
+    reactor.run()
@@ -0,0 +1,118 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Time the descriptor sweep DroneD and dmx do when they daemonize.
+
+   usage: python fd_sweep.py [-l rlimit] [-o open descriptors] [-r rounds]
+
+   Every round forks a child that raises RLIMIT_NOFILE to ``rlimit`` (only
+   root can raise the hard limit, otherwise the current hard limit is used),
+   opens some descriptors and closes them all except a reporting pipe, once
+   with the old ``range(maxfd)`` loop and once with
+   kitt.daemon.closeDescriptors.  The children also check that nothing but
+   the pipe survived.  Exits non-zero if a sweep left descriptors open.
+"""
+
+import os
+import sys
+import time
+import getopt
+import resource
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY, '..', '..', 'droned', 'lib'))
+
+from kitt.daemon import closeDescriptors, openDescriptors
+
+
+def isOpen(fd):
+    #openDescriptors lists the descriptor it used to read the directory
+    try: os.fstat(fd)
+    except OSError: return False
+    return True
+
+
+def legacy(keep):
+    maxfd = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+    for fd in range(0, maxfd):
+        if fd == keep: continue
+        try: os.close(fd)
+        except OSError: pass #ignore
+
+
+def shared(keep):
+    closeDescriptors(keep=(keep,))
+
+
+def measure(sweep, rlimit, extra):
+    """fork a child to run one sweep
+
+       @return (tuple) elapsed seconds, descriptors left open besides the pipe
+    """
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(r)
+            try: resource.setrlimit(resource.RLIMIT_NOFILE, (rlimit, rlimit))
+            except (ValueError, resource.error):
+                hard = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+                resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            for i in range(extra):
+                os.open(os.devnull, os.O_RDONLY)
+            started = time.time()
+            sweep(w)
+            elapsed = time.time() - started
+            left = len([fd for fd in openDescriptors() if fd != w and \
+                    isOpen(fd)])
+            os.write(w, '%f %d %d' % (elapsed, left,
+                    resource.getrlimit(resource.RLIMIT_NOFILE)[1]))
+            code = 0
+        finally:
+            os._exit(code)
+    os.close(w)
+    data = ''
+    while True:
+        chunk = os.read(r, 128)
+        if not chunk: break
+        data += chunk
+    os.close(r)
+    os.waitpid(pid, 0)
+    elapsed, left, limit = data.split()
+    return float(elapsed), int(left), int(limit)
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'l:o:r:')
+    opts = dict(optList)
+    rlimit = int(opts.get('-l', 1048576))
+    extra = int(opts.get('-o', 64))
+    rounds = int(opts.get('-r', 3))
+    failed = False
+    for name, sweep in (('range(maxfd)', legacy), ('closeDescriptors', shared)):
+        best, left, limit = None, 0, 0
+        for i in range(rounds):
+            elapsed, left, limit = measure(sweep, rlimit, extra)
+            best = best is None and elapsed or min(best, elapsed)
+            failed = failed or left > 0
+        sys.stdout.write('%-18s: %9.3f ms  rlimit %d  left open %d\n' % \
+                (name, best * 1000.0, limit, left))
+    return failed and 1 or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
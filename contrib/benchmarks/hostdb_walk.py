@@ -0,0 +1,92 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Time to walk every server of a large hostdb through romeo.hostdb.
+
+   usage: python hostdb_walk.py [-n servers] [-a artifacts] [-r rounds]
+
+   Generates an environment with ``servers`` servers that each run
+   ``artifacts`` artifacts, loads it with romeo and walks it the way
+   higher level code does: every server, it's hostname and the shortname
+   of every artifact, ``rounds`` times.
+"""
+
+import os
+import sys
+import time
+import shutil
+import getopt
+import tempfile
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY, '..', '..', 'romeo', 'lib'))
+os.environ.setdefault('ROMEO_IGNORE_FQDN', '1')
+
+import romeo
+
+
+def generate(datadir, servers, artifacts):
+    out = open(os.path.join(datadir, 'benchmark.yaml'), 'w')
+    out.write('- NAME: benchmark\n')
+    for i in xrange(servers):
+        out.write('- SERVER:\n    HOSTNAME: host%05d.example.net\n' \
+                '    ARTIFACTS:\n' % (i,))
+        for a in xrange(artifacts):
+            out.write('      - SHORTNAME: app%d-%d\n' % (a, i))
+    out.close()
+
+
+def walk():
+    seen = 0
+    for env in romeo.hostdb.listEnvironments():
+        for server in env.get_SERVER():
+            server.get_HOSTNAME()
+            for artifact in romeo.hostdb.safe_iter(server.get_ARTIFACTS()):
+                seen += 1
+    return seen
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'n:a:r:')
+    opts = dict(optList)
+    servers = int(opts.get('-n', 10000))
+    artifacts = int(opts.get('-a', 2))
+    rounds = int(opts.get('-r', 5))
+    datadir = tempfile.mkdtemp(prefix='hostdb')
+    try:
+        generate(datadir, servers, artifacts)
+        started = time.time()
+        romeo.reload(datadir=datadir)
+        loaded = time.time() - started
+        timings = []
+        for i in xrange(rounds):
+            started = time.time()
+            walk()
+            timings.append(time.time() - started)
+    finally:
+        shutil.rmtree(datadir, True)
+    sys.stdout.write('servers     : %d x %d artifacts\n' % (servers, artifacts))
+    sys.stdout.write('reload      : %.3f seconds\n' % (loaded,))
+    sys.stdout.write('first walk  : %.3f seconds\n' % (timings[0],))
+    if len(timings) > 1:
+        rest = timings[1:]
+        mean = sum(rest) / len(rest)
+        sys.stdout.write('later walks : %.3f seconds, %.0f servers/sec\n' % \
+                (mean, servers / max(mean, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Messages/sec through droned.logging loggers.
+
+   usage: python log_throughput.py [-n messages] [-i interval]
+
+   Compares the closure logWithContext used to return against the cached
+   ContextLogger, for messages that are written to a log file (flushed per
+   event and batched every ``interval`` seconds) and for ``excessive``
+   messages that are discarded because excessive logging is off.
+"""
+
+import os
+import sys
+import time
+import types
+import shutil
+import getopt
+import tempfile
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY, '..', '..', 'droned', 'lib'))
+
+#droned normally provides this
+config = types.ModuleType('config')
+config.EXCESSIVE_LOGGING = False
+config.RETAINED_LOGS = 7
+sys.modules['config'] = config
+
+import droned.logging
+
+
+def closureLogger(**context):
+    """what logWithContext returned before destinations were cached"""
+    def _log(message="", **kwargs):
+        myContext = {}
+        myContext.update(context)
+        myContext.update(kwargs)
+        try: import config
+        except: config = None
+        event = {}
+        event.update(myContext)
+        event['message'] = message
+        event['time'] = time.time()
+        event['system'] = myContext.get('system') or \
+                myContext.get('type') or 'console'
+        if event.get('excessive') and config and \
+                not config.EXCESSIVE_LOGGING:
+            event['discard'] = True
+        event['message'] = (event['message'],)
+        if event.get('discard'): return
+        destination = droned.logging.get_destination(event)
+        if destination: destination.emit(event)
+    return _log
+
+
+def measure(logger, count):
+    message = 'x' * 80
+    started = time.time()
+    for i in xrange(count):
+        logger(message)
+    return time.time() - started
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'n:i:')
+    opts = dict(optList)
+    count = int(opts.get('-n', 200000))
+    interval = float(opts.get('-i', 1.0))
+    logdir = tempfile.mkdtemp(prefix='droned-log')
+    results = []
+    try:
+        droned.logging.logToDir(logdir, ('direct',))
+        droned.logging.logToDir(logdir, ('batched',), flushInterval=interval)
+        for name, factory in (('closure', closureLogger),
+                ('context logger', droned.logging.logWithContext)):
+            results.append(('%s, file' % name,
+                    measure(factory(type='direct'), count)))
+            batched = measure(factory(type='batched'), count)
+            started = time.time()
+            droned.logging.flushLogs()
+            batched += time.time() - started
+            results.append(('%s, batched' % name, batched))
+            results.append(('%s, excessive' % name,
+                    measure(factory(type='direct', excessive=True), count)))
+    finally:
+        shutil.rmtree(logdir, True)
+    sys.stdout.write('messages                  : %d\n' % count)
+    for name, elapsed in results:
+        sys.stdout.write('%-26s: %.3f seconds, %.0f messages/sec\n' % \
+                (name, elapsed, count / max(elapsed, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
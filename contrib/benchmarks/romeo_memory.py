@@ -0,0 +1,78 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Resident memory used by romeo to hold a large hostdb.
+
+   usage: python romeo_memory.py [-n servers] [-a artifacts]
+
+   Generates the same environment as hostdb_walk.py, loads it with romeo
+   and reports how much the resident set size grew, along with the number
+   of RomeoKeyValue nodes the load created.  Linux only, the size is read
+   from /proc/self/status.
+"""
+
+import gc
+import os
+import sys
+import time
+import shutil
+import getopt
+import tempfile
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY, '..', '..', 'romeo', 'lib'))
+os.environ.setdefault('ROMEO_IGNORE_FQDN', '1')
+
+import romeo
+from romeo.foundation import RomeoKeyValue
+from hostdb_walk import generate
+
+
+def resident():
+    """resident set size in bytes"""
+    for line in open('/proc/self/status'):
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'n:a:')
+    opts = dict(optList)
+    servers = int(opts.get('-n', 10000))
+    artifacts = int(opts.get('-a', 2))
+    datadir = tempfile.mkdtemp(prefix='hostdb')
+    try:
+        generate(datadir, servers, artifacts)
+        gc.collect()
+        before = resident()
+        started = time.time()
+        romeo.reload(datadir=datadir)
+        loaded = time.time() - started
+        gc.collect()
+        grown = resident() - before
+    finally:
+        shutil.rmtree(datadir, True)
+    nodes = len(list(RomeoKeyValue.objects))
+    sys.stdout.write('servers     : %d x %d artifacts\n' % (servers, artifacts))
+    sys.stdout.write('nodes       : %d\n' % (nodes,))
+    sys.stdout.write('reload      : %.3f seconds\n' % (loaded,))
+    sys.stdout.write('resident    : %.1f MB, %.0f bytes/node\n' % \
+            (grown / 1048576.0, grown / float(max(nodes, 1))))
+
+
+if __name__ == '__main__':
+    main()
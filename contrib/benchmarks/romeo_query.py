@@ -0,0 +1,120 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Latency of romeo queries with and without a romeo query server.
+
+   usage: python romeo_query.py [-n servers] [-e environments] [-r rounds]
+
+   Generates ``servers`` servers split over ``environments`` files and times
+   a short lived process that reloads romeo and asks ``whoami`` once, cold
+   (parsing the hostdb itself) and warm (answered by romeo-query).  Then
+   times ``rounds`` whoami queries twice inside one process, the first pass
+   includes linking the environments a query server hands out, and one
+   ``select HOSTNAME``.
+"""
+
+import os
+import sys
+import time
+import shutil
+import getopt
+import tempfile
+import subprocess
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+LIBRARY = os.path.join(DIRECTORY, '..', '..', 'romeo', 'lib')
+SERVER = os.path.join(DIRECTORY, '..', '..', 'romeo', 'bin', 'romeo-query')
+sys.path.insert(0, LIBRARY)
+os.environ.setdefault('ROMEO_IGNORE_FQDN', '1')
+os.environ['PYTHONPATH'] = LIBRARY
+
+import romeo
+
+ONE_SHOT = """
+import romeo
+romeo.reload(datadir=%r)
+romeo.whoami('host00000.example.net')
+"""
+
+
+def generate(datadir, servers, environments):
+    for e in xrange(environments):
+        out = open(os.path.join(datadir, 'env%d.yaml' % (e,)), 'w')
+        out.write('- NAME: env%d\n' % (e,))
+        for i in xrange(e, servers, environments):
+            out.write('- SERVER:\n    HOSTNAME: host%05d.example.net\n' \
+                    '    ARTIFACTS:\n      - SHORTNAME: app-%d\n' % (i, i))
+        out.close()
+
+
+def one_shot(datadir):
+    started = time.time()
+    subprocess.check_call([sys.executable, '-c', ONE_SHOT % (datadir,)])
+    return time.time() - started
+
+
+def queries(datadir, rounds):
+    romeo.reload(datadir=datadir)
+    timings = []
+    for attempt in ('first', 'again'):
+        started = time.time()
+        for i in xrange(rounds):
+            romeo.whoami('host%05d.example.net' % (i,))
+        timings.append((time.time() - started) / rounds)
+    started = time.time()
+    list(romeo.grammars.search('select HOSTNAME'))
+    timings.append(time.time() - started)
+    return timings
+
+
+def main():
+    optList, args = getopt.gnu_getopt(sys.argv[1:], 'n:e:r:')
+    opts = dict(optList)
+    servers = int(opts.get('-n', 10000))
+    environments = int(opts.get('-e', 10))
+    rounds = int(opts.get('-r', 100))
+    datadir = tempfile.mkdtemp(prefix='hostdb')
+    results = []
+    server = None
+    try:
+        generate(datadir, servers, environments)
+        os.environ.pop('ROMEO_SOCKET', None)
+        results.append(('cold', one_shot(datadir), queries(datadir, rounds)))
+        server = subprocess.Popen([sys.executable, SERVER, datadir])
+        socket = os.path.join(datadir, romeo.query.SOCKET_NAME)
+        while not os.path.exists(socket):
+            time.sleep(0.1)
+        os.environ['ROMEO_SOCKET'] = socket
+        results.append(('warm', one_shot(datadir), queries(datadir, rounds)))
+    finally:
+        romeo.query.disconnect()
+        if server:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(datadir, True)
+    sys.stdout.write('servers     : %d in %d environments\n' % \
+            (servers, environments))
+    for name, process, (first, again, select) in results:
+        sys.stdout.write('%s process : %.3f seconds for reload + whoami\n' % \
+                (name, process))
+        sys.stdout.write('%s whoami  : %.3f ms first pass, %.3f ms after\n' % \
+                (name, first * 1000, again * 1000))
+        sys.stdout.write('%s select  : %.3f seconds for select HOSTNAME\n' % \
+                (name, select))
+
+
+if __name__ == '__main__':
+    main()
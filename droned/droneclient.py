@@ -28,7 +28,8 @@ default_port = 5500
 keyDir = os.environ.get('DRONED_KEY_DIR', '/etc/pki/droned')
 
 from twisted.internet import reactor, defer
-from droned.clients.blaster import blast
+from droned.clients.blaster import blast, CONCURRENT
+from droned.errors import DroneCommandFailed
 
 import time
 import getopt
@@ -48,6 +49,7 @@ class BlasterResult(object):
         """
         self.outfd = outfd
         self.returncode = 0
+        self.received = set()
 
 
     def started(self):
@@ -70,6 +72,36 @@ class BlasterResult(object):
         except: pass
 
 
+    def progress(self, server, val):
+        """Outputs one server's response as soon as it arrives.
+
+           server: (object) - key of the response in the final result
+           val: (dict) - response dictionary, see L{__call__}
+        """
+        self.received.add(server)
+        self.write('%(server)s:%(port)s\t-> %(code)d: "%(description)s"' % val)
+        for context in val.get('results', ()): #batch messages
+            self.write('    %(command)s\t-> %(code)d: "%(description)s"' % \
+                    context)
+        if DEBUG and 'stacktrace' in val:
+            self.write('Received Stacktrace from %(server)s:\n%(stacktrace)s\n\n' % val)
+        self.returncode += abs(val['code'])
+
+
+    def summary(self, phases):
+        """Outputs the latency of each phase of the blaster exchange.
+
+           phases: (dict) - phase name -> dict of count, mean, p50, p90, max
+        """
+        for name in ('prime', 'command', 'server'):
+            if name not in phases: continue
+            stats = dict(phases[name], name=name)
+            stats.setdefault('attempts', stats['count'])
+            self.write('%(name)-8s %(count)5d ok %(attempts)5d attempts  ' \
+                    'mean %(mean).3fs p50 %(p50).3fs p90 %(p90).3fs ' \
+                    'max %(max).3fs' % stats)
+
+
     def __call__(self, result):
         """Receives the callback result dictionary and outputs results.
 
@@ -81,10 +113,8 @@ class BlasterResult(object):
            returns dict (result) - output is the same as input
         """
         for var, val in result.items():
-            self.write('%(server)s:%(port)s\t-> %(code)d: "%(description)s"' % val)
-            if DEBUG and 'stacktrace' in val:
-                self.write('Received Stacktrace from %(server)s:\n%(stacktrace)s\n\n' % val)
-            self.returncode += abs(val['code']) 
+            if var in self.received: continue #already streamed
+            self.progress(var, val)
 
         end = time.time()
         sys.stdout.write("Run Time: %.3f seconds\n" % (end - self.start,))
@@ -93,6 +123,17 @@ class BlasterResult(object):
         return result
 
 
+    def failed(self, failure):
+        """Receives the errback when no server carried out the command,
+           the per server responses are output like any other result.
+        """
+        if failure.check(DroneCommandFailed):
+            return self(failure.value.resultContext)
+        self.write(failure.getTraceback())
+        self.returncode += 1
+        reactor.stop()
+
+
 #########################################
 # Old droneblaster code for parsing
 #########################################
@@ -101,6 +142,7 @@ keyfile = 'local'
 def usage(err=None):
   sys.stderr.write("""
         Usage: droneblaster [options] "command"
+               droneblaster [options] -b "command" "command"...
 
         Options
                 -h host1:port,host2...  Send to the listed hosts
@@ -109,6 +151,12 @@ def usage(err=None):
                 -k file                 Specify the private key to sign with
                 -t seconds              Adjust timeout value (default: 5)
                 -p port                 Specify the port (default: 5500)
+                -w hosts                Hosts to talk to at once (default: 128)
+                -r retries              Retries per host (default: 2)
+                -s                      Print per phase latencies
+                -b                      Send every argument as a command of
+                                        one batch, run in order
+                -c                      Run the batch commands concurrently
                 -d                      enable debugging output
 
   """)
@@ -126,7 +174,7 @@ def parseHosts(data,sep):
   return list(hosts)
 
 try:
-  optList,args = getopt.gnu_getopt(sys.argv[1:],"h:f:t:o:p:k:d")
+  optList,args = getopt.gnu_getopt(sys.argv[1:],"h:f:t:o:p:k:w:r:dsbc")
   opts = dict(optList)
   message = ' '.join(args)
   assert message, "No command specified"
@@ -150,6 +198,10 @@ try:
       kwargs['debug'] = DEBUG = True
       defer.setDebugging(True)
   if '-k' in opts: keyfile = opts['-k']
+  if '-w' in opts: kwargs['window'] = int(opts['-w'])
+  if '-r' in opts: kwargs['retries'] = int(opts['-r'])
+  if '-b' in opts: message = args
+  if '-c' in opts: kwargs['mode'] = CONCURRENT
 except Exception, exc:
   usage("Error processing aruments (%s)" % exc)
 
@@ -167,7 +219,10 @@ sys.stderr = sys.stdout
 responseHandler = BlasterResult(sys.stdout)
 #inject the callback function as opposed to chaining
 kwargs['callback'] = responseHandler
+kwargs['progress'] = responseHandler.progress
+if '-s' in opts: kwargs['summary'] = responseHandler.summary
 reactor.callWhenRunning(responseHandler.started)
-reactor.callWhenRunning(blast, message, hosts, key, **kwargs)
+reactor.callWhenRunning(lambda: blast(message, hosts, key, **kwargs
+        ).addErrback(responseHandler.failed))
 reactor.run()
 sys.exit(responseHandler.returncode)
@@ -16,6 +16,7 @@
 
 import os
 import sys
+import time
 import signal
 import platform
 import copyright
@@ -47,6 +48,39 @@ try: any
 except NameError:
     from kitt.util import any
 
+from kitt.daemon import closeDescriptors, detachStdio
+
+###############################################################################
+# Startup Timeline
+###############################################################################
+class StartupTimeline(object):
+    """Records how long each phase of DroneD startup took"""
+    def __init__(self):
+        self.started = time.time()
+        self.phases = []
+
+    def record(self, phase, began, duration=None):
+        """record a phase that began at ``began``
+
+           @param phase (string)
+           @param began (float) time.time() when the phase began
+           @param duration (float) defaults to the time since ``began``
+        """
+        if duration is None:
+            duration = time.time() - began
+        self.phases.append((phase, began - self.started, duration))
+
+    def report(self):
+        """human readable timeline
+
+           @return (string)
+        """
+        lines = ['%-32s %10s %10s' % ('phase', 'offset', 'cost')]
+        for phase, offset, duration in self.phases:
+            lines.append('%-32s %9.3fs %9.3fs' % (phase, offset, duration))
+        return '\n'.join(lines)
+timeline = StartupTimeline()
+
 ###############################################################################
 # Raceless Daemon/Option Parser Class
 ###############################################################################
@@ -91,7 +125,8 @@ class Daemon(Options):
     ])
     optFlags = [
         ["nodaemon", "n", "don't daemonize, don't use default umask of 0."],
-        ["stop", "", "Stop a running Drone Daemon."]
+        ["stop", "", "Stop a running Drone Daemon."],
+        ["multiplex", "", "Run managed applications under one dmx supervisor."]
     ]
 
     SIGNALS = dict((k, v) for v, k in signal.__dict__.iteritems() if \
@@ -114,6 +149,7 @@ class Daemon(Options):
     REACTORNAME = property(lambda s: s['reactor'])
     MAXFD = property(lambda s: int(s['maxfd']))
     DAEMONIZED = property(lambda s: not s['nodaemon'])
+    DMX_MULTIPLEX = property(lambda s: bool(s['multiplex']))
     REDIRECT_TO = property(lambda s: hasattr(os, "devnull") and os.devnull \
             or "/dev/null")
     PORT = property(lambda s: int(s['port']))
@@ -281,18 +317,9 @@ class Daemon(Options):
             if (os.fork() ==  0):
                 os.chdir(os.path.sep)
                 os.umask(self.UMASK)
-                import resource	# Resource usage information.
-                maxfd = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
-                if (maxfd == resource.RLIM_INFINITY):
-                    maxfd = self.MAXFD
-  
-                # Iterate through and close all file descriptors.
-                for fd in range(0, maxfd):
-                    try: os.close(fd)
-                    except OSError: pass #ignore
-                os.open(self.REDIRECT_TO, os.O_RDWR)
-                os.dup2(0, 1)
-                os.dup2(0, 2)
+                #close only the descriptors that are actually open
+                closeDescriptors(maxfd=self.MAXFD)
+                detachStdio(self.REDIRECT_TO)
 
                 #setting up the reactor
                 self.set_reactor()
@@ -353,6 +380,8 @@ except:
 
 drone() #lets daemonize (assuming !nodaemon) and get going
 drone.reactor.callWhenRunning(drone.log, "DroneD reactor is now running.")
+drone.reactor.callWhenRunning(lambda: timeline.record('reactor startup',
+    timeline.started))
 
 import droned.logging
 if drone.DAEMONIZED:
@@ -363,7 +392,7 @@ else: droned.logging.logToStdout(timestamp=drone.DEBUG)
 drone.log('logging subsystem initialized')
 
 from twisted.application import service
-from twisted.internet import defer
+from twisted.internet import defer, task
 from twisted.python.failure import Failure
 from twisted.python.log import err
 from droned.entity import Entity
@@ -388,7 +417,9 @@ class ConfigManager(Entity):
         sys.modules['config'] = self
         self.data = {}
         drone.log('Initializing Configuration...')
+        began = time.time()
         self.configure()
+        timeline.record('configure', began)
         drone.log('Configuration is loaded.')
 
     def configure(self):
@@ -418,10 +449,11 @@ class ConfigManager(Entity):
 
         #figure out if we are supposed to manage application artifacts
         APPLICATIONS = {}
-        for i in romeo.grammars.search('my SHORTNAME'):
-            search = str('select ARTIFACT')
-            for x in romeo.grammars.search(search):
-                if x.get('SHORTNAME') != i: continue
+        MY_SHORTNAMES = set(romeo.grammars.search('my SHORTNAME'))
+        if MY_SHORTNAMES: #one pass over the artifacts
+            for x in romeo.grammars.search('select ARTIFACT'):
+                i = x.get('SHORTNAME')
+                if isinstance(i, list) or i not in MY_SHORTNAMES: continue
                 if isinstance(x.VALUE.get('CLASS', False), type(None)): continue
                 if not ENV_OBJECT.isChild(x):
                     continue #right artifact/wrong env check
@@ -443,6 +475,7 @@ class ConfigManager(Entity):
             'AUTOSTART_SERVICES': AUTOSTART_SERVICES,
             'EXCESSIVE_LOGGING': drone.DEBUG,
             'RETAINED_LOGS': drone.RETAINED_LOG_COUNT,
+            'LOG_FLUSH_INTERVAL': 0, #seconds to batch service log writes
             'ROMEO_API': romeo,
             'ROMEO_HOST_OBJECT': me,
             'ROMEO_ENV_NAME': ENV_NAME,
@@ -471,7 +504,10 @@ class ConfigManager(Entity):
             'ACTION_EXPIRATION_TIME': 600,
             'DO_NOTHING_MODE': False,
             'MAX_CONCURRENT_COMMANDS': drone.MAX_CONCURRENCY,
+            'MAX_CONCURRENT_COMMANDS_PER_SERVER': 2,
             'SERVER_MANAGEMENT_INTERVAL': 10,
+            'DMX_MULTIPLEX': drone.DMX_MULTIPLEX,
+            'DMX_SOCKET': os.path.join(drone.DRONED_HOMEDIR, 'dmx.sock'),
         }
 
     def __getitem__(self, param):
@@ -528,15 +564,25 @@ class ServiceManager(Entity):
         self.SERVICE_STATE = {}
         self._parent = None
         drone.log('Loading Services')
+        began = time.time()
         import services
-        mask = ('loadAll',) #mask as private
+        mask = ('loadAll', 'loadService', 'discover') #mask as private
         #truely become service module
         for var, val in vars(services).items():
             if var.startswith('_'): continue
             if var in mask: continue
             setattr(self, var, val) #bind the module globals to self
-        services.loadAll() #load all services before replacing module
+        self._loadService = services.loadService
+        services.discover() #find services without importing them
+        #services that are not imported yet still have a notion of dis/enabled
+        for name in self.AVAILABLE_SERVICES:
+            self.SERVICE_STATE[name] = name in config.AUTOSTART_SERVICES
+        #only import the services we intend to run, the rest load on demand
+        services.loadAll(config.AUTOSTART_SERVICES)
         sys.modules['services'] = self #replace the services module
+        for name, (started, cost) in sorted(self.LOAD_TIMES.items()):
+            timeline.record('import %s' % (name,), started, cost)
+        timeline.record('load services', began)
 
         from droned.models.action import AdminAction
         #droneblaster action hooks
@@ -558,11 +604,40 @@ class ServiceManager(Entity):
         )
         self._action.expose('list', lambda: \
                 self._action.resultContext('\n'.join([ i for i in \
-                    self.EXPORTED_SERVICES.keys() ]), None),
+                    sorted(self.AVAILABLE_SERVICES.keys()) ]), None),
             (), 'list all services'
         )
+        self._action.expose('timeline', lambda: \
+                self._action.resultContext(timeline.report(), None),
+            (), 'show how long each phase of startup took'
+        )
         self._action.buildDoc() #finalize the admin action
 
+    def _lookupService(self, name):
+        """Get the Service Object, importing it on demand. Only the admin
+           handlers do this, ``getService`` never imports anything.
+        """
+        if name not in self.EXPORTED_SERVICES and \
+                name in self.AVAILABLE_SERVICES:
+            obj = self._loadService(name)
+            if obj and self.parentService:
+                self._installService(name, obj)
+        return self.getService(name)
+
+    def _installService(self, name, obj):
+        """Install a single Service
+
+           @param name (string)
+           @param obj (IDroneDService provider)
+           @return None
+        """
+        self.SERVICE_STATE.setdefault(name, name in config.AUTOSTART_SERVICES)
+        #decorate start and stop methods for eventing
+        obj.start = self._startDecorator(obj.start, name)
+        obj.stop = self._stopDecorator(obj.stop, name)
+        obj.install(self.parentService) #set the twisted parent service
+        obj.parentService = self.parentService #make sure it's set
+
     def _installServices(self, parentService):
         """Install Services for DroneD to run
 
@@ -570,21 +645,20 @@ class ServiceManager(Entity):
            @return None
         """
         drone.log('Installing Services')
+        began = time.time()
         self._parent = parentService
         dead = set() #track objects that blow up on setup
         for name,obj in self.EXPORTED_SERVICES.items():
             try:
-                #decorate start and stop methods for eventing
-                obj.start = self._startDecorator(obj.start, name)
-                obj.stop = self._stopDecorator(obj.stop, name)
-                obj.install(self.parentService) #set the twisted parent service
-                obj.parentService = self.parentService #make sure it's set
+                self._installService(name, obj)
             except:
                 err(Failure(), 'Exception while installing %s' % (name,))
                 dead.add(name)
+        timeline.record('install services', began)
 
         drone.log('Evaluating Services Startup')
         #start up services that should run after everything is setup
+        startable = []
         for name,obj in self.EXPORTED_SERVICES.items():
             if name in dead: continue
             #make sure we have a notion of dis/enabled
@@ -596,15 +670,48 @@ class ServiceManager(Entity):
                     continue
             #service is marked as down even though it is in AUTO_START
             elif not self.SERVICE_STATE[name]: continue
+            startable.append(name)
+        d = self._startServices(startable)
+        d.addCallback(lambda x: drone.log('Startup Timeline\n' + \
+                timeline.report()))
+        return d
+
+    def _startServices(self, names):
+        """Start services concurrently, a service only waits on the
+           services it declares in ``SERVICEDEPENDS``.
+
+           @param names (list) of service names
+           @return (defer.Deferred)
+        """
+        pending = {}
+        def start(name):
+            began = time.time()
             try:
                 self.SERVICE_STATE[name] = True #be safe
-                self._startService(name)
+                result = self._startService(name)
+                if isinstance(result, Failure):
+                    err(result, 'Exception while registering %s' % (name,))
             except: #logging is not setup yet use twisted's err facility
                 err(Failure(), 'Exception while registering %s' % (name,))
+            timeline.record('start %s' % (name,), began)
+
+        def schedule(name, path=()):
+            if name in pending: return pending[name]
+            if name in path: #circular dependency, don't wait on it
+                return defer.succeed(None)
+            waitOn = [ schedule(dep, path + (name,)) for dep in \
+                    self.SERVICE_DEPENDS.get(name, ()) if dep in names ]
+            d = defer.DeferredList(waitOn)
+            #give the reactor a turn in between service starts
+            d.addCallback(lambda x: task.deferLater(config.reactor, 0,
+                start, name))
+            pending[name] = d
+            return d
+        return defer.DeferredList([ schedule(name) for name in names ])
 
     def _statusService(self, name):
         """used by the AdminAction handler"""
-        status = self.getService(name).running() and 'running and' or \
+        status = self._lookupService(name).running() and 'running and' or \
                 'stopped and'
         status += self.SERVICE_STATE.get(name, False) and ' enabled' or \
                 ' disabled'
@@ -612,7 +719,7 @@ class ServiceManager(Entity):
 
     def _startService(self, name):
         """used by the AdminAction handler"""
-        obj = self.getService(name)
+        obj = self._lookupService(name)
         if not obj.running():
             result = obj.start()
             if isinstance(result, Failure): return result
@@ -620,7 +727,7 @@ class ServiceManager(Entity):
 
     def _stopService(self, name):
         """used by the AdminAction handler"""
-        obj = self.getService(name)
+        obj = self._lookupService(name)
         if obj.running():
             result = obj.stop()
             if isinstance(result, Failure): return result
@@ -705,13 +812,14 @@ if drone.DAEMONIZED:
 #on linux with systemd we don't daemonize ourself
 if not drone.DAEMONIZED:
     observer = droned.logging.logs['console']
-    for srvc in vars(services)['EXPORTED_SERVICES'].keys():
+    for srvc in vars(services)['AVAILABLE_SERVICES'].keys():
         droned.logging.logs[srvc] = observer
 else: #daemons get full blown logging support
     #setup the individual service logs
     droned.logging.logToDir(
         config.LOG_DIR,
-        vars(services)['EXPORTED_SERVICES'].keys()
+        vars(services)['AVAILABLE_SERVICES'].keys(),
+        flushInterval=config.LOG_FLUSH_INTERVAL
     )
 
 
@@ -723,7 +831,7 @@ import droned.events
 droned.events.loadAll()
 
 #import event prior to installing services
-from droned.models.event import Event
+from droned.models.event import Event, flushAll
 
 #load servers that are part of my environment from ROMEO
 env.loadServers()
@@ -744,6 +852,10 @@ drone.reactor.callWhenRunning(
 drone.reactor.addSystemEventTrigger('after', 'priviledges', 
     sm._installServices, application
 )
+#deliver events that are waiting on their delivery policy
+drone.reactor.addSystemEventTrigger('before', 'shutdown', flushAll)
+drone.reactor.addSystemEventTrigger('after', 'shutdown',
+        droned.logging.flushLogs)
 #make sure our services properly terminate
 drone.reactor.addSystemEventTrigger('before', 'shutdown', sm._stopAll)
 #make twisted services properly terminate
@@ -17,7 +17,7 @@
 from twisted.internet import defer
 from twisted.python.failure import Failure
 from kitt.util import dictwrapper
-from kitt.decorators import debugCall, deferredAsThread
+from kitt.decorators import debugCall, deferredInThreadPool
 from kitt.proc import Process, listProcesses, findProcesses
 from kitt.blaster import DIGEST_INIT
 from droned.clients import command
@@ -241,7 +241,7 @@ class ApplicationPlugin(object):
         yield result
 
 #NOTE runs hot due to IO read on Linux and Solaris
-    @deferredAsThread
+    @deferredInThreadPool('process')
     def findProcesses(self):
         """Attempt to find a process by an ASSIMILATION pattern.
            This is a relatively naive attempt to find an application
@@ -16,6 +16,10 @@
 
 import os
 import sys
+try:
+    import simplejson as json
+except ImportError:
+    import json
 from twisted.python.failure import Failure
 from twisted.internet import defer
 from twisted.internet.protocol import ClientCreator
@@ -106,6 +110,15 @@ def command(executable, args, env, path, usePTY, childFD, protocol,
         )
         #arguments to dmx
         args = ('dmx', executable) + args
+        try: #hand the application to the shared supervisor
+            import config
+            if config.DMX_MULTIPLEX:
+                args = ('dmx', '--attach', config.DMX_SOCKET) + args[1:]
+                #the supervisor must not inherit this application's settings
+                from droned.management.dmx import client
+                env[client.SUPERVISOR_ENV] = json.dumps(
+                    client.supervisorEnvironment(os.environ, config.LOG_DIR))
+        except: pass #dmx work around
         #switch out the executable for the same one that launched DroneD
         executable = sys.executable
 
@@ -19,11 +19,28 @@ from twisted.python.failure import Failure
 from twisted.web.client import getPage
 from twisted.internet.error import ConnectError, DNSLookupError
 from droned.errors import DroneCommandFailed
+from droned.clients import httppool
 
-from kitt.blaster import Serialize, DIGEST_INIT, packify, Deserialize
-import time, urllib, traceback
+from kitt.blaster import Serialize, DIGEST_INIT, packify, Deserialize, \
+        batchCommand, SEQUENTIAL, CONCURRENT
+import time, urllib
 
 DEFAULT_TIMEOUT = 120.0
+#hosts that may be talking to us at once
+DEFAULT_WINDOW = 128
+#extra attempts for a host whose prime or command could not be delivered
+DEFAULT_RETRIES = 2
+RETRY_DELAY = 0.5
+PRIME_TIMEOUT = 5.0
+MIME = 'application/droned-pickle'
+#failures after which a command did not reach the server
+UNDELIVERED = (ConnectError, DNSLookupError)
+if httppool.available:
+    #the request was not written, RequestNotSent is a pooled connection
+    #that was already closed.  Once a request went out the failure is
+    #reported as is, the server may have run the command.
+    from twisted.web.client import RequestNotSent, RequestTransmissionFailed
+    UNDELIVERED += (RequestNotSent, RequestTransmissionFailed)
 
 __author__ = 'Justin Venus <justin.venus@orbitz.com>'
 
@@ -31,26 +48,43 @@ __author__ = 'Justin Venus <justin.venus@orbitz.com>'
 def blast(command, clientList, keyObj, **kwargs):
     """Public Method to send messages to a DroneD Client.
 
-       command:    String
+       command:    String or list of Strings
        clientList: List
        keyName:    String
        timeout:    number
        callback:   function(dict)
+       progress:   function(server, dict)
+       summary:    function(dict)
+       window:     number
+       retries:    number
+       persistent: bool
+       mode:       SEQUENTIAL or CONCURRENT
 
-       returns deferred
+       returns deferred, errbacks with DroneCommandFailed when every
+         server failed
 
          This function will send a blaster protocol command to all servers
          and execute all callback function that accepts one parameter. The
          one callback parameter is a dictionary response to the supplied
-         command action.
+         command action.  ``progress`` is called with each server's response
+         as it arrives and ``summary`` with the per phase latencies once all
+         servers have answered.  A list of commands is sent to each server
+         as one batch message, they are run in order or all at once as
+         ``mode`` asks and the response holds a result context per command
+         under 'results'.
     """
 
     Debug = kwargs.pop('debug', False)
 
     #create the callable class
-    blaster = DroneBlaster(clientList, debug=Debug)
+    blaster = DroneBlaster(clientList, debug=Debug,
+        window=kwargs.pop('window', DEFAULT_WINDOW),
+        retries=kwargs.pop('retries', DEFAULT_RETRIES),
+        persistent=kwargs.pop('persistent', True)
+    )
 
     callback = kwargs.pop('callback',None)
+    summary = kwargs.pop('summary', None)
     if 'timeout' not in kwargs:
         kwargs['timeout'] = DEFAULT_TIMEOUT
 
@@ -58,6 +92,11 @@ def blast(command, clientList, keyObj, **kwargs):
     d = blaster(command, keyObj, **kwargs)
 
     #so help me, i hate sanitizing every little thing
+    if summary and hasattr(summary, '__call__'):
+        def _summary(result):
+            summary(blaster.summary())
+            return result
+        d.addBoth(_summary)
     if callback and hasattr(callback, '__call__'):
         d.addCallback(callback)
     return d
@@ -75,74 +114,182 @@ class _Server(object):
         self.connectFailure = None
 
 
+def signMessage(command, prime, signatureKey):
+    """Given a command string, the prime handed out by the receiving
+       server and a signature key create a signed payload.  A command
+       string made by L{batchCommand} becomes a batch message.
+    """
+    digest = DIGEST_INIT()
+    keyID = signatureKey.id
+
+    magicStr = packify(prime)
+    timestamp = int(time.time())
+    payload = str(magicStr) + str(timestamp) + str(command)
+
+    digest.update(payload)
+    signature = signatureKey.encrypt(digest.hexdigest())
+
+    if '.' in signatureKey.id:
+        keyID = signatureKey.id.split('.',1)[0]
+
+    commands = str(command).split('\n')
+    args = commands.pop(0).split()
+    action = args.pop(0)
+    argstr = ""
+
+    if args:
+        argstr = " ".join(args)
+
+    msgDict = {
+        'action' : action,
+        'argstr' : argstr,
+        'magic' : magicStr,
+        'time' : timestamp,
+        'key' : keyID,
+        'signature' : signature,
+    }
+    if commands:
+        msgDict['commands'] = commands
+
+    proto = Serialize()
+    return urllib.quote(proto.execute(MIME, msgDict))
+
+
+def failedContext(server, failure):
+    """the response context of a server we could not talk to"""
+    #update the server and droned models
+    server.currentFailure = failure
+    if failure.check(ConnectError, DNSLookupError, defer.TimeoutError):
+        server.connectFailure = failure
+    return {
+        'server' : server.hostname,
+        'port' : server.port,
+        'description' : str(failure.getErrorMessage()),
+        'stacktrace' : failure.getTraceback(),
+        'error' : True,
+        'code' : -1,
+    }
+
+
+def latencySummary(samples):
+    """count, mean and percentiles of a list of seconds"""
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p90': 0.0, 'max': 0.0}
+    pct = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))]
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples),
+        'p50': pct(0.50),
+        'p90': pct(0.90),
+        'max': samples[-1],
+    }
+
+
 class DroneBlaster(object):
     """This class hides the complexity of sending a blaster message
        to many clients simultaneously.  This is a callable Class.
+
+       Every server gets it's own prime and signed message, at most
+       ``window`` servers are in the middle of that exchange at once so
+       large server lists do not exhaust file descriptors and ports.  When
+       ``persistent`` the exchange runs over the process wide keep-alive
+       connection pool.
     """
-    def __init__(self, serverList, debug=False):
+    def __init__(self, serverList, debug=False, window=DEFAULT_WINDOW,
+            retries=DEFAULT_RETRIES, persistent=True):
         self.debug = debug
+        self.persistent = persistent and httppool.available
         self.servers = list(map(_Server, serverList))
+        self.window = max(1, int(window))
+        self.retries = max(0, int(retries))
+        self.latencies = {'prime': [], 'command': [], 'server': []}
+        self.attempts = {'prime': 0, 'command': 0}
 
 
-    def startSession(self):
-        """Starts our blaster session by collecting primes"""
-        template = """http://%(hostname)s:%(port)d/_getprime"""
+    def summary(self):
+        """per phase latencies of the last call
 
-        #callable deferred session mananger
-        session = GroupSession(self.servers, debug=self.debug)
-        session.addBoth(session)
+           @return (dict) phase -> dict of count, mean, p50, p90 and max
+        """
+        result = dict((phase, latencySummary(samples)) \
+                for (phase, samples) in self.latencies.items())
+        for phase, attempts in self.attempts.items():
+            result[phase]['attempts'] = attempts
+        return result
 
-        #allowing up to 5.0 seconds for the prime
-        kwargs = {
-            'timeout' : 5.0,
-            'method' : 'GET'
-        }
 
-        events = []
-        for server in self.servers:
-            d = self.httpCall(server.prime, **kwargs)
-            d.addCallback(session.mergeKey, server)
-            d.addErrback(session.failedClient, server)
-            events.append(d)
+    def attempt(self, phase, url, retryable, **kwargs):
+        """fetch ``url``, retrying failures ``retryable`` accepts"""
+        started = time.time()
+        d = self._attempt(phase, url, retryable, self.retries, **kwargs)
+        def _done(result):
+            self.latencies[phase].append(time.time() - started)
+            return result
+        d.addCallback(_done)
+        return d
+
+
+    def _attempt(self, phase, url, retryable, retries, **kwargs):
+        self.attempts[phase] += 1
+        d = self.httpCall(url, persistent=self.persistent, **kwargs)
+        def _retry(failure):
+            if retries <= 0 or not retryable(failure):
+                return failure
+            from twisted.internet import reactor
+            delay = RETRY_DELAY * (self.retries - retries + 1)
+            d = defer.Deferred()
+            reactor.callLater(delay, d.callback, None)
+            d.addCallback(lambda x: self._attempt(phase, url, retryable,
+                    retries - 1, **kwargs))
+            return d
+        d.addErrback(_retry)
+        return d
 
-        #nom nom nom
-        d = defer.DeferredList(events, consumeErrors=False)
-        d.chainDeferred(session) #this is the magic sauce
-        return session
- 
 
-    def finishSession(self, servers, payload, **kwargs):
-        """finishes up by sending the payload to healthy clients and then
-           we collect and retrieve the results
-        """
-        template = """http://%(hostname)s:%(port)d/_command"""
+    @defer.deferredGenerator
+    def exchange(self, server, command, key, **proto_kwargs):
+        """Implements the blaster client protocol against one server.
 
-        #callable deferred session mananger
-        session = GroupSession(servers, debug=self.debug)
-        session.addBoth(lambda x: session(x, valueCheck=False))
+           @return (defer.Deferred) -> dict response context
+        """
+        started = time.time()
+        try:
+            #allowing up to PRIME_TIMEOUT seconds for the prime, a prime
+            #request has no side effects so any failure may be retried
+            wfd = defer.waitForDeferred(self.attempt('prime', server.prime,
+                lambda f: True, timeout=PRIME_TIMEOUT, method='GET'))
+            yield wfd
+            prime = int(wfd.getResult())
+            assert prime > 2, "Invalid key"
 
-        #sets the server specific settings here
-        kwargs.update(
-            {
+            kwargs = dict(proto_kwargs)
+            kwargs.update({
                 'method' : 'POST',
-                'postdata' : payload,
+                'postdata' : signMessage(command, prime, key),
                 'headers' : {
-                    'Content-type': session.MIME,
+                    'Content-type': MIME,
                 },
-            }
-        )
-
-        events = []
-        for server in servers:
-            d = self.httpCall(server.command, **kwargs)
-            d.addCallback(session.collectResults, server)
-            d.addErrback(session.failedClient, server)
-            events.append(d)
+            })
+            #the command is only retried when it did not reach the server,
+            #the prime is single use so it can never run twice anyway
+            wfd = defer.waitForDeferred(self.attempt('command', server.command,
+                lambda f: f.check(*UNDELIVERED), **kwargs))
+            yield wfd
+            result = wfd.getResult()
 
-        #nom nom nom
-        d = defer.DeferredList(events, consumeErrors=False)
-        d.chainDeferred(session) #this is the magic sauce
-        return session
+            context = {
+                'server' : server.hostname,
+                'port' : server.port,
+                'error' : False,
+                'description' : str(None),
+                'code' : 0
+            }
+            context.update(**Deserialize().execute(MIME, urllib.unquote(result)))
+        except:
+            context = failedContext(server, Failure())
+        self.latencies['server'].append(time.time() - started)
+        yield context
 
 
     @staticmethod
@@ -153,209 +300,70 @@ class DroneBlaster(object):
            page (as a string) or errback with a description of the error.
 
            See twisted.web.client.HTTPClientFactory to see what extra args
-           can be passed.
+           can be passed.  ``persistent`` requests go through the shared
+           keep-alive pool.
         """
         url = args[0] #first arg is the url
         contextFactory = kwargs.pop('contextFactory', None)
+        if kwargs.pop('persistent', False) and not contextFactory and \
+                httppool.available:
+            return httppool.getPool().request(url, *args[1:], **kwargs)
         return getPage(url, contextFactory, *args[1:], **kwargs)
 
 
-    #inlineCallback is only available on python2.5+
-    @defer.deferredGenerator
-    def __call__(self, command, key, **proto_kwargs):
+    def __call__(self, command, key, progress=None, mode=SEQUENTIAL,
+            **proto_kwargs):
         """Implements the blaster client protocol.
 
-           command:    String
+           command:    String or list of Strings
            keyName:    String
            timeout:    number
+           progress:   function(server, dict)
+           mode:       SEQUENTIAL or CONCURRENT
 
            returns deferred
 
            This function will send a blaster protocol command to all servers
            and execute all callback function that accepts one parameter. The
            one callback parameter is a dictionary response to the supplied
-           command action.
+           command action.  ``progress`` is called with every server's
+           response as soon as it is available.  A list of commands is
+           sent as a single batch message run in ``mode``.  When every
+           server failed the deferred errbacks with DroneCommandFailed
+           carrying the same dictionary.
         """
-        message = None
-        result = None
+        if isinstance(command, (list, tuple)):
+            command = batchCommand(command, mode)
+        for samples in self.latencies.values():
+            del samples[:]
+        for phase in self.attempts:
+            self.attempts[phase] = 0
         resultContext = {}
-        #get the prime numbers
-        try:
-            wfd = defer.waitForDeferred(self.startSession())
-            yield wfd
-            result = wfd.getResult()
-        except Exception, exc:
-            if isinstance(exc, DroneCommandFailed):
-                resultContext.update(exc.resultContext)
-            else:
-                traceback.print_exc()
-
-        if isinstance(result, dict) and 'object' in result:
-            #create the message payload
-            message = result['object'].groupMessage(command, key)
-            #track the clients that aren't working
-            resultContext.update(result['failedClients'])
-
-            #out of the clients that we can contact, send the command payload
-            wfd = defer.waitForDeferred(self.finishSession(
-                    result['readyClients'].keys(), message, **proto_kwargs)
-            )
-            yield wfd
-            #reset result for the next test
-            result = None
-            try:
-                result = wfd.getResult()
-            except Exception, exc:
-                if isinstance(exc, DroneCommandFailed):
-                    resultContext.update(exc.resultContext)
-                else:
-                    traceback.print_exc()
-
-        if isinstance(result, dict) and 'object' in result:
-            resultContext.update(result['failedClients'])
-            resultContext.update(result['readyClients'])
-
-        yield resultContext
-
-
-class GroupSession(defer.Deferred):
-    """This class implements blaster group message coordination for
-       both prime initialization and message response aggregation.
-    """
-    MIME='application/droned-pickle'
-
-    def __init__(self, servers, debug=False):
-        numClients = len(servers)
-        assert numClients > 0
-        #all the twisted goodies
-        defer.Deferred.__init__(self)
-        self.debug = debug
-        self.value = 1
-        self.remaining = numClients
-        self.servers = dict()
-        self.failed = dict()
-
-
-    def mergeKey(self, p, server):
-        """Merge all keys into one group key"""
-        p = int(p) #convert string to int, or throw a type error
-        assert type(p) is int and p > 2, "Invalid key" #FIXME for python3
-        self.value *= p
-        self.remaining -= 1
-        self.servers.update({server : None})
-        return self.value
-
-
-    def failedClient(self, failure, server):
-        """Track Failed Clients"""
-        #turn this failure upside down and make it a success!!
-        result = { server : {
-                'server' : server.hostname,
-                'port' : server.port,
-                'description' : str(failure.getErrorMessage()),
-                'stacktrace' : failure.getTraceback(),
-                'error' : True,
-                'code' : -1,
-            }
-        }
+        window = defer.DeferredSemaphore(self.window)
 
-        #update the server and droned models
-        server.currentFailure = failure
-        if failure.check(ConnectError, DNSLookupError, defer.TimeoutError):
-            server.connectFailure = failure
+        def _collect(context, server):
+            resultContext[server] = context
+            if progress:
+                try: progress(server, context)
+                except: Failure().printTraceback()
 
-        self.failed.update(result)
-        #i don't care why it failed, just stop it from propogating!!!
-        failure.trap(Exception)
-
-        self.remaining -= 1
-        return result
+        events = []
+        for server in self.servers:
+            d = window.run(self.exchange, server, command, key, **proto_kwargs)
+            d.addCallback(_collect, server)
+            events.append(d)
 
+        def _finished(result):
+            if resultContext and all(( context.get('error') for context \
+                    in resultContext.values() )):
+                raise DroneCommandFailed(resultContext)
+            return resultContext
 
-    def collectResults(self, result, server):
-        """collect the results from client messages"""
-        data = { server : {
-                'server' : server.hostname,
-                'port' : server.port,
-                'error' : False,
-                'description' : str(None),
-                'code' : 0
-            }
-        }
-
-        proto = Deserialize()
-        data[server].update(**proto.execute(self.MIME, urllib.unquote(result)))
-        self.servers.update(data)
-
-        self.remaining -= 1
-        return data
-
-
-    def groupMessage(self, command, signatureKey):
-        """Given a command string and signature create a signed payload"""
-        digest = DIGEST_INIT()
-        keyID = signatureKey.id
-
-        magicStr = packify(self.value)
-        timestamp = int(time.time())
-        payload = str(magicStr) + str(timestamp) + str(command)
-
-        digest.update(payload)
-        signature = signatureKey.encrypt(digest.hexdigest())
-
-        if '.' in signatureKey.id:
-            keyID = signatureKey.id.split('.',1)[0]
-
-        args = command.split()
-        action = args.pop(0)
-        argstr = ""
-
-        if args:
-            argstr = " ".join(args)
-
-        #group payload
-        msgDict = {
-            'action' : action,
-            'argstr' : argstr,
-            'magic' : magicStr,
-            'time' : timestamp,
-            'key' : keyID,
-            'signature' : signature,
-        }
-
-        proto = Serialize()
-        return urllib.quote(proto.execute(self.MIME, msgDict))
-
-
-    def __call__(self, result, valueCheck=True):
-        """our callbacks have been triggered!!!"""
-        if self.remaining != 0:
-            raise AssertionError("Found a Terrible Bug")
-        if self.value == 1 and valueCheck:
-            response = {}
-            for category in [self.failed, self.servers]:
-                for server, info in category.items():
-                    context = {
-                        'description' : 'Client Completely Failed Task',
-                        'error' : True,
-                        'code' : -4,
-                        'server' : server.hostname,
-                        'port' : server.port,
-                    }
-                    if isinstance(info, dict):
-                        context.update(**info)
-                    response.update({server: context})
-            return Failure(DroneCommandFailed(response))
-        else:
-            #hand back a useful set of data to the callbacks
-            data = {
-                'object' : self,
-                'failedClients' : self.failed,
-                'readyClients' : self.servers
-            }
-            return data
+        d = defer.DeferredList(events, consumeErrors=True)
+        d.addCallback(_finished)
+        return d
 
 
 
 #publicly available methods
-__all__ = ['blast','DroneBlaster']
+__all__ = ['blast','DroneBlaster','signMessage','SEQUENTIAL','CONCURRENT']
@@ -19,7 +19,7 @@ from twisted.python.failure import Failure
 from twisted.web.client import getPage
 from twisted.internet.error import ConnectError, DNSLookupError
 from droned.entity import Entity
-from kitt.decorators import deferredAsThread
+from kitt.decorators import deferredInThreadPool
 
 try:
     from cStringIO import StringIO
@@ -33,7 +33,7 @@ class GremlinClient(object):
         self.hostname = hostname
         self.port = int(port)
 
-    @deferredAsThread
+    @deferredInThreadPool('gremlin')
     def _deserialize(self, fd):
         while True:
             try:
@@ -0,0 +1,187 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+from twisted.web import error
+
+try: #python2.7
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = None
+
+try: #twisted 13.1 and newer
+    from twisted.web.client import Agent, HTTPConnectionPool, readBody
+    from twisted.web.iweb import IBodyProducer
+    from twisted.web.http_headers import Headers
+    from zope.interface import implementer
+except ImportError:
+    Agent = None
+if OrderedDict is None:
+    Agent = None
+
+__doc__ = """
+Keep-alive HTTP connections shared by the clients in a process.
+
+getPage speaks HTTP/1.0 and opens a new connection for every request, a
+blaster command costs two connections per server.  L{HTTPPool} keeps idle
+connections around per host so the prime and command exchange, and every
+later command to the same server, reuse one connection.  Idle connections
+to all hosts together are capped so fanning out to a large number of
+servers does not hold a descriptor open for every one of them.
+"""
+
+#idle connections kept per host
+MAX_PERSISTENT_PER_HOST = 2
+#idle connections kept for all hosts together, least recently used go first
+MAX_IDLE = 128
+#seconds an idle connection is kept, about the life of a prime
+IDLE_TIMEOUT = 120
+CONNECT_TIMEOUT = 30
+
+available = Agent is not None
+
+
+if available:
+    @implementer(IBodyProducer)
+    class _StringProducer(object):
+        """request bodies are small, write them in one go"""
+        def __init__(self, body):
+            self.body = body
+            self.length = len(body)
+
+        def startProducing(self, consumer):
+            consumer.write(self.body)
+            return defer.succeed(None)
+
+        def pauseProducing(self): pass
+        def resumeProducing(self): pass
+        def stopProducing(self): pass
+
+    class _BoundedPool(HTTPConnectionPool):
+        """HTTPConnectionPool with a limit on the idle connections to all
+           hosts together.
+        """
+        maxIdle = MAX_IDLE
+
+        def __init__(self, reactor, persistent=True):
+            HTTPConnectionPool.__init__(self, reactor, persistent)
+            #idle connection -> pool key, oldest first
+            self._idle = OrderedDict()
+
+        def _putConnection(self, key, connection):
+            HTTPConnectionPool._putConnection(self, key, connection)
+            self._idle.pop(connection, None)
+            self._idle[connection] = key
+            #entries of connections that were reused or timed out linger
+            while len(self._timeouts) > self.maxIdle:
+                oldest, oldKey = self._idle.popitem(last=False)
+                if oldest not in self._timeouts: continue
+                self._timeouts[oldest].cancel()
+                self._removeConnection(oldKey, oldest)
+            if len(self._idle) > 2 * self.maxIdle:
+                for oldest in [ c for c in self._idle if c not in self._timeouts ]:
+                    del self._idle[oldest]
+
+
+class HTTPPool(object):
+    """Issues getPage style requests over persistent connections"""
+    def __init__(self, maxPerHost=MAX_PERSISTENT_PER_HOST, maxIdle=MAX_IDLE,
+            idleTimeout=IDLE_TIMEOUT, reactor=None):
+        if not available:
+            raise NotImplementedError('twisted is too old for connection pools')
+        if reactor is None:
+            from twisted.internet import reactor
+        self.reactor = reactor
+        self.pool = _BoundedPool(reactor, persistent=True)
+        self.pool.maxPersistentPerHost = maxPerHost
+        self.pool.maxIdle = maxIdle
+        self.pool.cachedConnectionTimeout = idleTimeout
+        self.agent = Agent(reactor, connectTimeout=CONNECT_TIMEOUT,
+                pool=self.pool)
+        self.requests = 0
+
+    def request(self, url, method='GET', postdata=None, headers=None,
+            timeout=0, **kwargs):
+        """Download a web page as a string, like getPage.
+
+           @param url (string)
+           @param method (string)
+           @param postdata (string)
+           @param headers (dict)
+           @param timeout (number) - seconds, 0 waits forever
+
+           @callback (string) the body of the response
+           @errback twisted.web.error.Error on an error status and
+                    defer.TimeoutError if ``timeout`` expires
+           @return (defer.Deferred)
+        """
+        self.requests += 1
+        headers = Headers(dict( (k, [v]) for (k, v) in \
+                (headers or {}).items() ))
+        body = None
+        if postdata is not None:
+            body = _StringProducer(postdata)
+        d = self.agent.request(method, url, headers, body)
+        d.addCallback(self._body)
+        if not timeout:
+            return d
+        expired = []
+        def _expire():
+            expired.append(True)
+            d.cancel()
+        call = self.reactor.callLater(timeout, _expire)
+        def _finished(result):
+            if call.active():
+                call.cancel()
+            if expired and isinstance(result, Failure):
+                result.trap(defer.CancelledError)
+                raise defer.TimeoutError('Getting %s took longer than %s ' \
+                        'seconds.' % (url, timeout))
+            return result
+        d.addBoth(_finished)
+        return d
+
+    def _body(self, response):
+        d = readBody(response)
+        if response.code >= 400:
+            def _error(body):
+                raise error.Error(str(response.code), response.phrase, body)
+            d.addCallback(_error)
+        return d
+
+    def close(self):
+        """drop every idle connection
+
+           @return (defer.Deferred)
+        """
+        return self.pool.closeCachedConnections()
+
+
+_pool = []
+def getPool():
+    """the L{HTTPPool} shared by the process
+
+       @return L{HTTPPool} or None if twisted is too old
+    """
+    if not available:
+        return None
+    if not _pool:
+        _pool.append(HTTPPool())
+    return _pool[0]
+
+
+__all__ = ['HTTPPool', 'getPool', 'available']
@@ -20,16 +20,14 @@ from droned.models.environment import env
 from droned.models.event import Event
 from droned.models.team import Team
 from droned.models.server import Server
-from droned.errors import ServiceNotAvailable
 import services
 import config
 
-try:
-   jabber = services.getService('jabber')
-   jconfig = jabber.SERVICECONFIG
-except ServiceNotAvailable:
-   jabber = None
-   jconfig = None
+def jabberConfig():
+    """the jabber service configuration, looked up when it is needed as the
+       jabber service may be loaded long after this module
+    """
+    return services.getService('jabber').SERVICECONFIG
 
 def notify_online(event):
     ready = env.ready
@@ -57,6 +55,8 @@ def remove_conversation_subscriptions(event):
 
 def joinEnvironmentalChatRoom(event):
     """determine if we should join a chatroom"""
+    jconfig = jabberConfig()
+    if not jconfig.JABBER_JOIN_CHATROOM: return
     chat = ChatRoom(config.ROMEO_ENV_NAME)
     #make sure the drone can be managed by the room
     username = config.ROMEO_ENV_NAME
@@ -77,7 +77,6 @@ def joinEnvironmentalChatRoom(event):
     #finally join the room
     chat.join()
 
-if jconfig and jconfig.JABBER_JOIN_CHATROOM:
-   Event('jabber-online').subscribe(joinEnvironmentalChatRoom)
+Event('jabber-online').subscribe(joinEnvironmentalChatRoom)
 Event('jabber-online').subscribe(notify_online)
 Event('jabber-offline').subscribe(remove_conversation_subscriptions)
@@ -14,7 +14,13 @@
 #   limitations under the License.
 ###############################################################################
 
-"""This module implements DroneD's logging facilities."""
+"""This module implements DroneD's logging facilities.
+
+   Loggers made by ``logWithContext`` look up their log file once and again
+   only after the log observers change, and return before building an event
+   when the message is ``excessive`` and excessive logging is off.  Log
+   files can be written in batches, see ``logToDir``.
+"""
 import sys, os, time, glob
 from twisted.python.failure import Failure
 from twisted.python.log import FileLogObserver, StdioOnnaStick
@@ -59,7 +65,7 @@ class DailyPurgingLogFile(DailyLogFile):
             timeobj = time.strptime(name, self.path + '.%Y_%m_%d')
             return time.mktime(timeobj)
 
-        result = sorted(logs, key=sort_algoritm)
+        result = sorted(logs, key=sort_algorithm)
         return result
 
     def rotate(self):
@@ -86,8 +92,97 @@ class DailyPurgingLogFile(DailyLogFile):
             os.remove(l)
 
 
+class BufferedLogWriter(object):
+    """Collects application output in memory and appends it to a log file
+       in batches.  Writes are flushed every ``interval`` seconds or as soon
+       as ``limit`` bytes are waiting, whichever comes first.  Rotation is
+       left to the log file, so a L{DailyPurgingLogFile} rotates and purges
+       exactly as it would for unbuffered writes.
+
+       If ``timeFormat`` is given every line is prefixed with the local time,
+       the stamp is only formatted once per second.
+    """
+    def __init__(self, logfile, interval=1.0, limit=65536, timeFormat=None,
+            reactor=None):
+        self.logfile = logfile
+        self.interval = interval
+        self.limit = limit
+        self.timeFormat = timeFormat
+        self.reactor = reactor
+        self.buffer = []
+        self.size = 0
+        self.lines = 0
+        self.timer = None
+        self._second = None
+        self._stamp = ''
+        self._newline = True
+
+    def write(self, data):
+        """queue data for the log file"""
+        if not data: return
+        self.lines += data.count('\n')
+        if self.timeFormat:
+            data = self._timestamp(data)
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= self.limit or self.interval <= 0:
+            self.flush()
+        elif not self.timer:
+            if not self.reactor:
+                from twisted.internet import reactor
+                self.reactor = reactor
+            self.timer = self.reactor.callLater(self.interval, self.flush)
+
+    def _timestamp(self, data):
+        now = int(time.time())
+        if now != self._second:
+            self._second = now
+            self._stamp = time.strftime(self.timeFormat,
+                    time.localtime(now)) + ' '
+        chunks = []
+        parts = data.split('\n')
+        last = len(parts) - 1
+        for i, part in enumerate(parts):
+            if part and self._newline:
+                chunks.append(self._stamp)
+            chunks.append(part)
+            if i < last:
+                chunks.append('\n')
+                self._newline = True
+            elif part:
+                self._newline = False
+        return ''.join(chunks)
+
+    def flush(self):
+        """append everything that is waiting to the log file"""
+        if self.timer and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        if not self.buffer: return
+        data = ''.join(self.buffer)
+        self.buffer = []
+        self.size = 0
+        self.logfile.write(data)
+        self.logfile.flush()
+
+    def close(self):
+        """flush and close the log file"""
+        self.flush()
+        self.logfile.close()
+
+
 class MyLogObserver(FileLogObserver):
     timeFormat = "[%Y-%m-%d %H:%M:%S]"
+    _second = None
+    _stamp = ''
+
+    def formatTime(self, when):
+        """the time stamp only changes once a second, format it once"""
+        second = int(when)
+        if second != self._second:
+            self._second = second
+            self._stamp = FileLogObserver.formatTime(self, when)
+        return self._stamp
 
 
 class StdioKabob(StdioOnnaStick):
@@ -102,7 +197,38 @@ class StdioKabob(StdioOnnaStick):
             self.write(line)
 
 #Initialization API
-logs = {}
+class _LogRegistry(dict):
+    """The log observers by type, counts changes so that loggers can cache
+       their destination.
+    """
+    generation = 0
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.generation += 1
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.generation += 1
+
+    def pop(self, *args):
+        self.generation += 1
+        return dict.pop(self, *args)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.generation += 1
+
+    def setdefault(self, key, default=None):
+        self.generation += 1
+        return dict.setdefault(self, key, default)
+
+    def clear(self):
+        dict.clear(self)
+        self.generation += 1
+
+logs = _LogRegistry()
+_writers = [] #buffered log files, see flushLogs
 
 def logToStdout(timestamp=False):
     """Call this to cause all log messages to go to stdout"""
@@ -113,51 +239,139 @@ def logToStdout(timestamp=False):
     sys.stderr = StdioKabob(1)
 
 
-def logToDir(directory='logs', LOG_TYPE=('console',), OBSERVER=MyLogObserver):
+def logToDir(directory='logs', LOG_TYPE=('console',), OBSERVER=MyLogObserver,
+        flushInterval=0):
     """Call this to write logs to the specified directory,
        optionally override the FileLogObserver.
+
+       With a ``flushInterval`` log events are collected by a
+       L{BufferedLogWriter} and written every ``flushInterval`` seconds
+       instead of one write and flush per event.
+    """
+    for name in LOG_TYPE:
+        logfile = _openLogFile(directory, name)
+        if flushInterval > 0:
+            logfile = BufferedLogWriter(logfile, interval=flushInterval)
+            _writers.append(logfile)
+        observer = OBSERVER(logfile)
+        if flushInterval > 0:
+            observer.flush = lambda: None #the writer flushes on it's own
+        logs[name] = observer
+
+
+def flushLogs():
+    """write everything the buffered log files are holding, used at
+       shutdown
+    """
+    for writer in _writers:
+        try: writer.flush()
+        except: pass
+
+
+def bufferedLogToDir(directory, name, **kwargs):
+    """Call this to get a L{BufferedLogWriter} for the log file ``name`` in
+       the specified directory, keyword arguments are passed to the writer.
     """
-    args = ()
+    return BufferedLogWriter(_openLogFile(directory, name), **kwargs)
+
+
+def _openLogFile(directory, name):
     kwargs = {'maxRotatedFiles': 7} #seven days of logs by default
-    try: import config #fix for early logging
-    except: config = None #also works around daemon wrappers
+    config = _getConfig()
     if config and config.RETAINED_LOGS:
         kwargs.update({'maxRotatedFiles': config.RETAINED_LOGS})
-    for name in LOG_TYPE:
-        path = os.path.join(directory, name + '.log')
-        logfile = DailyPurgingLogFile.fromFullPath(path, *args, **kwargs)
-        logs[name] = OBSERVER(logfile)
+    path = os.path.join(directory, name + '.log')
+    return DailyPurgingLogFile.fromFullPath(path, **kwargs)
 
 
 #Logging API
 def log(message="", **context):
     """Log a message, with some optional context parameters"""
+    if context.get('excessive') and not _excessive():
+        return
     event = create_log_event(message, context)
     if event.get('discard'):
         return
     destination = get_destination(event)
+    _emit(destination, event)
+
+
+def logWithContext(**context):
+    """Create a log() function that assumes the given context parameters by default"""
+    return ContextLogger(context)
+
+
+class ContextLogger(object):
+    """log() with default context parameters, see L{logWithContext}.
+
+       Calls without extra context parameters build the event from a single
+       copy of the defaults and emit it to the cached destination.
+    """
+    def __init__(self, context):
+        self.context = context
+        self.system = context.get('system') or context.get('type') or 'console'
+        self.excessive = bool(context.get('excessive'))
+        self.isError = bool(context.get('error'))
+        self.warning = bool(context.get('warning'))
+        self._destination = None
+        self._generation = None
+
+    #lets hot paths skip formatting a message that will be discarded
+    enabled = property(lambda s: not s.excessive or _excessive())
+
+    @property
+    def destination(self):
+        if self._generation != logs.generation:
+            self._destination = get_destination(self.context)
+            self._generation = logs.generation
+        return self._destination
+
+    def __call__(self, message="", **kwargs):
+        if kwargs:
+            context = self.context.copy()
+            context.update(kwargs)
+            return log(message, **context)
+        if self.excessive and not _excessive():
+            return
+        event = self.context.copy()
+        if self.warning:
+            message = '[WARNING] %s' % (message,)
+        if self.isError:
+            event['isError'] = True
+        event['message'] = (message,) #stupid hack for twisted...
+        event['time'] = time.time()
+        event['system'] = self.system
+        _emit(self.destination, event)
+
+
+#Internal functions
+_config = None
+
+def _getConfig():
+    """the config module once droned has set it up"""
+    global _config
+    if _config is None:
+        #early logging and daemon wrappers run without config
+        _config = sys.modules.get('config')
+    return _config
+
+
+def _emit(destination, event):
+    """hand the event to it's destination or complain on stdout"""
     if destination:
         destination.emit(event)
     else:
         print "<<<UNHANDLED LOG EVENT>>> %s" % str(event)
 
 
-def logWithContext(**context):
-    """Create a log() function that assumes the given context parameters by default"""
-    destination = get_destination(context)
-    def _log(message="", **kwargs):
-        myContext = {}
-        myContext.update(context)
-        myContext.update(kwargs)
-        log(message, **myContext)
-    return _log
+def _excessive():
+    """whether excessive log messages are wanted"""
+    config = _getConfig()
+    return not config or getattr(config, 'EXCESSIVE_LOGGING', True)
 
 
-#Internal functions
 def create_log_event(message, context):
     """Internal function used to convert droned log events to Twisted log events"""
-    try: import config #fix for early logging
-    except: config = None #also works around daemon wrappers
     event = {}
     event.update(context)
     event['message'] = message
@@ -170,7 +384,7 @@ def create_log_event(message, context):
     if event.get('warning'):
         event['message'] = '[WARNING] %s' % event['message']
 
-    if event.get('excessive') and config and not config.EXCESSIVE_LOGGING:
+    if event.get('excessive') and not _excessive():
         event['discard'] = True
 
     event['message'] = (event['message'],) #stupid hack for twisted...
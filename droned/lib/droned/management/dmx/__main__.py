@@ -27,54 +27,22 @@ DIRECTORY = os.path.abspath(os.path.dirname(__file__))
 #cool, now setup the droned/kitt lib paths
 sys.path.insert(0,os.path.abspath(os.path.join(DIRECTORY,'..','..','..')))
 
+#the multiplexed supervisor and it's clients, see DMX_MULTIPLEX
+if sys.argv[1:2] == ['--attach']:
+    from droned.management.dmx import client
+    sys.exit(client.main(sys.argv[2:]))
+if sys.argv[1:2] == ['--supervisor']:
+    from droned.management.dmx import supervisor
+    sys.exit(supervisor.main(sys.argv[2:]))
+
 #could probably use some lovin!!!
 unforkedPid = os.getpid()
 childProcessPid = 0
     
 from twisted.internet import protocol, defer
-from twisted.python.log import FileLogObserver, textFromEventDict
-from twisted.python.util import untilConcludes
 import signal
   
-DEFAULT_REACTORS = {
-    'Linux': 'epoll',
-    'FreeBSD': 'kqueue',
-    'SunOS': 'select',
-}
-  
-#helper to get the best reactor
-def set_reactor():
-    import platform
-    REACTORNAME = DEFAULT_REACTORS.get(platform.system(), 'select')
-    #get the reactor in here
-    if REACTORNAME == 'kqueue':
-        from twisted.internet import kqreactor
-        kqreactor.install()
-    elif REACTORNAME == 'epoll':
-        from twisted.internet import epollreactor
-        epollreactor.install()
-    elif REACTORNAME == 'poll':
-        from twisted.internet import pollreactor
-        pollreactor.install()
-    else: #select is the default
-        from twisted.internet import selectreactor
-        selectreactor.install()
-  
-    from twisted.internet import reactor
-    set_reactor = lambda: reactor
-    return reactor
-  
-  
-class ManagedLogger(FileLogObserver):
-    """overriding emit to preserve original logs"""
-    timeFormat = "" #destroy formatting
-  
-    def emit(self, eventDict):
-        """ah, logs should be pretty much as the app intended"""
-        text = textFromEventDict(eventDict)
-        if text is None: return
-        untilConcludes(self.write, text)
-        untilConcludes(self.flush)  # Hoorj!
+from droned.management.dmx.supervisor import set_reactor
   
   
 class DaemonProtocol(protocol.ProcessProtocol):
@@ -82,18 +50,18 @@ class DaemonProtocol(protocol.ProcessProtocol):
     def __init__(self, name, label, r, deferred, **kwargs):
         self.deferred = deferred #callback deferred is always last
         self.reactor = r
-        out = {
-            'type': '%s-%s_out' % (name, label)
-        }
-        err = {
-            'type': '%s-%s_err' % (name, label)
-        }
         self.name = name
         self.label = label
-        #setup application logging
+        #setup buffered application logging
         import droned.logging
-        self.log_stdout = droned.logging.logWithContext(**out)
-        self.log_stderr = droned.logging.logWithContext(**err)
+        writer = dict(interval=settings['flushinterval'],
+                timeFormat=settings['timeformat'], reactor=r)
+        self.stdout = droned.logging.bufferedLogToDir(logdir,
+                '%s-%s_out' % (name, label), **writer)
+        self.stderr = droned.logging.bufferedLogToDir(logdir,
+                '%s-%s_err' % (name, label), **writer)
+        r.addSystemEventTrigger('before', 'shutdown', self.stdout.flush)
+        r.addSystemEventTrigger('before', 'shutdown', self.stderr.flush)
              
     def inConnectionLost(self):
         """inConnectionLost! stdin is closed! (we probably did it)"""
@@ -101,11 +69,11 @@ class DaemonProtocol(protocol.ProcessProtocol):
   
     def errReceived(self, data):
         """write the error message"""
-        self.log_stderr(str(data))
+        self.stderr.write(data)
   
     def outReceived(self, data):
         """write the out message"""
-        self.log_stdout(str(data))
+        self.stdout.write(data)
   
     def outConnectionLost(self):
         """outConnectionLost! The child closed their stdout!"""
@@ -133,6 +101,8 @@ class DaemonProtocol(protocol.ProcessProtocol):
   
     def processExited(self, reason):
         """our process has exited, time to shutdown."""
+        self.stdout.flush()
+        self.stderr.flush()
         sys.stdout.write('%s has exited' % (self.name,))
         if not self.deferred.called:
             self.deferred.errback(reason)
@@ -210,21 +180,15 @@ args = tuple(sys.argv[1:]) #get all args after the original caller
   
   
 #needed for log routing
-logdir = env.pop('DRONED_LOGDIR', os.path.join(os.path.sep, 'tmp'))
-masksignals = bool(env.pop('DRONED_MASK_SIGNALS', True))
-closestdin = bool(env.pop('DRONED_CLOSE_STDIN', True))
-name = env.pop('DRONED_APPLICATION', 'app')
-label = env.pop('DRONED_LABEL', '0')
-usetty = bool(env.pop('DRONED_USE_TTY', '0'))
-path = env.pop('DRONED_PATH', os.path.sep)
-#try to make sure the log dir is clean and organized
-if name not in logdir:
-    t = os.path.join(logdir, name, label)
-    try:
-        if not os.path.exists(t):
-            os.makedirs(t, mode=0755)
-        logdir = t
-    except: pass
+from droned.management.dmx.client import parseEnvironment
+settings = parseEnvironment(env)
+logdir = settings['logdir']
+masksignals = settings['masksignals']
+closestdin = settings['closestdin']
+name = settings['name']
+label = settings['label']
+usetty = settings['usetty']
+path = settings['path']
   
   
 #we only need to fork once b/c spawn in droned took care of the second fork
@@ -243,40 +207,15 @@ if args and os.path.exists(args[0]):
         sys.stdout = droned.logging.StdioKabob(0)
         sys.stderr = droned.logging.StdioKabob(1)
   
-        maxfd = 4096 #maybe high
-        try:
-            import resource # Resource usage information.
-            maxfd = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
-            if (maxfd == resource.RLIM_INFINITY):
-                maxfd = 4096 #maybe high
-        except: pass
-  
-        # Iterate through and close all file descriptors.
-        for fd in range(0, maxfd):
-            try: os.close(fd)
-            except OSError: pass #ignore
-        os.open(
-            hasattr(os, "devnull") and os.devnull or "/dev/null",
-            os.O_RDWR
-        )
-        os.dup2(0, 1)
-        os.dup2(0, 2)
-        #create logging contexts
-        loggers = [
-            '%s-%s_out' % (name, label),
-            '%s-%s_err' % (name, label),
-        ]
+        #close only the descriptors that are actually open
+        from kitt.daemon import closeDescriptors, detachStdio
+        closeDescriptors(maxfd=4096)
+        detachStdio()
         #defaults for logging are pretty good
         droned.logging.logToDir(directory=logdir)
   
-        #setup logging
+        #application logging is buffered by DaemonProtocol
         reactor = set_reactor()
-        #preserve application logging, but mixin daily rotation
-        droned.logging.logToDir(
-            directory=logdir,
-            LOG_TYPE=tuple(loggers),
-            OBSERVER=ManagedLogger
-        )
         #create our wrapper
         dmx = DaemonWrapper(reactor, name, label, args[0], args[1:], env)
   
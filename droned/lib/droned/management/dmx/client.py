@@ -0,0 +1,267 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+__doc__ = """Talks to the multiplexed dmx supervisor over it's unix socket.
+
+   This module only uses the standard library, it runs in the short lived
+   ``dmx --attach`` process that DroneD spawns for every managed application
+   when ``DMX_MULTIPLEX`` is enabled.  The attach process hands the command
+   line and environment to the supervisor, prints the ``Daemon Pid:``
+   handshake that ``ApplicationProtocol`` looks for and exits.
+
+   The supervisor outlives the application that happened to start it, so it
+   is started with DroneD's own environment and log directory, which DroneD
+   passes along in ``DRONED_SUPERVISOR_ENV``.  The application's environment
+   only travels in it's spawn request.
+"""
+
+import os
+import sys
+import time
+import errno
+import socket
+import signal
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+#directory of the dmx package, python can execute it directly
+DMX_PATH = os.path.abspath(os.path.dirname(__file__))
+#how long we are willing to wait for an autostarted supervisor
+STARTUP_TIMEOUT = 30.0
+#how long we are willing to wait for any single reply
+REPLY_TIMEOUT = 60.0
+#environment for an autostarted supervisor, see supervisorEnvironment
+SUPERVISOR_ENV = 'DRONED_SUPERVISOR_ENV'
+
+
+class SupervisorError(Exception): pass
+
+
+def _flag(value):
+    """environment values are strings, '0' is not true"""
+    return str(value).lower() not in ('', '0', 'false', 'no')
+
+
+def parseEnvironment(env):
+    """pop the DRONED_* wrapper settings out of the environment and make
+       sure the log directory for the application exists.
+
+       Application output is buffered for DRONED_LOG_FLUSH_INTERVAL seconds
+       and lines are stamped with DRONED_LOG_TIMEFORMAT (strftime) if it is
+       set, both can be given in the START_ENV of an application.
+
+       @param env (dict) - modified in place
+       @return (dict)
+    """
+    settings = {
+        'logdir': env.pop('DRONED_LOGDIR', os.path.join(os.path.sep, 'tmp')),
+        'masksignals': _flag(env.pop('DRONED_MASK_SIGNALS', True)),
+        'closestdin': _flag(env.pop('DRONED_CLOSE_STDIN', True)),
+        'name': env.pop('DRONED_APPLICATION', 'app'),
+        'label': env.pop('DRONED_LABEL', '0'),
+        'usetty': _flag(env.pop('DRONED_USE_TTY', '0')),
+        'path': env.pop('DRONED_PATH', os.path.sep),
+        'flushinterval': float(env.pop('DRONED_LOG_FLUSH_INTERVAL', 1.0)),
+        'timeformat': env.pop('DRONED_LOG_TIMEFORMAT', None) or None,
+    }
+    #try to make sure the log dir is clean and organized
+    if settings['name'] not in settings['logdir']:
+        t = os.path.join(settings['logdir'], settings['name'],
+                settings['label'])
+        try:
+            if not os.path.exists(t):
+                os.makedirs(t, mode=0755)
+            settings['logdir'] = t
+        except: pass
+    return settings
+
+
+def supervisorEnvironment(environ, logdir):
+    """the environment a supervisor is started with, ``environ`` without
+       the DRONED_* wrapper settings and logging to ``logdir``
+
+       @param environ (dict) - DroneD's environment
+       @param logdir (string)
+       @return (dict)
+    """
+    env = {}
+    for var, val in environ.items():
+        if var.startswith('DRONED_'): continue
+        try: env[var.decode('utf-8')] = val.decode('utf-8')
+        except UnicodeError: pass #can't be serialized, do without
+    env[u'DRONED_LOGDIR'] = logdir.decode('utf-8')
+    return env
+
+
+def request(socketPath, message, timeout=REPLY_TIMEOUT):
+    """send one request to the supervisor and wait for the reply
+
+       @param socketPath (string)
+       @param message (dict)
+       @param timeout (float)
+       @raise socket.error - when the supervisor is not reachable
+       @raise SupervisorError - when the supervisor refuses the request
+       @return (dict)
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(socketPath)
+        sock.sendall(json.dumps(message) + '\n')
+        data = ''
+        while '\n' not in data:
+            chunk = sock.recv(4096)
+            if not chunk: break
+            data += chunk
+    finally:
+        sock.close()
+    if not data:
+        raise SupervisorError('supervisor closed the connection')
+    reply = json.loads(data.split('\n', 1)[0])
+    if 'error' in reply:
+        raise SupervisorError(reply['error'])
+    return reply
+
+
+def startSupervisor(socketPath, env=None):
+    """start a supervisor in the background, it daemonizes itself
+
+       @param socketPath (string)
+       @param env (dict) - see L{supervisorEnvironment}
+       @return None
+    """
+    import subprocess
+    if env is not None:
+        env = dict((k.encode('utf-8'), v.encode('utf-8')) for (k, v) in \
+                env.items())
+    devnull = open(hasattr(os, 'devnull') and os.devnull or '/dev/null', 'r+')
+    try:
+        #we must not leak droned's pipes to the long lived supervisor
+        subprocess.Popen([sys.executable, DMX_PATH, '--supervisor', socketPath],
+            stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True,
+            cwd=os.path.sep, env=env).wait()
+    finally:
+        devnull.close()
+
+
+def connect(socketPath, message, env=None, timeout=STARTUP_TIMEOUT):
+    """send a request, starting the supervisor if nobody is listening
+
+       @param socketPath (string)
+       @param message (dict)
+       @param env (dict) - environment for an autostarted supervisor
+       @param timeout (float) - how long to wait for the supervisor
+       @return (dict)
+    """
+    started = False
+    expire = time.time() + timeout
+    while True:
+        try: return request(socketPath, message)
+        except socket.error, e:
+            code = e.args and e.args[0]
+            if code not in (errno.ENOENT, errno.ECONNREFUSED):
+                raise
+            if time.time() > expire:
+                raise SupervisorError('no supervisor listening on %s' % \
+                        (socketPath,))
+            if not started:
+                startSupervisor(socketPath, env)
+                started = True
+            time.sleep(0.1)
+
+
+def spawn(socketPath, argv, env, supervisorEnv=None):
+    """ask the supervisor to run a command line
+
+       @param socketPath (string)
+       @param argv (list)
+       @param env (dict) - including the DRONED_* wrapper settings
+       @param supervisorEnv (dict) - environment for an autostarted
+           supervisor, see L{supervisorEnvironment}
+       @return (int) pid of the application
+    """
+    message = {'action': 'spawn', 'argv': list(argv), 'env': env}
+    return int(connect(socketPath, message, env=supervisorEnv)['pid'])
+
+
+def kill(socketPath, name, label, signum=signal.SIGTERM):
+    """ask the supervisor to signal an application instance
+
+       @param socketPath (string)
+       @param name (string)
+       @param label (string)
+       @param signum (int)
+       @return (int) pid that was signaled
+    """
+    message = {
+        'action': 'signal', 'name': name, 'label': str(label),
+        'signal': int(signum)
+    }
+    return int(request(socketPath, message)['pid'])
+
+
+def children(socketPath):
+    """list the children of the supervisor
+
+       @param socketPath (string)
+       @return (list) of dict
+    """
+    return request(socketPath, {'action': 'list'})['children']
+
+
+def main(argv):
+    """entry point for ``dmx --attach <socket> <command> [args ...]``
+
+       @param argv (list)
+       @return (int) exit code
+    """
+    if len(argv) < 2:
+        sys.stderr.write('usage: dmx --attach <socket> <command> [args]\n')
+        return 255
+    socketPath, argv = argv[0], argv[1:]
+    env = os.environ.copy()
+    try:
+        supervisorEnv = env.pop(SUPERVISOR_ENV, None)
+        if supervisorEnv:
+            supervisorEnv = json.loads(supervisorEnv)
+        else: #not started by droned, at least keep our settings out
+            supervisorEnv = supervisorEnvironment(env,
+                    os.path.join(os.path.sep, 'tmp'))
+        pid = spawn(socketPath, argv, env, supervisorEnv)
+    except Exception, e:
+        sys.stderr.write('dmx supervisor failed to start %s: %s\n' % \
+                (argv[0], e))
+        return 1
+#NOTE droned protocol will look for this on stdout
+    sys.stdout.write('Daemon Pid: %d' % (pid,))
+    sys.stdout.flush()
+    return 0
+
+
+__all__ = [
+    'SupervisorError',
+    'parseEnvironment',
+    'supervisorEnvironment',
+    'request',
+    'connect',
+    'spawn',
+    'kill',
+    'children',
+    'main',
+]
@@ -0,0 +1,280 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+__doc__ = """One dmx process that looks after many managed applications.
+
+   The classic dmx wrapper costs a python interpreter and a reactor for every
+   managed application instance.  The supervisor spawns, logs, signals and
+   reaps all of them from a single reactor.  Children are addressed by their
+   (application, label) pair and requests arrive as one json document per
+   line over a unix socket, see droned.management.dmx.client.
+
+   requests:
+       {"action": "spawn", "argv": [...], "env": {...}} -> {"pid": N}
+       {"action": "signal", "name": n, "label": l, "signal": N} -> {"pid": N}
+       {"action": "list"} -> {"children": [...]}
+"""
+
+import os
+import sys
+import time
+import signal
+
+from twisted.internet import protocol
+from twisted.protocols.basic import LineReceiver
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from droned.management.dmx.client import parseEnvironment
+import droned.logging
+
+SIGNALS = dict((k, v) for v, k in signal.__dict__.iteritems() if \
+        v.startswith('SIG') and not v.startswith('SIG_'))
+
+log = droned.logging.logWithContext(type='dmx')
+
+DEFAULT_REACTORS = {
+    'Linux': 'epoll',
+    'FreeBSD': 'kqueue',
+    'SunOS': 'select',
+}
+
+#helper to get the best reactor
+def set_reactor():
+    import platform
+    REACTORNAME = DEFAULT_REACTORS.get(platform.system(), 'select')
+    #get the reactor in here
+    if REACTORNAME == 'kqueue':
+        from twisted.internet import kqreactor
+        kqreactor.install()
+    elif REACTORNAME == 'epoll':
+        from twisted.internet import epollreactor
+        epollreactor.install()
+    elif REACTORNAME == 'poll':
+        from twisted.internet import pollreactor
+        pollreactor.install()
+    else: #select is the default
+        from twisted.internet import selectreactor
+        selectreactor.install()
+
+    from twisted.internet import reactor
+    return reactor
+
+
+class ChildProtocol(protocol.ProcessProtocol):
+    """tracks one managed application and routes it's output to the same
+       log files the classic dmx wrapper would have used.
+    """
+    def __init__(self, supervisor, name, label, settings):
+        self.supervisor = supervisor
+        self.name = name
+        self.label = label
+        self.settings = settings
+        self.started = time.time()
+        self.pid = 0
+        writer = dict(interval=settings['flushinterval'],
+                timeFormat=settings['timeformat'], reactor=supervisor.reactor)
+        self.stdout = droned.logging.bufferedLogToDir(settings['logdir'],
+                '%s-%s_out' % (name, label), **writer)
+        self.stderr = droned.logging.bufferedLogToDir(settings['logdir'],
+                '%s-%s_err' % (name, label), **writer)
+
+    def connectionMade(self):
+        """Process is running, we close STDIN"""
+        if self.settings['closestdin']:
+            self.transport.closeStdin()
+        self.pid = self.transport.pid
+
+    def outReceived(self, data):
+        """write the out message"""
+        self.stdout.write(data)
+
+    def errReceived(self, data):
+        """write the error message"""
+        self.stderr.write(data)
+
+    def processEnded(self, reason):
+        """our process has exited, release the logs"""
+        code = getattr(reason.value, 'exitCode', None)
+        log('%s [%s] pid %d has exited with %s' % \
+                (self.name, self.label, self.pid, code))
+        self.release()
+        self.supervisor.reap(self)
+
+    def release(self):
+        """flush and close the application logs"""
+        for writer in (self.stdout, self.stderr):
+            try: writer.close()
+            except: pass
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'label': self.label,
+            'pid': self.pid,
+            'started': self.started,
+        }
+
+
+class Supervisor(object):
+    """spawns and reaps children on behalf of many dmx clients"""
+    def __init__(self, reactor):
+        self.reactor = reactor
+        self.children = {}
+
+    def spawn(self, argv, env):
+        """start a managed application
+
+           @param argv (list)
+           @param env (dict) - including the DRONED_* wrapper settings
+           @return (int) pid
+        """
+        if not argv or not os.path.exists(argv[0]):
+            raise ValueError('no such executable %r' % (argv and argv[0],))
+        env = dict((str(k), str(v)) for (k, v) in env.items())
+        settings = parseEnvironment(env)
+        key = (settings['name'], settings['label'])
+        if key in self.children:
+            raise ValueError('%s [%s] is already running with pid %d' % \
+                    (key + (self.children[key].pid,)))
+        child = ChildProtocol(self, key[0], key[1], settings)
+        argv = [str(a) for a in argv]
+        first, args = os.path.basename(argv[0]), argv[1:]
+        if not args or args[0] != first:
+            args = [first] + args #same fix up as droned.clients.command
+        try:
+            self.reactor.spawnProcess(child, argv[0], args=args, env=env,
+                path=settings['path'], usePTY=settings['usetty'])
+        except:
+            child.release()
+            raise
+        self.children[key] = child
+        log('Started %s [%s] with pid %d' % (key + (child.pid,)))
+        return child.pid
+
+    def signal(self, name, label, signum):
+        """send a signal to a managed application
+
+           @param name (string)
+           @param label (string)
+           @param signum (int)
+           @return (int) pid
+        """
+        child = self.children.get((name, str(label)))
+        if not child:
+            raise ValueError('%s [%s] is not running' % (name, label))
+        log('Sending %s to PID: %d' % (SIGNALS.get(signum, signum), child.pid))
+        os.kill(child.pid, signum)
+        return child.pid
+
+    def list(self):
+        return [ c.describe() for c in self.children.values() ]
+
+    def reap(self, child):
+        key = (child.name, child.label)
+        if self.children.get(key) is child:
+            del self.children[key]
+
+    def shutdown(self):
+        """pass termination on to every child"""
+        for child in self.children.values():
+            child.stdout.flush()
+            child.stderr.flush()
+            try: self.signal(child.name, child.label, signal.SIGTERM)
+            except: droned.logging.err('when stopping %s [%s]' % \
+                    (child.name, child.label))
+
+
+class SupervisorProtocol(LineReceiver):
+    """one json request per line, one json reply per line"""
+    delimiter = '\n'
+
+    def lineReceived(self, line):
+        try:
+            message = json.loads(line)
+            reply = self.dispatch(message)
+        except Exception, e:
+            reply = {'error': str(e)}
+        self.sendLine(json.dumps(reply))
+
+    def dispatch(self, message):
+        supervisor = self.factory.supervisor
+        action = message.get('action')
+        if action == 'spawn':
+            return {'pid': supervisor.spawn(message['argv'], message['env'])}
+        if action == 'signal':
+            return {'pid': supervisor.signal(message['name'], message['label'],
+                    int(message.get('signal', signal.SIGTERM)))}
+        if action == 'list':
+            return {'children': supervisor.list()}
+        raise ValueError('unknown action %r' % (action,))
+
+
+class SupervisorFactory(protocol.ServerFactory):
+    protocol = SupervisorProtocol
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+
+
+def main(argv):
+    """entry point for ``dmx --supervisor <socket>``
+
+       @param argv (list)
+       @return (int) exit code
+    """
+    if not argv:
+        sys.stderr.write('usage: dmx --supervisor <socket>\n')
+        return 255
+    socketPath = os.path.abspath(argv[0])
+    logdir = os.environ.get('DRONED_LOGDIR', os.path.join(os.path.sep, 'tmp'))
+    try: os.setsid() #be a leader
+    except: pass
+    if os.fork():
+        return 0 #let the client move on
+    os.chdir(os.path.sep) #be nice
+    os.umask(0) #be pure
+
+    droned.logging.logToDir(directory=logdir, LOG_TYPE=('dmx',))
+    #rotation notices and strays go to our log too
+    droned.logging.logs['console'] = droned.logging.logs['dmx']
+    sys.stdout = droned.logging.StdioKabob(0)
+    sys.stderr = droned.logging.StdioKabob(1)
+
+    reactor = set_reactor()
+    supervisor = Supervisor(reactor)
+    try:
+        #wantPID guards against two supervisors racing for the socket
+        reactor.listenUNIX(socketPath, SupervisorFactory(supervisor),
+                mode=0600, wantPID=True)
+    except Exception:
+        droned.logging.err('supervisor could not listen on %s' % (socketPath,))
+        return 1
+    log('Supervisor listening on %s' % (socketPath,))
+    reactor.addSystemEventTrigger('before', 'shutdown', supervisor.shutdown)
+    reactor.run()
+    return 0
+
+
+__all__ = [
+    'set_reactor',
+    'Supervisor',
+    'SupervisorFactory',
+    'main',
+]
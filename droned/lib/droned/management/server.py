@@ -14,56 +14,115 @@
 #   limitations under the License.
 ###############################################################################
 
-from twisted.internet.task import LoopingCall
-from twisted.internet.defer import Deferred
+from collections import deque
+from twisted.internet.defer import Deferred, maybeDeferred
 from droned.logging import logWithContext
 import config
+import time
 
 log = logWithContext(type='action')
 
 
 class ServerManager(object):
+    """Queues commands for a server and runs them as soon as both a global
+       (MAX_CONCURRENT_COMMANDS) and a per server
+       (MAX_CONCURRENT_COMMANDS_PER_SERVER) slot is free.
+    """
     runningCommands = 0
+    queued = 0
+    #managers with queued commands that are waiting on a global slot
+    ready = deque()
+    draining = False
+    #queue latency over all servers
+    started = 0
+    totalWait = 0.0
+    maxWait = 0.0
 
     def __init__(self, server):
         self.server = server
-        self.queuedCommands = []
-        self.queueRunner = LoopingCall(self._runQueued)
+        self.queuedCommands = deque()
+        self.running = 0
+        self.scheduled = False
 
 
     def run(self, command, **kwargs):
         if config.DO_NOTHING_MODE:
             command = 'ping'
         deferredResult = Deferred()
-        self.queuedCommands.append( (command,kwargs,deferredResult) )
-
-        if len(self.queuedCommands) == 1:
-            if self.queueRunner.running:
-                self.queueRunner.stop() # stop & start causes immediate execution
-
-        if not self.queueRunner.running:
-            self.queueRunner.start(config.SERVER_MANAGEMENT_INTERVAL)
-
+        self.queuedCommands.append( (command,kwargs,deferredResult,time.time()) )
+        ServerManager.queued += 1
+        self._ready()
+        ServerManager._drain()
         return deferredResult
 
 
-    def _runQueued(self):
-        if not self.queuedCommands:
-            self.queueRunner.stop()
-        elif self.runningCommands < config.MAX_CONCURRENT_COMMANDS:
-            (command,kwargs,deferredResult) = self.queuedCommands.pop(0)
-            self.__class__.runningCommands += 1
-            deferredResult.addBoth(self._commandCompleted)
-            self.dronedCommand(command, **kwargs).chainDeferred( deferredResult )
-            if not self.queuedCommands:
-                self.queueRunner.stop()
+    def _ready(self):
+        if self.queuedCommands and not self.scheduled:
+            self.scheduled = True
+            ServerManager.ready.append(self)
+
+
+    @staticmethod
+    def _drain():
+        """start queued commands while there are free slots"""
+        if ServerManager.draining: return #a completion is already draining
+        ServerManager.draining = True
+        try:
+            perServer = getattr(config, 'MAX_CONCURRENT_COMMANDS_PER_SERVER',
+                    config.MAX_CONCURRENT_COMMANDS)
+            ready = ServerManager.ready
+            while ready and \
+                    ServerManager.runningCommands < config.MAX_CONCURRENT_COMMANDS:
+                manager = ready.popleft()
+                manager.scheduled = False
+                if manager.running >= perServer:
+                    continue #rescheduled when one of it's commands completes
+                if not manager.queuedCommands: continue
+                manager._start(manager.queuedCommands.popleft())
+                manager._ready() #round robin between servers
+        finally:
+            ServerManager.draining = False
+
+
+    def _start(self, queued):
+        (command,kwargs,deferredResult,queuedAt) = queued
+        wait = time.time() - queuedAt
+        ServerManager.started += 1
+        ServerManager.totalWait += wait
+        ServerManager.maxWait = max(ServerManager.maxWait, wait)
+        ServerManager.runningCommands += 1
+        ServerManager.queued -= 1
+        self.running += 1
+        #free the slot before the caller's callbacks run
+        d = maybeDeferred(self.dronedCommand, command, **kwargs)
+        d.addBoth(self._commandCompleted)
+        d.chainDeferred(deferredResult)
 
 
     def _commandCompleted(self, outcome):
-        self.__class__.runningCommands -= 1
+        ServerManager.runningCommands -= 1
+        self.running -= 1
+        self._ready()
+        ServerManager._drain()
         return outcome
 
 
+    @staticmethod
+    def statistics():
+        """queue depth and latency over all servers
+
+           @return (dict)
+        """
+        return {
+            'running': ServerManager.runningCommands,
+            'queued': ServerManager.queued,
+            'started': ServerManager.started,
+            'mean_wait': ServerManager.started and \
+                    ServerManager.totalWait / ServerManager.started or 0.0,
+            'max_wait': ServerManager.maxWait,
+        }
+
+
     def dronedCommand(self, command, **kwargs):
         log('%s [droned command]: %s' % (self.server.hostname, command))
         return self.server.droned.sendCommand(
@@ -71,3 +130,23 @@ class ServerManager(object):
             config.DRONED_MASTER_KEY,
             **kwargs
         )
+
+
+def status():
+    """used by the commands AdminAction handler"""
+    stats = ServerManager.statistics()
+    stats['limit'] = config.MAX_CONCURRENT_COMMANDS
+    stats['per_server'] = config.MAX_CONCURRENT_COMMANDS_PER_SERVER
+    description = '%(running)d/%(limit)d running (%(per_server)d per server), ' \
+            '%(queued)d queued, %(started)d started, queue wait mean ' \
+            '%(mean_wait).3fs max %(max_wait).3fs' % stats
+    return action.resultContext(description, None, **stats)
+
+
+#expose the queue statistics to droneblaster
+from droned.models.action import AdminAction
+action = AdminAction('commands')
+action.expose('status', status, (),
+    'concurrency and queue latency of commands sent to other servers'
+)
+action.buildDoc()
@@ -21,6 +21,7 @@ from twisted.words.xish.domish import escapeToXml
 from droned.entity import Entity
 from droned.context import EntityContext
 from droned.errors import ServiceNotAvailable
+from droned.logging import err
 import services
 import config
 
@@ -152,11 +153,27 @@ class Conversation(Entity):
         if not notify: return
         self.say("Your authorization has been revoked by the environment administrator.")
 
+    #conversations with notifications waiting on the shared timer
+    notifying = []
+    notifyTimer = None
+
     def notify(self, event):
         """Tells the remote party that an event occurred"""
         self.notificationQueue.append(event)
         if len(self.notificationQueue) == 1:
-            config.reactor.callLater(1, self.sendNotifications)
+            Conversation.notifying.append(self)
+            if not Conversation.notifyTimer:
+                Conversation.notifyTimer = config.reactor.callLater(1,
+                        Conversation.sendAllNotifications)
+
+    @staticmethod
+    def sendAllNotifications():
+        """one timer sends the notifications of every conversation"""
+        Conversation.notifyTimer = None
+        notifying, Conversation.notifying = Conversation.notifying, []
+        for conversation in notifying:
+            try: conversation.sendNotifications()
+            except: err('unable to notify %s' % (conversation.buddy,))
 
     def sendNotifications(self):
         """Formats and sends notification to the remote party"""
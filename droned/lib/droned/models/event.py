@@ -14,6 +14,7 @@
 #   limitations under the License.
 ###############################################################################
 import traceback
+import time
 from twisted.internet.defer import Deferred
 from twisted.python.failure import Failure
 from droned.entity import Entity
@@ -22,31 +23,150 @@ import config
 
 log = logWithContext(type='events')
 
+#delivery policies
+SYNC = 'sync' #subscribers run inside fire
+DEFERRED = 'deferred' #subscribers run on the next reactor turn
+COALESCE = 'coalesce' #only the last occurrence in a window is delivered
+POLICIES = (SYNC, DEFERRED, COALESCE)
+
 
 class Event(Entity):
+  """Named events with broadcast and keyed subscribers.
+
+     Broadcast subscribers see every occurrence.  Once an event has been
+     told which occurrence parameter identifies the subject with ``keyOn``,
+     subscribers can register under a key and ``fire`` only delivers to the
+     subscribers of the matching key, regardless of how many keys exist.
+
+       Event('scab-lost').keyOn('scab')
+       Event('scab-lost').subscribe(handler, key=scab)
+       Event('scab-lost').fire(scab=scab) #handler and broadcast subscribers
+
+     Every event has a delivery policy, see ``setPolicy``.  Events that are
+     coalesced keep the last occurrence per key (or just the last one if the
+     event is not keyed) until the window closes.
+  """
   enabled = True
 
   def __init__(self, name):
     self.name = name
     self.subscribers = set()
+    self.keyed = {}
+    self.keyParam = None
+    self.policy = SYNC
+    self.window = 0.0
+    self._pending = []
+    self._coalesced = {}
+    self._flushing = None
+    #statistics
+    self.fires = 0
+    self.deliveries = 0
+    self.coalesced = 0
+    self.errors = 0
+    self.handlerTime = 0.0
+    self.maxHandlerTime = 0.0
 
   def fire(self, **params):
     if not self.enabled: return
+    self.fires += 1
+    if not (self.subscribers or self.keyed): return #nobody is listening
     occurrence = Occurrence(self, **params)
     if config.DEBUG_EVENTS:
-      params = ', '.join("%s=%s" % i for i in params.items())
-      log('%s.fire(%s)' % (self, params))
-    for obj in list(self.subscribers):
+      debug = ', '.join("%s=%s" % i for i in params.items())
+      log('%s.fire(%s)' % (self, debug))
+    if self.policy == SYNC:
+      self._dispatch(occurrence)
+    elif self.policy == DEFERRED:
+      self._pending.append(occurrence)
+      self._schedule(0)
+    else:
+      key = self.keyParam and params.get(self.keyParam)
+      try: hash(key)
+      except TypeError: key = id(key)
+      if key in self._coalesced:
+        self.coalesced += 1
+        self._pending.remove(self._coalesced[key])
+      self._coalesced[key] = occurrence
+      self._pending.append(occurrence)
+      self._schedule(self.window)
+
+  def _schedule(self, delay):
+    if self._flushing and self._flushing.active(): return
+    self._flushing = config.reactor.callLater(delay, self.flush)
+
+  def flush(self):
+    """deliver every occurrence that is waiting on the policy"""
+    if self._flushing and self._flushing.active():
+      self._flushing.cancel()
+    self._flushing = None
+    pending, self._pending = self._pending, []
+    self._coalesced.clear()
+    for occurrence in pending:
+      self._dispatch(occurrence)
+
+  def _dispatch(self, occurrence):
+    self._deliver(self.subscribers, occurrence)
+    params = occurrence.params
+    if self.keyParam and self.keyed:
+      try: subscribers = self.keyed.get(params.get(self.keyParam))
+      except TypeError: subscribers = None #unhashable key
+      if subscribers:
+        self._deliver(subscribers, occurrence)
+        if not subscribers:
+          self.keyed.pop(params.get(self.keyParam), None)
+
+  def _deliver(self, subscribers, occurrence):
+    for obj in list(subscribers):
+      started = time.time()
       try:
         if isinstance(obj, Deferred):
           if not obj.called:
             obj.callback(occurrence)
-          self.subscribers.remove(obj)
+          subscribers.discard(obj)
         else:
           obj(occurrence)
       except:
+        self.errors += 1
         log('%s.fire() subscriber %s raised an exception' % (self, obj), error=True, failure=Failure())
         err()
+      cost = time.time() - started
+      self.deliveries += 1
+      self.handlerTime += cost
+      if cost > self.maxHandlerTime:
+        self.maxHandlerTime = cost
+
+  def setPolicy(self, policy, window=0.0):
+    """choose how occurrences are delivered
+
+       @param policy (string) one of SYNC, DEFERRED or COALESCE
+       @param window (float) seconds to coalesce occurrences for
+       @return (Event)
+    """
+    assert policy in POLICIES, 'unknown event policy %r' % (policy,)
+    if self._pending: self.flush()
+    self.policy = policy
+    self.window = float(window)
+    return self
+
+  def statistics(self):
+    """fire counts and handler timings
+
+       @return (dict)
+    """
+    return {
+      'name': self.name,
+      'policy': self.policy,
+      'window': self.window,
+      'subscribers': len(self.subscribers) + \
+          sum(len(i) for i in self.keyed.values()),
+      'fires': self.fires,
+      'deliveries': self.deliveries,
+      'coalesced': self.coalesced,
+      'pending': len(self._pending),
+      'errors': self.errors,
+      'handler_time': self.handlerTime,
+      'max_handler_time': self.maxHandlerTime,
+    }
 
   def enable(self):
     self.enabled = True
@@ -54,12 +174,28 @@ class Event(Entity):
   def disable(self):
     self.enabled = False
 
-  def subscribe(self, obj):
-    self.subscribers.add(obj)
+  def keyOn(self, param):
+    """deliver keyed subscriptions by the occurrence parameter ``param``"""
+    self.keyParam = param
+    return self
+
+  def subscribe(self, obj, key=None):
+    if key is None:
+      self.subscribers.add(obj)
+    else:
+      assert self.keyParam, '%s is not keyed' % (self,)
+      self.keyed.setdefault(key, set()).add(obj)
     return obj
 
-  def unsubscribe(self, obj):
-    self.subscribers.discard(obj)
+  def unsubscribe(self, obj, key=None):
+    if key is None:
+      self.subscribers.discard(obj)
+      return
+    subscribers = self.keyed.get(key)
+    if subscribers is None: return
+    subscribers.discard(obj)
+    if not subscribers:
+      del self.keyed[key]
 
 
 class Occurrence(object):
@@ -98,3 +234,75 @@ known_events = (
   'release-change',
 )
 map(Event, known_events)
+
+#events that are mostly interesting to the subject of the occurrence
+Event('scab-lost').keyOn('scab')
+
+
+def configure(policies):
+  """set delivery policies by event name
+
+     @param policies (dict) {name: policy | (policy, window)}
+     @return None
+  """
+  for name, policy in policies.items():
+    window = 0.0
+    if isinstance(policy, (list, tuple)):
+      policy, window = policy
+    Event(name).setPolicy(policy, window)
+  exposeAction()
+
+
+def statistics(name=None):
+  """statistics of one event or all events that have been fired
+
+     @param name (string)
+     @return (list) of dict
+  """
+  if name:
+    return [ Event(name).statistics() ]
+  return [ e.statistics() for e in sorted(Event.objects, key=lambda e: e.name) \
+      if e.fires ]
+
+
+def status(name=None):
+  """used by the events AdminAction handler"""
+  lines = []
+  for stats in statistics(name):
+    mean = stats['deliveries'] and \
+        stats['handler_time'] / stats['deliveries'] or 0.0
+    lines.append('%(name)s [%(policy)s]: %(fires)d fired, %(deliveries)d ' \
+        'delivered, %(coalesced)d coalesced, %(errors)d errors' % stats)
+    lines.append('  handlers mean %.3fms max %.3fms' % \
+        (mean * 1000.0, stats['max_handler_time'] * 1000.0))
+  if not lines:
+    lines.append('no events have fired')
+  return _action[0].resultContext('\n'.join(lines), None,
+      events=statistics(name))
+
+
+#the 'events' AdminAction, see exposeAction
+_action = []
+def exposeAction():
+  """expose the event statistics as the 'events' AdminAction
+
+     @return (droned.models.action.AdminAction)
+  """
+  if not _action:
+    from droned.models.action import AdminAction
+    action = AdminAction('events')
+    action.expose('status', status, (),
+      'fire counts and handler times of all events that have fired'
+    )
+    action.expose('event', status, ('name',),
+      'fire counts and handler times of the named event'
+    )
+    action.buildDoc()
+    _action.append(action)
+  return _action[0]
+
+
+def flushAll():
+  """deliver everything that is waiting on a policy, used at shutdown"""
+  for event in list(Event.objects):
+    if event._pending: event.flush()
@@ -16,20 +16,17 @@ class Scab(Entity):
     environ = property(lambda s: s.running and s.process.environ or {})
     cmdline = property(lambda s: s.running and s.process.cmdline or [])
     
-    def __del__(self):
-        Event('scab-lost').unsubscribe(self._cleanup)
-    
     def __init__(self, server, pid):
         self.server = server
         self.process = AppProcess(server, pid)
         self.context = {} #extra information about the scab
-        Event('scab-lost').subscribe(self._cleanup)
+        #keyed, so losing a scab only ever calls it's own cleanup
+        Event('scab-lost').subscribe(self._cleanup, key=self)
         Event('scab-found').fire(scab=self)
-        
+
     def _cleanup(self, occurrence):
-        try:
-            if occurrence.scab == self:
-                Scab.delete(self)
+        Event('scab-lost').unsubscribe(self._cleanup, key=self)
+        try: Scab.delete(self)
         except: pass
 
     @property
@@ -94,19 +94,26 @@ from droned.errors import DroneCommandFailed
 from kitt.decorators import * #we are using a lot of decorators here
 from kitt.keyring import RSAKeyRing
 from droned.models.action import AdminAction, Action
-import fcntl
+import itertools
+import array
 import random
-import struct
 import gc #to list all models
+import sys
 import os
 
+#typecode for unsigned 32 bit integers in the primes file
+PRIME_TYPECODE = array.array('I').itemsize == 4 and 'I' or 'L'
+#primes of the requestor tried against a legacy group message
+MAX_GROUP_PRIMES = 32
+
 class DroneServer(Entity):
     """This model controls the routing of commands from the various services."""
     keyRing = RSAKeyRing('%s' % (config.DRONED_KEY_DIR,))
-    lock = defer.DeferredLock()
 
     def __init__(self):
-        self._primes = set()
+        self._primes = {} #outstanding prime -> requesting host
+        self._primesByHost = {}
+        self._primePool = None
         self.builtins = {
             'help': self.help_action,
             'ping': self.ping_action,
@@ -132,56 +139,102 @@ class DroneServer(Entity):
         """Shows the server version"""
         return "DroneD/%s" % (copyright.version,)
 
-    @synchronizedDeferred(lock)
-    @deferredAsThread #will catch exceptions
-    def getprime(self):
-        pfh = open(config.DRONED_PRIMES)
-        psize = os.stat(config.DRONED_PRIMES)[6]
-        if (psize % 4) != 0 or psize < 4000:
+    def _loadPrimes(self):
+        """preload the primes file into memory"""
+        pfh = open(config.DRONED_PRIMES, 'rb')
+        try:
+            psize = os.fstat(pfh.fileno())[6]
+            if (psize % 4) != 0 or psize < 4000:
+                raise AssertionError("primes file is corrupt/too small")
+            primes = array.array(PRIME_TYPECODE)
+            primes.fromfile(pfh, psize / 4)
+        finally:
             pfh.close()
-            raise AssertionError("primes file is corrupt/too small")
-        try: fcntl.fcntl(pfh.fileno(), fcntl.F_SETFD, fcntl.FD_CLOEXEC)
-        except: pass
-        result = 0
-        while True:
-            try:
-                r = random.randint(0,(psize - 4) / 4) * 4
-                pfh.seek(r)
-                p = pfh.read(4)
-                prime = struct.unpack("!L",p)[0]
-                #makes a blocking call from this thread to the reactor
-                #this is done for thread safety
-                sync = synchronizedInThread()
-                trp = sync(self._trackPrime)
-                result = trp(prime) 
-                break
-            except AssertionError: continue
-        pfh.close()
-        return result
-
-
-    def _trackPrime(self, prime):
+        if sys.byteorder == 'little':
+            primes.byteswap() #the primes file is in network order
+        #getprime relies on every prime in the pool being distinct
+        self._primePool = array.array(PRIME_TYPECODE, sorted(set(primes)))
+
+
+    def getprime(self, host=None):
+        """allocate an unused prime from the preloaded pool
+
+           @param host (string) address of the requestor
+           @callback (int)
+           @return (defer.Deferred)
+        """
+        try:
+            if self._primePool is None:
+                self._loadPrimes()
+            pool = self._primePool
+            if len(self._primes) >= len(pool):
+                raise AssertionError("prime pool is exhausted")
+            while True:
+                prime = pool[random.randint(0, len(pool) - 1)]
+                if prime not in self._primes: break
+            self._trackPrime(prime, host)
+        except:
+            return defer.fail()
+        return defer.succeed(prime)
+
+
+    def _trackPrime(self, prime, host=None):
         """Tracks the prime numbers"""
         assert prime not in self._primes
-        self._primes.add(prime)
+        self._primes[prime] = host
+        self._primesByHost.setdefault(host, set()).add(prime)
         return prime
 
 
-    @synchronizedDeferred(lock)
-    def validateMessage(self, magicNumber):
-        """Is the message meant for me"""
-        for prime in self._primes:
+    def _forgetPrime(self, prime):
+        """stop tracking the prime number"""
+        host = self._primes.pop(prime, None)
+        outstanding = self._primesByHost.get(host)
+        if outstanding is None: return
+        outstanding.discard(prime)
+        if not outstanding:
+            del self._primesByHost[host]
+
+
+    def validateMessage(self, magicNumber, host=None):
+        """Is the message meant for me
+
+           Messages carry the one prime handed out for them, which is
+           looked up directly no matter what address asked for it.  Legacy
+           group messages carry the product of several servers' primes,
+           only up to L{MAX_GROUP_PRIMES} of the primes handed out to
+           ``host`` are tried against those.
+
+           @param magicNumber (int)
+           @param host (string) address of the requestor
+           @callback (bool)
+           @return (defer.Deferred)
+        """
+        prime = None
+        if magicNumber in self._primes:
+            prime = magicNumber
+        elif host is not None:
+            prime = self._groupPrime(magicNumber, host)
+        if prime is None:
+            return defer.succeed(False)
+        #release the prime to prevent replay attacks
+        self._forgetPrime(prime)
+        return defer.succeed(True)
+
+
+    def _groupPrime(self, magicNumber, host):
+        """the prime of ``host`` a legacy group message was made with"""
+        outstanding = self._primesByHost.get(host, ())
+        for prime in itertools.islice(outstanding, MAX_GROUP_PRIMES):
             if (magicNumber % prime) == 0:
-                #release the prime to prevent replay attacks
-                self._primes.discard(prime)
-                return True
-        return False
+                return prime
+        return None
 
 
-    @synchronizedDeferred(lock)
     def releasePrime(self, prime):
         """release the prime"""
-        self._primes.discard(prime)
+        self._forgetPrime(prime)
+        return defer.succeed(None)
 
 
     def get_action(self, action):
@@ -227,8 +280,9 @@ class DroneServer(Entity):
 
 
     def reload_action(self, argstr):
-        """Usage: reload - reload droned rsa keys"""
+        """Usage: reload - reload droned rsa keys and primes"""
         self.keyRing = RSAKeyRing('%s' % (config.DRONED_KEY_DIR,))
+        self._primePool = None #reloaded on the next allocation
 
 
     def ping_action(self, argstr):
@@ -17,16 +17,24 @@
 import os, re
 from types import FunctionType
 from droned.logging import log, err
-from droned.errors import ServiceNotAvailable
 import config
 import services
 
-try: #handle abstaction to service config
-    jabber_service = services.getService('jabber')
-    jabber_config = jabber_service.SERVICECONFIG
-except ServiceNotAvailable:
-    jabber_service = None
-    jabber_config = None
+class _Lookup(object):
+    """handle abstraction to the jabber service and it's config, they are
+       looked up on use as the service may be loaded after the responders
+    """
+    def __init__(self, *path):
+        self._path = path
+
+    def __getattr__(self, attr):
+        obj = services.getService('jabber')
+        for name in self._path:
+            obj = getattr(obj, name)
+        return getattr(obj, attr)
+
+jabber_service = _Lookup()
+jabber_config = _Lookup('SERVICECONFIG')
 
 #holds the responders
 responders = {}
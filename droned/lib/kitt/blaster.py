@@ -56,6 +56,28 @@ def packify(n):
         if not n: return s
 
 
+#a batch message carries an ordered list of commands under one signature
+BATCH_ACTION = 'batch'
+SEQUENTIAL = 'sequential'
+CONCURRENT = 'concurrent'
+BATCH_MODES = (SEQUENTIAL, CONCURRENT)
+
+def batchCommand(commands, mode=SEQUENTIAL):
+    """The command string a batch is signed as, the first line is the batch
+       action and mode and every following line is one command.
+
+       @param commands (list of strings)
+       @param mode (string) - SEQUENTIAL or CONCURRENT
+       @return (string)
+    """
+    assert mode in BATCH_MODES, "Unknown batch mode %s" % (mode,)
+    assert commands, "Empty batch"
+    for command in commands:
+        assert command.strip() and '\n' not in command, \
+                "Invalid batch command %r" % (command,)
+    return '\n'.join(['%s %s' % (BATCH_ACTION, mode)] + list(commands))
+
+
 ###############################################################################
 # Start Serialize/Deserialize helpers
 ###############################################################################
@@ -107,4 +129,5 @@ class Deserialize(_serial):
         return pickle.loads(String)
 
 
-__all__ = ['Deserialize', 'Serialize', 'packify', 'MIMESerialize', 'DIGEST_INIT']
+__all__ = ['Deserialize', 'Serialize', 'packify', 'MIMESerialize', 'DIGEST_INIT',
+    'batchCommand', 'BATCH_ACTION', 'SEQUENTIAL', 'CONCURRENT', 'BATCH_MODES']
@@ -36,7 +36,7 @@ def owndir(USER, DIR):
     except: pass
 
 ###############################################################################
-# Watchdog Services
+# Descriptor Cleanup
 ###############################################################################
 
 from ctypes import *
@@ -45,6 +45,104 @@ import platform
 
 _platform = platform.system().lower()
 
+#directories that list the descriptors this process has open
+FD_DIRECTORIES = ('/proc/self/fd', '/dev/fd')
+#linux uses the same syscall number on every architecture
+SYS_close_range = 436
+
+try:
+    _libc = CDLL(find_library('c'), use_errno=True)
+except: _libc = None
+
+
+def _close_range(first, last):
+    """close_range(2) where the kernel has it
+
+       @return (bool) True if the range was closed
+    """
+    if not _libc or _platform != 'linux': return False
+    func = getattr(_libc, 'close_range', None)
+    if func:
+        result = func(c_uint(first), c_uint(last), c_uint(0))
+    else:
+        result = _libc.syscall(c_long(SYS_close_range), c_uint(first),
+                c_uint(last), c_uint(0))
+    return result == 0
+
+
+def _maxfd(default=1024):
+    try:
+        import resource
+        maxfd = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+        if maxfd == resource.RLIM_INFINITY:
+            maxfd = default
+    except: maxfd = default
+    return maxfd
+
+
+def openDescriptors():
+    """list the descriptors this process has open
+
+       @return (list) of int or None if the platform can't tell us
+    """
+    for directory in FD_DIRECTORIES:
+        try: names = os.listdir(directory)
+        except OSError: continue
+        #the descriptor listdir used is already closed, closing it is harmless
+        return sorted(int(name) for name in names if name.isdigit())
+    return None
+
+
+def closeDescriptors(keep=(), maxfd=1024):
+    """close every open descriptor except the ones in keep.
+
+       Sweeping every possible descriptor up to the hard RLIMIT_NOFILE costs
+       one syscall per descriptor, which adds up to seconds on hosts with a
+       1M+ limit.  We prefer close_range(2), then only close what the kernel
+       says is open and only fall back to the sweep when neither is possible.
+
+       @param keep (iterable) of int
+       @param maxfd (int) - limit of the sweep when RLIMIT_NOFILE is infinite
+       @return None
+    """
+    keep = sorted(set(keep))
+    #close the gaps between the descriptors we are keeping
+    first, ranges = 0, []
+    for fd in keep:
+        if fd > first: ranges.append((first, fd - 1))
+        first = fd + 1
+    ranges.append((first, 0xffffffff))
+    if all(_close_range(a, b) for (a, b) in ranges):
+        return
+    fds = openDescriptors()
+    if fds is None:
+        fds = xrange(_maxfd(maxfd))
+    keep = set(keep)
+    for fd in fds:
+        if fd in keep: continue
+        try: os.close(fd)
+        except OSError: pass #ignore
+
+
+def detachStdio(target=None):
+    """point stdin, stdout and stderr at target, it is expected that the
+       standard descriptors have already been closed.
+
+       @param target (string) - defaults to the null device
+       @return None
+    """
+    if not target:
+        target = hasattr(os, "devnull") and os.devnull or "/dev/null"
+    fd = os.open(target, os.O_RDWR)
+    for std in (0, 1, 2):
+        if fd != std: os.dup2(fd, std)
+    if fd > 2: os.close(fd)
+
+
+###############################################################################
+# Watchdog Services
+###############################################################################
+
 
 # default implementation
 timer = lambda: 0
@@ -89,4 +187,4 @@ class WatchDog(LoopingCall):
         if self.running:
             return self.stop()
 
-__all__ = ['owndir','WatchDog']
+__all__ = ['owndir','openDescriptors','closeDescriptors','detachStdio','WatchDog']
@@ -17,6 +17,7 @@
 from twisted.python.failure import Failure
 from twisted.internet import threads, defer
 from kitt.util import getException
+from kitt import threadpools
 import sys
 import time
 
@@ -40,6 +41,9 @@ def deferredAsThread(func):
 def deferredInThreadPool(pool=None, R=None):
     """This decorator will place a method into a threadpool.
        If you don't provide a pool, a default will be guessed.
+       If ``pool`` is a string the named pool from L{kitt.threadpools}
+       is used, it is looked up when the method is called so it is safe
+       to decorate at import time.
 
        See twisted.internet.threads.deferToThreadPool
 
@@ -47,10 +51,23 @@ def deferredInThreadPool(pool=None, R=None):
        side effects .. ie you are only emitting data, not
        modifying class or server state inside of the thread.
 
+       @param pool (thread pool object or string)
        @param R (reactor)
 
        @return (defer.Deferred)
     """
+    if isinstance(pool, basestring):
+        name = pool
+        def decorator(func):
+            def newfunc(*a, **kw):
+                """I call blocking python code in the named thread pool.
+                   I return a deferred and will fire callbacks or errbacks.
+                """
+                reactor = R or threadpools._getReactor()
+                return threads.deferToThreadPool(reactor,
+                        threadpools.getPool(name, reactor), func, *a, **kw)
+            return newfunc
+        return decorator
     if not R:
         try:
             import config
@@ -138,7 +155,7 @@ def threadSafePoolDeferred(pool=None, R=None):
        side effects .. ie you are modifying class or server state 
        inside of the thread.
 
-       @param pool (thread pool object)
+       @param pool (thread pool object or string)
        @param R (reactor)
        @return (defer.Deferred) 
     """
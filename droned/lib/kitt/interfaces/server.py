@@ -43,19 +43,22 @@ class IDroneModelDroneServer(Interface):
     builtins = Attribute("C{dict} builtin actionable methods")
     server = Attribute("L{kitt.interfaces.IDroneModelServer}")
 
-    def getprime():
+    def getprime(host=None):
         """get a prime number from the prime list
 
+           @param host C{str} address of the requestor
            @callback C{int}
            @return L{defer.Deferred}
         """
 
 #THOUGHTS this may not make sense to have here
-    def validateMessage(magicNumber):
+    def validateMessage(magicNumber, host=None):
         """used to validate remote commands
 
            @param magicNumber C{int}
-           @return C{bool}
+           @param host C{str} address of the requestor
+           @callback C{bool}
+           @return L{defer.Deferred}
         """
 
     def releasePrime(prime):
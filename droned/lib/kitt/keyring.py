@@ -44,6 +44,22 @@ class RSAKeyRing(object):
         return self.publicKeys[keyID].decrypt(text)
 
 
+    def publicVerify(self,keyID,signature,digest):
+        """Check that ``signature`` decrypts to ``digest`` with the public
+           key ``keyID``, the key is parsed once when it is loaded.
+
+           @param keyID (string)
+           @param signature (string)
+           @param digest (string)
+           @return (bool)
+        """
+        assert keyID in self.publicKeys, "Invalid KeyID"
+        try:
+            return self.publicKeys[keyID].decrypt(signature) == digest
+        except ValueError:
+            return False
+
+
     def publicEncrypt(self,keyID,text):
         assert keyID in self.publicKeys, "Invalid KeyID"
         return self.publicKeys[keyID].encrypt(text)
@@ -376,7 +376,7 @@ class _Cache(type):
 #LiveProcess = _Cache('LiveProcess', (LiveProcess,), {})
 #ProcessSnapshot = _Cache('ProcessSnapshot', (ProcessSnapshot,), {})
 
-from kitt.decorators import deferredAsThread, synchronizedDeferred
+from kitt.decorators import deferredInThreadPool, synchronizedDeferred
 from twisted.internet import defer, task
 from twisted.python.failure import Failure
 import time
@@ -472,7 +472,7 @@ class ProcessSnapshot(object):
     def cpuUsage(self):
         return self.info.get('cpuUsage', {'user_util': 0.0, 'sys_util': 0.0})
 
-    @deferredAsThread
+    @deferredInThreadPool('process')
     def _get_updates(self):
         """lots of io in here on most platforms"""
         #each look will keep the process honest
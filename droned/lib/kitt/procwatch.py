@@ -0,0 +1,223 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Be told when a process exits instead of asking if it is still there.
+
+   usage:
+       from kitt.procwatch import getWatcher
+
+       d = getWatcher().watch(pid)
+       d.addCallback(lambda pid: sys.stdout.write('%d is gone' % pid))
+
+   On linux 5.3+ every watched pid gets a pidfd that is registered with the
+   reactor, the kernel makes it readable the moment the process exits.  Where
+   pidfd_open(2) is not available the watched pids, and only those, are
+   checked every ``POLL_INTERVAL`` seconds by a single LoopingCall.
+"""
+
+import os
+import errno
+import platform
+from ctypes import CDLL, c_int, c_long, c_uint, get_errno
+from ctypes.util import find_library
+
+from twisted.internet import defer, task
+from twisted.internet.interfaces import IReadDescriptor
+from twisted.python import log
+from kitt.interfaces import implements
+
+#linux uses the same syscall number on every architecture
+SYS_pidfd_open = 434
+#seconds between checks when we have to poll
+POLL_INTERVAL = 1.0
+
+_libc = None
+if platform.system() == 'Linux':
+    try: _libc = CDLL(find_library('c'), use_errno=True)
+    except: _libc = None
+
+
+def pidfd_open(pid):
+    """get a descriptor that becomes readable when pid exits
+
+       @param pid (int)
+       @raise OSError
+       @return (int)
+    """
+    if not _libc:
+        raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS))
+    fd = _libc.syscall(c_long(SYS_pidfd_open), c_int(pid), c_uint(0))
+    if fd < 0:
+        code = get_errno()
+        raise OSError(code, os.strerror(code))
+    return fd
+
+
+def _supported():
+    try: os.close(pidfd_open(os.getpid()))
+    except OSError: return False
+    return True
+PIDFD_SUPPORTED = _supported()
+
+
+def _alive(pid, inode=None):
+    """poor man's exit check, used when pidfd is not available"""
+    try:
+        os.waitpid(pid, os.WNOHANG) #in case the process is our child
+    except OSError: pass
+    try:
+        if inode: return os.stat('/proc/%d' % (pid,)).st_ino == inode
+        os.kill(pid, 0)
+    except OSError, e:
+        return getattr(e, 'errno', None) == errno.EPERM
+    return True
+
+
+class _PidDescriptor(object):
+    """reactor reader that fires once the process behind a pidfd exits"""
+    implements(IReadDescriptor)
+
+    def __init__(self, watcher, pid, fd):
+        self.watcher = watcher
+        self.pid = pid
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def logPrefix(self):
+        return 'pidfd(%d)' % (self.pid,)
+
+    def doRead(self):
+        self.watcher._exited(self.pid)
+
+    def connectionLost(self, reason):
+        self.close()
+
+    def close(self):
+        if self.fd < 0: return
+        try: os.close(self.fd)
+        except OSError: pass
+        self.fd = -1
+
+
+class ExitWatcher(object):
+    """Tracks exit notifications for many pids"""
+    def __init__(self, reactor, interval=POLL_INTERVAL, usePidfd=None):
+        self.reactor = reactor
+        self.interval = interval
+        if usePidfd is None:
+            usePidfd = PIDFD_SUPPORTED
+        self.usePidfd = usePidfd
+        self.mode = usePidfd and 'pidfd' or 'poll'
+        self._deferreds = {}
+        self._readers = {}
+        self._inodes = {}
+        self._poller = task.LoopingCall(self._poll)
+        self.exits = 0
+
+    watching = property(lambda s: sorted(s._deferreds.keys()))
+
+    def watch(self, pid, inode=None):
+        """get notified when pid exits
+
+           @param pid (int)
+           @param inode (int) - identity of /proc/<pid>, guards against reuse
+           @return (Deferred) fires with pid once the process is gone
+        """
+        pid = int(pid)
+        d = defer.Deferred()
+        if pid in self._deferreds:
+            self._deferreds[pid].append(d)
+            return d
+        self._deferreds[pid] = [d]
+        if self.usePidfd:
+            try: fd = pidfd_open(pid)
+            except OSError, e:
+                #the process is already gone
+                self.reactor.callLater(0, self._exited, pid)
+                return d
+            reader = _PidDescriptor(self, pid, fd)
+            self._readers[pid] = reader
+            self.reactor.addReader(reader)
+            #the pid may have been reused before we opened it
+            if inode and not _alive(pid, inode):
+                self.reactor.callLater(0, self._exited, pid)
+        else:
+            self._inodes[pid] = inode
+            if not self._poller.running:
+                self._poller.start(self.interval, now=False)
+        return d
+
+    def unwatch(self, pid):
+        """stop watching pid, outstanding deferreds never fire"""
+        self._deferreds.pop(pid, None)
+        self._release(pid)
+
+    def _release(self, pid):
+        self._inodes.pop(pid, None)
+        reader = self._readers.pop(pid, None)
+        if reader:
+            self.reactor.removeReader(reader)
+            reader.close()
+        if not self._inodes and self._poller.running:
+            self._poller.stop()
+
+    def _exited(self, pid):
+        self._release(pid)
+        deferreds = self._deferreds.pop(pid, [])
+        if deferreds: self.exits += 1
+        for d in deferreds:
+            try: d.callback(pid)
+            except: log.err()
+
+    def _poll(self):
+        for pid, inode in self._inodes.items():
+            if not _alive(pid, inode):
+                self._exited(pid)
+
+    def stop(self):
+        """drop every watch"""
+        for pid in self._deferreds.keys():
+            self.unwatch(pid)
+
+
+_watcher = None
+
+def getWatcher(R=None):
+    """the shared L{ExitWatcher}
+
+       @param R (reactor)
+       @return (ExitWatcher)
+    """
+    global _watcher
+    if not _watcher:
+        if not R:
+            try:
+                import config
+                R = config.reactor
+            except:
+                from twisted.internet import reactor as R
+        _watcher = ExitWatcher(R)
+    return _watcher
+
+
+__all__ = [
+    'PIDFD_SUPPORTED',
+    'pidfd_open',
+    'ExitWatcher',
+    'getWatcher',
+]
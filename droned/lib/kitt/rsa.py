@@ -15,6 +15,7 @@
 ###############################################################################
 
 import os
+import threading
 from ctypes import *
 from ctypes.util import find_library
 
@@ -27,12 +28,6 @@ libc.fopen.restype = c_void_p
 libc.fclose.argtypes = [c_void_p]
 libc.fclose.restype = None
 
-# <stdlib.h>
-libc.malloc.argtypes = [c_int]
-libc.malloc.restype = c_void_p
-libc.free.argtypes = [c_void_p]
-libc.free.restype = None
-
 # <string.h>
 libc.memcpy.argtypes = [c_void_p, c_void_p, c_int]
 libc.memcpy.restype = c_void_p
@@ -68,6 +63,16 @@ libcrypto.RSA_size.argtypes = [c_void_p]
 libcrypto.RSA_size.restype = c_int
 
 
+class _KeyBuffer(object):
+  """Native output buffer that lives as long as the key does. Saves us a
+     malloc/free round trip on every RSA operation.
+  """
+  def __init__(self, key):
+    self.size = libcrypto.RSA_size(key)
+    self.buf = create_string_buffer(self.size)
+    self.lock = threading.Lock()
+
+
 class PrivateKey(object):
   def __init__(self, path):
     self.path = path
@@ -83,12 +88,13 @@ class PrivateKey(object):
         libcrypto.RSA_free(rsa_key)
       raise Exception("Failed to read RSA private key %s" % path)
     self.key = rsa_key
+    self.buffer = _KeyBuffer(rsa_key)
 
   def encrypt(self, text):
-    return _process(text, libcrypto.RSA_private_encrypt, self.key)
+    return _process(text, libcrypto.RSA_private_encrypt, self.key, self.buffer)
 
   def decrypt(self, text):
-    return _process(text, libcrypto.RSA_private_decrypt, self.key)
+    return _process(text, libcrypto.RSA_private_decrypt, self.key, self.buffer)
 
 
 class PublicKey(object):
@@ -117,32 +123,34 @@ class PublicKey(object):
     libcrypto.EVP_PKEY_free(evp)
 
     self.key = rsa_key
+    self.buffer = _KeyBuffer(rsa_key)
 
   def encrypt(self, text):
-    return _process(text, libcrypto.RSA_public_encrypt, self.key)
+    return _process(text, libcrypto.RSA_public_encrypt, self.key, self.buffer)
 
   def decrypt(self, text):
-    return _process(text, libcrypto.RSA_public_decrypt, self.key)
+    return _process(text, libcrypto.RSA_public_decrypt, self.key, self.buffer)
 
 
 #The real magic happens here
-def _process(source, func, key):
-  dest = ""
-  dest_buf_size = libcrypto.RSA_size(key)
-  dest_buf = libc.malloc( dest_buf_size )
-  if not dest_buf:
-    raise AssertionError("Failed to malloc. Damn.")
-  while source:
-    read_len = min( len(source), dest_buf_size )
-    i = func(read_len, source, dest_buf, key, PADDING)
-
-    if i == -1 or libcrypto.ERR_peek_error():
-      libcrypto.ERR_clear_error()
-      libc.free(dest_buf)
-      raise ValueError("Operation failed due to invalid input")
-
-    dest += string_at(dest_buf, i)
-    source = source[read_len:]
-
-  libc.free(dest_buf)
-  return dest
+def _process(source, func, key, keybuf=None):
+  if keybuf is None:
+    keybuf = _KeyBuffer(key)
+  dest = []
+  dest_buf_size = keybuf.size
+  dest_buf = keybuf.buf
+  keybuf.lock.acquire()
+  try:
+    while source:
+      read_len = min( len(source), dest_buf_size )
+      i = func(read_len, source, dest_buf, key, PADDING)
+
+      if i == -1 or libcrypto.ERR_peek_error():
+        libcrypto.ERR_clear_error()
+        raise ValueError("Operation failed due to invalid input")
+
+      dest.append(string_at(dest_buf, i))
+      source = source[read_len:]
+  finally:
+    keybuf.lock.release()
+  return "".join(dest)
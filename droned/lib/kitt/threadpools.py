@@ -0,0 +1,212 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+"""Named thread pools so that one subsystem can't starve another.
+
+   usage:
+       from kitt.decorators import deferredInThreadPool
+
+       @deferredInThreadPool('process')
+       def blocking_scan(pid): ...
+
+   Pools are created on first use with ``DEFAULT_SIZE`` workers unless they
+   have been sized by ``configure``.  Every pool keeps track of how much work
+   is waiting, how many workers are busy and how long work sat in the queue.
+"""
+
+import threading
+import time
+from twisted.python.threadpool import ThreadPool
+
+#(minthreads, maxthreads) for pools nobody bothered to size
+DEFAULT_SIZE = (0, 5)
+#upper bounds of the wait time histogram in seconds, the last is overflow
+WAIT_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, None)
+
+_pools = {}
+_sizes = {}
+#the 'threads' AdminAction, see exposeAction
+_action = []
+
+
+class MeteredThreadPool(ThreadPool):
+    """ThreadPool that records saturation metrics"""
+    def __init__(self, minthreads=DEFAULT_SIZE[0], maxthreads=DEFAULT_SIZE[1],
+            name=None):
+        ThreadPool.__init__(self, minthreads, maxthreads, name)
+        self._meter = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.maxWait = 0.0
+        self.histogram = [0] * len(WAIT_BUCKETS)
+
+    def callInThreadWithCallback(self, onResult, func, *args, **kw):
+        queued = time.time()
+        def metered(*a, **k):
+            self._started(time.time() - queued)
+            try: return func(*a, **k)
+            finally: self._finished()
+        self._meter.acquire()
+        self.pending += 1
+        self._meter.release()
+        return ThreadPool.callInThreadWithCallback(
+                self, onResult, metered, *args, **kw)
+
+    def _started(self, wait):
+        self._meter.acquire()
+        try:
+            self.pending -= 1
+            self.active += 1
+            self.maxWait = max(self.maxWait, wait)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if bound is None or wait <= bound:
+                    self.histogram[i] += 1
+                    break
+        finally:
+            self._meter.release()
+
+    def _finished(self):
+        self._meter.acquire()
+        self.active -= 1
+        self.completed += 1
+        self._meter.release()
+
+    def statistics(self):
+        """snapshot of the pool metrics
+
+           @return (dict)
+        """
+        self._meter.acquire()
+        try:
+            return {
+                'name': self.name,
+                'min': self.min,
+                'max': self.max,
+                'queued': self.pending,
+                'active': self.active,
+                'completed': self.completed,
+                'max_wait': self.maxWait,
+                'wait_histogram': zip(WAIT_BUCKETS, self.histogram),
+            }
+        finally:
+            self._meter.release()
+
+
+def _getReactor():
+    try:
+        import config
+        return config.reactor
+    except:
+        from twisted.internet import reactor
+        return reactor
+
+
+def getPool(name, R=None):
+    """get the named thread pool, creating and starting it if need be
+
+       @param name (string)
+       @param R (reactor)
+       @return (MeteredThreadPool)
+    """
+    if name in _pools:
+        return _pools[name]
+    if not R: R = _getReactor()
+    minthreads, maxthreads = _sizes.get(name, DEFAULT_SIZE)
+    pool = MeteredThreadPool(minthreads, maxthreads, name)
+    _pools[name] = pool
+    R.callWhenRunning(pool.start)
+    R.addSystemEventTrigger('during', 'shutdown', pool.stop)
+    return pool
+
+
+def configure(settings):
+    """size the named pools, existing pools are adjusted in place
+
+       @param settings (dict) {name: maxthreads | (minthreads, maxthreads)}
+       @return None
+    """
+    for name, size in settings.items():
+        if isinstance(size, (list, tuple)):
+            minthreads, maxthreads = map(int, size)
+        else:
+            minthreads, maxthreads = 0, int(size)
+        _sizes[name] = (minthreads, maxthreads)
+        if name in _pools:
+            _pools[name].adjustPoolsize(minthreads, maxthreads)
+    exposeAction()
+
+
+def listPools():
+    """names of the pools that have been used"""
+    return sorted(_pools.keys())
+
+
+def statistics(name=None):
+    """metrics for one named pool or all of them
+
+       @param name (string)
+       @return (list) of dict
+    """
+    names = name and [name] or listPools()
+    return [ _pools[n].statistics() for n in names if n in _pools ]
+
+
+def status(name=None):
+    """used by the threads AdminAction handler"""
+    lines = []
+    for stats in statistics(name):
+        lines.append('%(name)s: %(active)d/%(max)d active, %(queued)d ' \
+                'queued, %(completed)d completed, max wait %(max_wait).3fs' % \
+                stats)
+        lines.append('  wait ' + ' '.join([ '%s:%d' % \
+                (bound is None and 'inf' or '<=%gs' % bound, count) \
+                for bound, count in stats['wait_histogram'] ]))
+    if not lines:
+        lines.append('no thread pools in use')
+    return _action[0].resultContext('\n'.join(lines), None,
+            pools=statistics(name))
+
+
+def exposeAction():
+    """expose the pool statistics as the 'threads' AdminAction, kitt does
+       not otherwise depend on droned so the action is imported late.
+
+       @return (droned.models.action.AdminAction)
+    """
+    if not _action:
+        from droned.models.action import AdminAction
+        action = AdminAction('threads')
+        action.expose('status', status, (),
+            'queue depth, active workers and wait times of all thread pools'
+        )
+        action.expose('pool', status, ('name',),
+            'queue depth, active workers and wait times of the named pool'
+        )
+        action.buildDoc()
+        _action.append(action)
+    return _action[0]
+
+
+__all__ = [
+    'MeteredThreadPool',
+    'getPool',
+    'configure',
+    'listPools',
+    'statistics',
+    'status',
+    'exposeAction',
+]
@@ -16,8 +16,50 @@
 
 #global service container
 EXPORTED_SERVICES = {}
+#services that have been discovered, {"SERVICENAME": "modname", ...}
+AVAILABLE_SERVICES = {}
+#service dependencies declared with ``SERVICEDEPENDS``
+SERVICE_DEPENDS = {}
+#(time.time() at import, seconds spent importing) for each service module
+LOAD_TIMES = {}
 
-def loadAll():
+import re as _re
+_SERVICENAME = _re.compile(r"^\s*SERVICENAME\s*=\s*['\"]([^'\"]+)['\"]", _re.M)
+_SERVICEDEPENDS = _re.compile(r"^SERVICEDEPENDS\s*=\s*(\(.*?\)|\[.*?\])", _re.M)
+
+def discover():
+    """Find DroneD Services by reading their ``SERVICENAME`` and optional
+       ``SERVICEDEPENDS`` metadata without importing the modules.  Modules
+       that do not declare a ``SERVICENAME`` are mapped by module name.
+
+       :Note technically this is a private method, because the server will
+       hide it from you.
+
+       @return (dict) {"SERVICENAME": "modname", ...}
+    """
+    from ast import literal_eval
+    import os
+    my_dir = os.path.dirname(__file__)
+    for filename in os.listdir(my_dir):
+        if not filename.endswith('.py'): continue
+        if filename == '__init__.py': continue
+        modname = filename[:-3]
+        try:
+            fd = open(os.path.join(my_dir, filename), 'r')
+            try: source = fd.read()
+            finally: fd.close()
+        except IOError: continue
+        match = _SERVICENAME.search(source)
+        name = match and match.group(1) or modname
+        AVAILABLE_SERVICES[name] = modname
+        match = _SERVICEDEPENDS.search(source)
+        if match:
+            try: SERVICE_DEPENDS[name] = tuple(literal_eval(match.group(1)))
+            except (SyntaxError, ValueError): pass
+    return AVAILABLE_SERVICES
+
+
+def loadAll(names=None):
     """Loads all DroneD Services that adhere to the Interface Definition
        of IDroneDService. The resulting dictionary will return in the form
        of {"SERVICENAME": "MODULE", ...}
@@ -25,65 +67,88 @@ def loadAll():
        :Note technically this is a private method, because the server will
        hide it from you.
 
+       @param names (iterable) only import these services, default all
        @return (dict)
     """
+    if not AVAILABLE_SERVICES:
+        discover()
+    for name in AVAILABLE_SERVICES.keys():
+        if names is not None and name not in names: continue
+        loadService(name)
+    return EXPORTED_SERVICES
+
+
+def loadService(name):
+    """Import a discovered service and apply its romeo configuration.
+
+       @param name (string) SERVICENAME
+       @return (object) the service or None if it could not be loaded
+    """
     from kitt.interfaces import IDroneDService
     from twisted.python.log import err
     from twisted.python.failure import Failure
     import warnings
     import config
-    import os
+    import time
 
     global EXPORTED_SERVICES
 
-    my_dir = os.path.dirname(__file__)
-
-    for filename in os.listdir(my_dir):
-        if not filename.endswith('.py'): continue
-        if filename == '__init__.py': continue
-        modname = filename[:-3]
-        mod = None
+    if name in EXPORTED_SERVICES:
+        return EXPORTED_SERVICES[name]
+    if name not in AVAILABLE_SERVICES:
+        discover()
+    modname = AVAILABLE_SERVICES.get(name, name)
+    mod = None
 
-        try:
-            mod = __import__(__name__ + '.' + modname, {}, {}, [modname])
-        except:
-            err(Failure(), 'Exception Caught Importing Service module %s' % \
-                    (modname,))
-            continue #skip further checks
+    started = time.time()
+    try:
+        mod = __import__(__name__ + '.' + modname, {}, {}, [modname])
+    except:
+        err(Failure(), 'Exception Caught Importing Service module %s' % \
+                (modname,))
+        return None
+    finally:
+        LOAD_TIMES[name] = (started, time.time() - started)
 
-        if not mod: continue #fix for sphinx documentation
-        #prefer module level interfaces first and foremost
+    if not mod: return None #fix for sphinx documentation
+    loaded = []
+    singleton = False
+    #prefer module level interfaces first and foremost
+    try:
+        if IDroneDService.providedBy(mod):
+            EXPORTED_SERVICES[mod.SERVICENAME] = mod
+            loaded.append(mod.SERVICENAME)
+            singleton = True #module level interfaces are singleton services
+    except TypeError: pass
+    except:
+        err(Failure(), 'Exception Caught Validating Module Interface %s' % \
+                (modname,))
+    #see if any classes implement the desired interfaces
+    for attr,obj in vars(mod).items():
+        if singleton: break
         try:
-            if IDroneDService.providedBy(mod):
-                EXPORTED_SERVICES[mod.SERVICENAME] = mod
-                continue #module level interfaces are considered singleton services
+            if IDroneDService.implementedBy(obj):
+                EXPORTED_SERVICES[obj.SERVICENAME] = obj() #instantiate now
+                loaded.append(obj.SERVICENAME)
+                warnings.warn('loaded %s' % attr)
+            else:
+                warnings.warn('%s from %s does not provide ' + \
+                        'IDroneDService Interface' % \
+                        (attr,modname))
         except TypeError: pass
         except:
-            err(Failure(), 'Exception Caught Validating Module Interface %s' % \
-                    (name,))
-        #see if any classes implement the desired interfaces
-        for name,obj in vars(mod).items():
-            try:
-                if IDroneDService.implementedBy(obj):
-                    EXPORTED_SERVICES[obj.SERVICENAME] = obj() #instantiate now
-                    warnings.warn('loaded %s' % name)
-                else:
-                    warnings.warn('%s from %s does not provide ' + \
-                            'IDroneDService Interface' % \
-                            (name,modname))
-            except TypeError: pass
-            except:
-                err(Failure(), 'Exception Caught Validating Interface %s' % \
-                        (name,))
-
-    #apply romeo configuration to all services
-    for name, obj in EXPORTED_SERVICES.items():
-        try: obj.SERVICECONFIG.wrapped.update(config.SERVICES.get(name, {}))
+            err(Failure(), 'Exception Caught Validating Interface %s' % \
+                    (attr,))
+
+    #apply romeo configuration to the service
+    for loadedName in loaded:
+        obj = EXPORTED_SERVICES[loadedName]
+        try: obj.SERVICECONFIG.wrapped.update(config.SERVICES.get(loadedName, {}))
         except:
             err(Failure(), 'Exception Caught Setting Configuration %s' % \
                     (modname,))
 
-    return EXPORTED_SERVICES
+    return EXPORTED_SERVICES.get(name)
 
 
 def getService(name):
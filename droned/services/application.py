@@ -21,6 +21,10 @@ __doc__ = """
 The application service is responsible for configuring and managing the life
 cycle of AppManager models.  It will scan crashed AppInstance models and fire
 events accordingly.  This service is driven completely of of romeo.
+
+Running instances are handed to the exit watcher in kitt.procwatch so that a
+crash fires ``instance-crashed`` as soon as the process is gone, the periodic
+scan is left to discover and assimilate processes.
 """
 
 from twisted.python.failure import Failure
@@ -30,7 +34,9 @@ from droned.logging import logWithContext, err
 from kitt.proc import listProcesses, isRunning
 from kitt.util import crashReport, dictwrapper
 from kitt.decorators import deferredAsThread, debugCall
+from kitt.procwatch import getWatcher
 import config
+import time
 import sys
 
 
@@ -40,7 +46,11 @@ SERVICENAME = 'application'
 SERVICECONFIG = dictwrapper({
     'initial_delay': 1.0, #number of seconds to wait on start before scanning
     'recover_interval': 10.0, #number of seconds to wait in between crash searches
-    'recovery_period': 60 #number of seconds between recovery attempts
+    'recovery_period': 60, #number of seconds between recovery attempts
+    #scan interval when exits are reported by pidfd instead of polling
+    'watched_recover_interval': 60.0,
+    #seconds to wait for an exited process to be reaped
+    'exit_settle_time': 1.0,
 })
 
 log = logWithContext(type=SERVICENAME)
@@ -51,6 +61,8 @@ pluginFactory.loadAppPlugins() #get all the app plugins ready to be used
 class ApplicationLoader(Service):
    scanning = defer.succeed(None)
    tracking = set()
+   cooling = set() #instances that crashed recently
+   watched = {}
    first_run = False
 
    def _first_scan(self):
@@ -93,6 +105,8 @@ class ApplicationLoader(Service):
                except: crashReport('ApplicationLoader', self)
        Service.startService(self)
        Event('instance-started').subscribe(self.reset_tracking)
+       Event('instance-started').subscribe(self.watch_occurrence)
+       Event('instance-found').subscribe(self.watch_occurrence)
        #wire allapps action into the server
        drone.builtins.update({
            'allapps': self.allapps_action,
@@ -102,7 +116,85 @@ class ApplicationLoader(Service):
        config.reactor.callLater(SERVICECONFIG.initial_delay, self._start_all_tasks)
 
    def _start_all_tasks(self):
-       self._task.start(SERVICECONFIG.recover_interval)
+       interval = SERVICECONFIG.recover_interval
+       if getWatcher().mode == 'pidfd':
+           interval = max(interval, SERVICECONFIG.watched_recover_interval)
+       log('exit detection by %s, scanning every %s seconds' % \
+               (getWatcher().mode, interval))
+       self._task.start(interval)
+
+   def watch_occurrence(self, occurrence):
+       """watch the instance of an occurrence for it's exit"""
+       try: self.watch_instance(occurrence.instance)
+       except: err('unable to watch instance')
+
+   def watch_instance(self, ai):
+       """register a running local instance with the exit watcher"""
+       if not ai.localInstall: return
+       pid = ai.pid
+       if not pid or self.watched.get(ai) == pid: return
+       if not ai.running: return
+       self.watched[ai] = pid
+       d = getWatcher().watch(pid, ai.inode)
+       d.addCallback(self.instance_exited, ai)
+       d.addErrback(lambda f: log('exit watch failed\n' + f.getTraceback()))
+
+   def instance_exited(self, pid, ai, settle=None):
+       """a watched process went away, decide if that was a crash"""
+       if self.watched.get(ai) == pid:
+           del self.watched[ai]
+       if not self.running: return
+       if not ai.__class__.isValid(ai): return
+       if settle is None:
+           settle = time.time() + SERVICECONFIG.exit_settle_time
+       #the zombie may not have been reaped by it's parent yet
+       if ai.running and ai.pid == pid and time.time() < settle:
+           config.reactor.callLater(0.05, self.instance_exited, pid, ai,
+                   settle)
+           return
+       if ai.running:
+           return self.watch_instance(ai) #restarted or assimilated
+       if ai in self.cooling: return
+       if not ai.crashed or not ai.enabled: return
+       manager = AppManager(ai.app.name)
+       if not manager.running or not manager.discover: return
+       d = self._assimilate(ai, manager)
+       d.addCallback(self._exit_confirmed, ai)
+       d.addErrback(lambda f: log('exit recovery failed\n' + f.getTraceback()))
+
+   def _exit_confirmed(self, running, ai):
+       if running: return #may have assimilated the app
+       if not ai.crashed or not ai.enabled: return
+       self._crashed(ai)
+
+   @defer.deferredGenerator
+   def _assimilate(self, ai, manager):
+       """look for a process that ``ai`` can assimilate
+
+          @return (defer.Deferred) -> bool whether ``ai`` is running
+       """
+       d = manager.model.findProcesses()
+       wfd = defer.waitForDeferred(d)
+       yield wfd
+       for (pid, result) in wfd.getResult():
+           d = manager.model.assimilateProcess(result)
+           wfd2 = defer.waitForDeferred(d)
+           yield wfd2
+           ai2 = wfd2.getResult()
+           if ai2 and isinstance(ai2, AppInstance) and ai2 is ai:
+               Event('instance-found').fire(instance=ai)
+               manager.log('Sucessfully assimilated PID %d' % ai2.pid)
+       yield ai.running
+
+   def _crashed(self, ai):
+       """fire instance-crashed unless ``ai`` crashed recently"""
+       if ai in self.cooling: return
+       #cool off on eventing for a little while
+       self.cooling.add(ai)
+       config.reactor.callLater(SERVICECONFIG.recovery_period,
+           self.cooling.discard, ai
+       )
+       Event('instance-crashed').fire(instance=ai)
 
    def scan_app_instances(self):
        """scan for instance anomolies and fire Events as needed"""
@@ -120,7 +212,9 @@ class ApplicationLoader(Service):
 
    def reset_tracking(self, occurrence):
        """reset tracking criteria when an instance starts"""
-       try: self.tracking.discard(occurrence.instance)
+       try:
+           self.tracking.discard(occurrence.instance)
+           self.cooling.discard(occurrence.instance)
        except: pass
 
 #TODO this loop runs hot b/c of IO, but most of the heavy work is in a thread
@@ -146,30 +240,22 @@ class ApplicationLoader(Service):
                result = None
                if ai.running and not ai.shouldBeRunning:
                    ai.shouldBeRunning = True
-               if ai.running: continue
+               if ai.running:
+                   self.watch_instance(ai)
+                   continue
                manager = AppManager(ai.app.name)
                if not manager.running:
                    continue #skip managers that are not running
                if not manager.discover:
                    continue #app manager claims to be ok
                #look for processes that we can assimilate
-               d = manager.model.findProcesses()
-               wfd = defer.waitForDeferred(d)
+               wfd = defer.waitForDeferred(self._assimilate(ai, manager))
                yield wfd
-               for (pid, result) in wfd.getResult():
-                   d = manager.model.assimilateProcess(result)
-                   wfd2 = defer.waitForDeferred(d)
-                   yield wfd2
-                   ai2 = wfd2.getResult()
-                   if ai2 and isinstance(ai2, AppInstance) and ai2 is ai:
-                       Event('instance-found').fire(instance=ai)
-                       manager.log('Sucessfully assimilated PID %d' % ai2.pid)
-               if ai.running: continue #may have assimilated the app
+               if wfd.getResult(): continue #may have assimilated the app
                if not ai.crashed: continue
                if not ai.enabled: continue #disabled instances are not actionable
                if self.first_run: continue #avoid process table races
-               Event('instance-crashed').fire(instance=ai)
-               #cool off on eventing for a little while
+               self._crashed(ai)
        #keep the process objects up to date
        for process in AppProcess.objects:
            try:
@@ -192,6 +278,11 @@ class ApplicationLoader(Service):
            if x in drone.builtins:
                del drone.builtins[x]
        Event('instance-started').unsubscribe(self.reset_tracking)
+       Event('instance-started').unsubscribe(self.watch_occurrence)
+       Event('instance-found').unsubscribe(self.watch_occurrence)
+       for ai, pid in self.watched.items():
+           getWatcher().unwatch(pid)
+       self.watched.clear()
        for manager in AppManager.objects:
            if manager.running:
                mesg = 'Stopping Application Manager'
@@ -26,6 +26,20 @@ SERVICECONFIG = dictwrapper({
     'DRONED_WEBROOT': os.path.join(os.path.sep, 'var','lib','droned','WEB_ROOT'),
     'DRONED_PORT': 5500,
     'DRONED_PRIME_TTL': 120,
+    #most commands one batch message may carry
+    'DRONED_BATCH_LIMIT': 32,
+    #name -> maxthreads or [minthreads, maxthreads]
+    'DRONED_THREAD_POOLS': {
+        'process': 5,
+        'janitizer': 1,
+        'journal': 1,
+        'gremlin': 2,
+    },
+    #name -> 'sync', 'deferred' or ['coalesce', window seconds]
+    'DRONED_EVENT_POLICIES': {
+        'datapoint_save': 'deferred',
+        'instance-started': 'deferred',
+    },
 })
 
 from twisted.python.failure import Failure
@@ -35,8 +49,10 @@ from twisted.internet import defer, task
 import config
 
 from kitt.util import unpackify
-from kitt.decorators import deferredAsThread
+from kitt.decorators import deferredInThreadPool
 from kitt import blaster
+from kitt import threadpools
+from droned.models import event
 from droned.logging import logWithContext
 from droned.entity import Entity
 from droned.clients import cancelTask
@@ -76,7 +92,7 @@ from droned.models.server import drone
 
 class Gremlin(resource.Resource):
     """stream serialized data out of the server"""
-    @deferredAsThread
+    @deferredInThreadPool('gremlin')
     def _serialize_objects(self, request):
         buf = StringIO()
         for obj in gc.get_objects():
@@ -131,7 +147,7 @@ class Prime(resource.Resource):
                 )
             except: pass
 
-        d = drone.getprime()
+        d = drone.getprime(request.getClientIP())
         d.addCallback(str) #getprime returns an int
         d.addCallback(_render, request)
         return server.NOT_DONE_YET
@@ -169,6 +185,63 @@ class Control(resource.Resource):
             }
 
 
+    def runCommand(self, command):
+        """run one command of a batch message
+
+           @param command (string) - 'action argstr'
+           @callback (dict) the formatted result context of the command
+           @return (defer.Deferred)
+        """
+        args = command.split(None, 1)
+        argstr = len(args) > 1 and args[1] or ""
+        d = defer.maybeDeferred(drone.get_action, args[0])
+        d.addCallback(lambda func: defer.maybeDeferred(func, argstr))
+        def _context(result):
+            context = drone.formatResults(result)
+            if isinstance(context.get('error'), Failure):
+                context['error'] = True #keep it serializable
+            context['command'] = command
+            return context
+        d.addBoth(_context)
+        return d
+
+
+    @defer.deferredGenerator
+    def _sequential(self, commands):
+        results = []
+        for command in commands:
+            wfd = defer.waitForDeferred(self.runCommand(command))
+            yield wfd
+            results.append(wfd.getResult())
+        yield results
+
+
+    def executeBatch(self, commands, mode):
+        """run the commands of a batch message, a failed command does not
+           stop the others.
+
+           @param commands (list of strings)
+           @param mode (string) - blaster.SEQUENTIAL or blaster.CONCURRENT
+           @callback (dict) result context with the context of every
+                     command under 'results', in the order they were given
+           @return (defer.Deferred)
+        """
+        if mode == blaster.CONCURRENT:
+            d = defer.gatherResults([ self.runCommand(c) for c in commands ])
+        else:
+            d = self._sequential(commands)
+        def _summarize(results):
+            failed = len([ r for r in results if r.get('code') ])
+            return {
+                'code' : failed and 1 or 0,
+                'description' : '%d of %d commands failed' % \
+                        (failed, len(results)),
+                'results' : results,
+            }
+        d.addCallback(_summarize)
+        return d
+
+
     @defer.deferredGenerator
     def execute(self, request):
         """interface method to special droned actions"""
@@ -193,34 +266,47 @@ class Control(resource.Resource):
             magicNumber = abs(unpackify(magicStr))
             timestamp = _dict["time"]
             signature = _dict["signature"]
-            if argstr != "":
+            commands = None
+            if action == blaster.BATCH_ACTION:
+                commands = list(_dict["commands"])
+                if len(commands) > config.DRONED_BATCH_LIMIT:
+                    raise AssertionError("Batch of %d commands exceeds %d" % \
+                            (len(commands), config.DRONED_BATCH_LIMIT))
+                payload = str(magicStr) + str(timestamp) + \
+                        blaster.batchCommand(commands, argstr)
+            elif argstr != "":
                 payload = str(magicStr) + str(timestamp) + "%s %s" % \
                     (action,argstr)
             else:
                 payload = str(magicStr) + str(timestamp) + "%s" % (action,)
             digest.update(payload)
             assumed = digest.hexdigest()
-            trusted = drone.keyRing.publicDecrypt(keyID, signature)
+            trusted = drone.keyRing.publicVerify(keyID, signature, assumed)
             #check the magic string
-            d = drone.validateMessage(magicNumber)
+            d = drone.validateMessage(magicNumber, host)
             wfd = defer.waitForDeferred(d)
             yield wfd
             if not wfd.getResult():
                 raise AssertionError("Invalid Magic String")
             if magicNumber == 0:
                 raise AssertionError("Attempted Zero-Attack, dropping request")
-            if trusted != assumed:
-                raise AssertionError("Invalid signature: %s != %s" % \
-                        (assumed, trusted))
-            func = drone.get_action(action)
-            if not func:
-                raise AssertionError("Action %s, Not actionable" % (action,))
-            if argstr != "": #no args hack
-                server_log('Executing "%s %s" for %s@%s' % (action, argstr, keyID, host))
+            if not trusted:
+                raise AssertionError("Invalid signature for %s" % (keyID,))
+            if commands is not None:
+                server_log('Executing %s batch "%s" for %s@%s' % (argstr,
+                        '; '.join(commands), keyID, host))
+                #one result context per command
+                d = self.executeBatch(commands, argstr)
             else:
-                server_log('Executing "%s" for %s@%s' % (action, keyID, host))
-            #get the result of the request as a deferred
-            d = defer.maybeDeferred(func, argstr)
+                func = drone.get_action(action)
+                if not func:
+                    raise AssertionError("Action %s, Not actionable" % (action,))
+                if argstr != "": #no args hack
+                    server_log('Executing "%s %s" for %s@%s' % (action, argstr, keyID, host))
+                else:
+                    server_log('Executing "%s" for %s@%s' % (action, keyID, host))
+                #get the result of the request as a deferred
+                d = defer.maybeDeferred(func, argstr)
             #Format the result of the action
             wfd = defer.waitForDeferred(d)
             yield wfd
@@ -282,6 +368,8 @@ def install(_parentService):
     global SERVICECONFIG
     for var, val in SERVICECONFIG.wrapped.items():
         setattr(config, var, val)
+    threadpools.configure(SERVICECONFIG.DRONED_THREAD_POOLS)
+    event.configure(SERVICECONFIG.DRONED_EVENT_POLICIES)
     parentService = _parentService
 
 def start():
@@ -33,6 +33,8 @@ from romeo.decryption import decrypt
 import config
 
 import os
+import time
+from collections import deque
 
 from kitt.util import dictwrapper
 
@@ -72,6 +74,11 @@ class JabberClient(object):
         'CONVERSATION_RESPONSE_PERIOD': 180,
         'JABBER_JOIN_CHATROOM': False,
         'JABBER_TEAM_ROSTER': os.path.join(config.DRONED_HOMEDIR, 'teams'),
+        'JABBER_SEND_RATE': 10, #messages per second once the burst is spent
+        'JABBER_SEND_BURST': 20,
+        'JABBER_QUEUE_LIMIT': 1000, #messages waiting to be sent
+        'JABBER_DROP_POLICY': 'oldest', #or 'newest' when the queue is full
+        'JABBER_XHTML_CACHE': 256, #rendered message bodies to remember
     }) #interface required attribute
 
     def running(self):
@@ -86,7 +93,12 @@ class JabberClient(object):
         resource = self.SERVICECONFIG.JABBER_RESOURCE
         self.jid = JID("%(user)s@%(server)s/%(resource)s" % locals())
         self.broadcastTask = LoopingCall(self.broadcastPresence)
-        self.sendQueue = []
+        self.outbound = OutboundQueue(self)
+        self.action = AdminAction('jabber')
+        self.action.expose('status', self.outboundStatus, (),
+            'outbound message queue, send rate and xhtml cache metrics'
+        )
+        self.action.buildDoc()
         self.authenticated = False
         #load all jabber responders, after configuration
         import droned.responders
@@ -160,8 +172,7 @@ class JabberClient(object):
         xmlstream.addObserver('/iq', self.receivedIQ)
         xmlstream.addObserver('/error', self.receivedError)
         Event('jabber-online').fire()
-        while self.sendQueue:
-            self.xmlstream.send( self.sendQueue.pop(0) )
+        self.outbound.pump()
 
     def broadcastPresence(self):
         presence = Element( ('jabber:client','presence') )
@@ -169,27 +180,32 @@ class JabberClient(object):
         self.xmlstream.send(presence)
 
     def sendMessage(self, to, body, useHTML=True, groupChat=False):
+        """queue a message, see L{OutboundQueue}"""
+        if useHTML and self.SERVICECONFIG.JABBER_VALIDATE_XML:
+            self.outbound.renderHTML(body) #fail early on bad markup
+        if not self.authenticated:
+            log("not connected, queueing message", warning=True)
+        self.outbound.enqueue(to, body, useHTML, groupChat)
+
+    def outboundStatus(self):
+        """used by the jabber AdminAction handler"""
+        stats = self.outbound.statistics()
+        description = '%(queued)d queued for %(recipients)d recipients, ' \
+                '%(sent)d sent (%(send_rate).2f/s), %(coalesced)d coalesced, ' \
+                '%(dropped)d dropped, xhtml cache %(xhtml_cache_hits)d hits ' \
+                '%(xhtml_cache_misses)d misses' % stats
+        return self.action.resultContext(description, None, **stats)
+
+    def buildMessage(self, to, body, useHTML=True, groupChat=False):
+        """@param body (string) or (list) of strings sent as one message"""
+        if not isinstance(body, list): body = [body]
         message = Element( ('jabber:client','message') )
         message['to'] = to
         message['type'] = (groupChat and 'groupchat') or 'chat'
-        message.addElement('body', None, body)
+        message.addElement('body', None, '\n'.join(body))
         if useHTML:
-            html = message.addElement(
-                'html',
-                'http://jabber.org/protocol/xhtml-im'
-            )
-            htmlBody = html.addElement('body', 'http://www.w3.org/1999/xhtml')
-            htmlBody.addRawXml( unicode(body) )
-            if self.SERVICECONFIG.JABBER_VALIDATE_XML:
-                validateXml( html.toXml() )
-        #safeXml = filter(lambda char: ord(char) < 128, message.toXml())
-        #log('sending message: %s' % safeXml)
-        log('sending message to %s: %s' % (to, body))
-        if self.authenticated:
-            self.xmlstream.send(message)
-        else:
-            log("not connected, queueing message", warning=True)
-            self.sendQueue.append(message)
+            message.addRawXml( self.outbound.renderHTML(body) )
+        return message
 
     def requestAuthorization(self, to):
         request = Element( (None,'iq') )
@@ -300,6 +316,149 @@ class JabberClient(object):
         if failure.check(SASLAuthError):
             log('Will attempt to reconnect in 15 seconds...')
             config.reactor.callLater(15, self.start)
+
+
+class OutboundQueue(object):
+    """Shared outbound scheduler for every conversation and chat room.
+
+       Messages are sent right away while the token bucket allows it,
+       after that ``JABBER_SEND_RATE`` messages per second are sent.  While
+       messages wait (rate limited or disconnected) everything queued for
+       the same recipient is coalesced into a single message.  At most
+       ``JABBER_QUEUE_LIMIT`` messages wait, the ``JABBER_DROP_POLICY``
+       decides whether the oldest or the newest message is dropped.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.recipients = deque() #send order
+        self.pending = {} #(to, groupChat, useHTML) -> [body, ...]
+        self.size = 0
+        self.tokens = float(self.settings.JABBER_SEND_BURST)
+        self.refilled = time.time()
+        self.timer = None
+        self.xhtml = {}
+        self.xhtmlOrder = deque()
+        #metrics
+        self.sent = 0
+        self.messages = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.started = time.time()
+
+    settings = property(lambda s: s.client.SERVICECONFIG)
+
+    def enqueue(self, to, body, useHTML=True, groupChat=False):
+        key = (to, groupChat, useHTML)
+        bodies = self.pending.get(key)
+        if bodies is None:
+            bodies = self.pending[key] = []
+            self.recipients.append(key)
+        elif bodies:
+            self.coalesced += 1
+        bodies.append(body)
+        self.size += 1
+        self.messages += 1
+        while self.size > self.settings.JABBER_QUEUE_LIMIT:
+            self._drop(key)
+        self.pump()
+
+    def _drop(self, newest):
+        if self.settings.JABBER_DROP_POLICY == 'newest':
+            key, index = newest, -1
+        else:
+            key, index = self.recipients[0], 0
+        bodies = self.pending[key]
+        bodies.pop(index)
+        self.size -= 1
+        self.dropped += 1
+        if not bodies:
+            del self.pending[key]
+            self.recipients.remove(key)
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(float(self.settings.JABBER_SEND_BURST),
+                self.tokens + (now - self.refilled) * self.settings.JABBER_SEND_RATE)
+        self.refilled = now
+
+    def pump(self):
+        """send what the rate allows and schedule the rest"""
+        if self.timer and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        if not self.client.authenticated: return
+        self._refill()
+        while self.recipients and self.tokens >= 1.0:
+            key = self.recipients.popleft()
+            bodies = self.pending.pop(key)
+            self.size -= len(bodies)
+            (to, groupChat, useHTML) = key
+            try:
+                message = self.client.buildMessage(to, bodies, useHTML, groupChat)
+                log('sending message to %s: %s' % (to, '\n'.join(bodies)))
+                self.client.xmlstream.send(message)
+                self.sent += 1
+            except:
+                err('unable to send message to %s' % (to,))
+            self.tokens -= 1.0
+        if self.recipients:
+            delay = (1.0 - self.tokens) / max(self.settings.JABBER_SEND_RATE, 0.001)
+            self.timer = config.reactor.callLater(delay, self.pump)
+
+    def renderHTML(self, body):
+        """the xhtml-im element for a body, validated once and cached.
+           Coalesced bodies are each looked up on their own and joined with
+           line breaks.
+
+           @param body (string) or (list) of strings
+           @return (unicode) xml
+        """
+        if isinstance(body, list):
+            if len(body) == 1: return self.renderHTML(body[0])
+            for single in body: self.renderHTML(single) #validate
+            html = Element( ('http://jabber.org/protocol/xhtml-im', 'html') )
+            htmlBody = html.addElement('body', 'http://www.w3.org/1999/xhtml')
+            htmlBody.addRawXml(u'<br/>'.join(map(unicode, body)))
+            return html.toXml()
+        body = unicode(body)
+        xml = self.xhtml.get(body)
+        if xml is not None:
+            self.cacheHits += 1
+            return xml
+        self.cacheMisses += 1
+        html = Element( ('http://jabber.org/protocol/xhtml-im', 'html') )
+        htmlBody = html.addElement('body', 'http://www.w3.org/1999/xhtml')
+        htmlBody.addRawXml(body)
+        xml = html.toXml()
+        if self.settings.JABBER_VALIDATE_XML:
+            validateXml(xml)
+        self.xhtml[body] = xml
+        self.xhtmlOrder.append(body)
+        while len(self.xhtmlOrder) > self.settings.JABBER_XHTML_CACHE:
+            self.xhtml.pop(self.xhtmlOrder.popleft(), None)
+        return xml
+
+    def statistics(self):
+        """send rate and queue metrics
+
+           @return (dict)
+        """
+        elapsed = max(time.time() - self.started, 0.001)
+        return {
+            'queued': self.size,
+            'recipients': len(self.recipients),
+            'messages': self.messages,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'send_rate': self.sent / elapsed,
+            'xhtml_cache_hits': self.cacheHits,
+            'xhtml_cache_misses': self.cacheMisses,
+        }
+
+
 #setup logging after class definition
 log = logWithContext(type=JabberClient.SERVICENAME)
 
@@ -314,4 +473,5 @@ def validateXml(xml):
 # Avoid import circularity
 from droned.models.conversation import Conversation, ChatRoom
 from droned.models.event import Event
+from droned.models.action import AdminAction
 from droned.models.team import Team
@@ -28,13 +28,19 @@ SERVICECONFIG = dictwrapper({
         ],
     }
 })
-import os, re, time
+import os, re, time, stat
 from twisted.application.service import Service
 from twisted.internet import defer, task
 from droned.logging import logWithContext
-from kitt.decorators import synchronizedDeferred, deferredAsThread
+from kitt.decorators import synchronizedDeferred, deferredInThreadPool
 import copy
 
+try: #python3.5+ or the backport from pypi
+    from os import scandir as _scandir
+except ImportError:
+    try: from scandir import scandir as _scandir
+    except ImportError: _scandir = None
+
 __doc__ = """
     config [JANITOR_DICT, AUTOSTART_SERVICES] 
 
@@ -54,6 +60,9 @@ __doc__ = """
 #logging context
 log = logWithContext(type=SERVICENAME)
 
+#number of files to remove before reporting progress
+DELETE_BATCH_SIZE = 500
+
 def ageCompare(f1,f2):
     t1 = os.path.getmtime(f1)
     t2 = os.path.getmtime(f2)
@@ -62,12 +71,92 @@ def ageCompare(f1,f2):
     if t2 < t2: return -1
 
 
+class _DirEntry(object):
+    """minimal stand-in for os.DirEntry when scandir is not available"""
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks: return os.stat(self.path)
+        if self._lstat is None: self._lstat = os.lstat(self.path)
+        return self._lstat
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+
+    def is_dir(self, follow_symlinks=True):
+        if self.is_symlink():
+            return follow_symlinks and os.path.isdir(self.path)
+        return stat.S_ISDIR(self.stat(follow_symlinks=False).st_mode)
+
+
+def scandir(directory):
+    """list a directory once, entries cache their stat information
+
+       @param directory: (string)
+       return list
+    """
+    if _scandir:
+        return list(_scandir(directory))
+    return [ _DirEntry(directory, name) for name in os.listdir(directory) ]
+
+
+class Sweep(object):
+    """statistics about a single janitor sweep"""
+    def __init__(self, name):
+        self.name = name
+        self.scanned = 0
+        self.deleted = 0
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.batch = []
+
+    def remove(self, path, remover=os.unlink):
+        """queue ``path`` for deletion, flushing full batches"""
+        self.batch.append((path, remover))
+        if len(self.batch) >= DELETE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """delete everything that has been queued"""
+        batch, self.batch = self.batch, []
+        failed = 0
+        for path, remover in batch:
+            try: remover(path)
+            except OSError: failed += 1
+        self.deleted += len(batch) - failed
+        if batch:
+            log('%s removed %d files (%d failed)' % \
+                    (self.name, len(batch) - failed, failed))
+
+    def finish(self):
+        self.flush()
+        self.elapsed = time.time() - self.started
+        log('%s sweep scanned %d files, deleted %d in %.3f seconds' % \
+                (self.name, self.scanned, self.deleted, self.elapsed))
+        return self
+
+
+def _removeTree(path):
+    """remove a directory and everything below it"""
+    for base, dirs, myfiles in os.walk(path, topdown=False):
+        for name in myfiles:
+            os.remove(os.path.join(base, name))
+        for name in dirs:
+            os.rmdir(os.path.join(base, name))
+    os.rmdir(path)
+
+
 class Janitizer(Service):
     minute = property(lambda foo: 60)
     hour = property(lambda foo: 3600)
     day = property(lambda foo: 86400)
     week = property(lambda f: 604800)
     oldfiles = {}
+    #statistics from the most recent sweeps
+    sweeps = {}
     #get the watch dictionary from romeo
     watchDict = property(lambda s: SERVICECONFIG.wrapped.get('JANITIZE',{}))
     #lock aquired before starting a thread that modifies class state
@@ -91,50 +180,68 @@ class Janitizer(Service):
 
     #this would have blocked the reactor w/o the thread
     @synchronizedDeferred(busy)
-    @deferredAsThread
+    @deferredInThreadPool(SERVICENAME)
     def garbageCheck(self):
         """Check for file patterns that are removeable"""
         watchDict = copy.deepcopy(self.watchDict) #use locals for safety
+        sweep = Sweep('garbage')
         for directory,garbageList in watchDict.iteritems():
             if not os.path.exists(directory): continue
-            for pattern,limit in garbageList:
-                #blocking method in a thread
-                self.cleanupLinks(directory)
-                files = [os.path.join(directory,f) for f in os.listdir(directory) \
-                        if re.search(pattern,f)]
-                files = sorted(files)
-                if len(files) > int(limit):
-                    log('These files matched:\n\t%s' % '\n\t'.join(files))
-                while len(files) > int(limit):
-                    oldfile = files.pop(0)
-                    log('Deleting %s' % oldfile)
-                    if os.path.islink(oldfile): continue
-                    if os.path.isdir(oldfile):
-                        for base, dirs, myfiles in os.walk(oldfile, topdown=False):
-                            for name in myfiles:
-                                os.remove(os.path.join(base, name))
-                            for name in dirs:
-                                os.rmdir(os.path.join(base, name))
-                        os.rmdir(oldfile)
-                    else: os.unlink(oldfile)
-            #blocking method in a thread
-            self.cleanupLinks(directory)
+            patterns = [ (re.compile(pattern), int(limit)) for \
+                    pattern,limit in garbageList ]
+            if not patterns: continue
+            #cheap rejection of files that no pattern cares about
+            anyPattern = re.compile('|'.join([ '(?:%s)' % p.pattern for \
+                    p,limit in patterns ]))
+            matches = [ [] for p in patterns ]
+            #blocking method in a thread, walks the directory once
+            for entry in self.cleanupLinks(directory, sweep):
+                if not anyPattern.search(entry.name): continue
+                for i, (regex, limit) in enumerate(patterns):
+                    if regex.search(entry.name):
+                        matches[i].append(entry)
+            doomed = {}
+            for (regex, limit), entries in zip(patterns, matches):
+                #what earlier patterns remove is gone by the time this one
+                #is applied, it does not count against this limit
+                entries = [ e for e in entries if e.path not in doomed ]
+                if len(entries) <= limit: continue
+                entries.sort(key=lambda e: e.path)
+                log('%d files matched %s in %s, keeping %d' % \
+                        (len(entries), regex.pattern, directory, limit))
+                for entry in entries[:len(entries) - limit]:
+                    if entry.is_symlink(): continue #links are never removed
+                    doomed[entry.path] = entry
+            for path in sorted(doomed):
+                entry = doomed[path]
+                if entry.is_dir():
+                    sweep.remove(path, _removeTree)
+                else: sweep.remove(path)
+            sweep.flush()
+            #removals above may have orphaned symlinks
+            if doomed: self.cleanupLinks(directory)
+        self.sweeps[sweep.name] = sweep.finish()
+        return sweep
 
 
     #this will block the reactor
-    def cleanupLinks(self, directory):
+    def cleanupLinks(self, directory, sweep=None):
         """cleans broken symlinks
 
            @param directory: (string)
-           return list
+           @param sweep: (Sweep) statistics to update
+           return list of directory entries that are left
         """
-        files = [os.path.join(directory,f) for f in os.listdir(directory)]
-        for f in files[:]:
-            if not os.path.exists(f):
-                log('Removing broken symlink %s' % f)
-                os.unlink(f)
-                files.remove(f)
-        return files
+        entries = []
+        for entry in scandir(directory):
+            if sweep: sweep.scanned += 1
+            if entry.is_symlink() and not os.path.exists(entry.path):
+                log('Removing broken symlink %s' % entry.path)
+                try: os.unlink(entry.path)
+                except OSError: pass
+                continue
+            entries.append(entry)
+        return entries
 
      
     def clean_old_files(self, directory, age, recurse=True):
@@ -151,41 +258,48 @@ class Janitizer(Service):
  
     #this would have blocked the reactor w/o the thread
     @synchronizedDeferred(busy)
-    @deferredAsThread
+    @deferredInThreadPool(SERVICENAME)
     def clean_elderly(self):
         """clean old files in a thread"""
-        for directory in self.oldfiles:
-            self.recursive_clean(directory,*self.oldfiles[directory])
+        sweep = Sweep('elderly')
+        for directory in self.oldfiles.keys():
+            age, recurse = self.oldfiles[directory]
+            self.recursive_clean(directory, age, recurse, sweep)
+        self.sweeps[sweep.name] = sweep.finish()
+        return sweep
 
 
     #this will block the reactor
-    def recursive_clean(self, directory, age, recurse):
-        """recusively clean a directory
+    def recursive_clean(self, directory, age, recurse, sweep=None):
+        """recusively clean old files out of a directory, directories
+           themselves are left alone
 
            @param directory: (string)
            @param age: (float)
            @param recurse: (bool)
+           @param sweep: (Sweep) statistics to update
 
-           return bool
+           return None
         """
-        try: data = map(lambda n: os.path.join(directory,n), os.listdir(directory))
-        except:
+        flush = sweep is None
+        if flush: sweep = Sweep('elderly')
+        try: entries = scandir(directory)
+        except OSError:
             log('could not find directory %s' % directory)
             return
-
-        for node in data:
-            if os.path.isdir(node) and recurse:
-                #blocking method in a thread
-                empty = self.recursive_clean(node,age,recurse)
-                if empty:
-                    try: os.rmdir(node)
-                    except: log('could not remove directory: %s' % node)
-                continue
-            if os.path.isdir(node): continue #in case recurse is False
-            if (time.time() - os.stat(node).st_mtime) > age:             
-                try: os.remove(node)
-                except: log('could not remove file: %s' % node)
-        return bool(os.listdir(directory))
+        cutoff = sweep.started - age
+        for entry in entries:
+            sweep.scanned += 1
+            try:
+                if entry.is_dir():
+                    if not recurse: continue
+                    #blocking method in a thread
+                    self.recursive_clean(entry.path, age, recurse, sweep)
+                    continue
+                if entry.stat().st_mtime < cutoff:
+                    sweep.remove(entry.path, os.remove)
+            except OSError: continue #vanished while we were looking
+        if flush: sweep.finish()
 
 
     def startService(self):
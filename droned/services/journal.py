@@ -33,6 +33,7 @@ from twisted.application.service import Service
 from droned.entity import Entity
 from droned.logging import logWithContext, err
 from droned.models.event import Event
+from kitt import threadpools
 import signal
 import config
 import time
@@ -89,7 +90,8 @@ class Journal(Service):
             if occurence.signum != signal.SIGTERM: return
             log('Attempting to save journal before shutdown.')
         if self.writing.called:
-            self.writing = threads.deferToThread(self.blocking_journal_write)
+            self.writing = threads.deferToThreadPool(config.reactor,
+                    threadpools.getPool(SERVICENAME), self.blocking_journal_write)
         else:
             log('Journal is still being written from previous iteration,' + \
                     ' will hold off until next iteration')
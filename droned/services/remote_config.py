@@ -16,7 +16,12 @@
 
 
 __author__ = "Justin Venus <justin.venus@orbitz.com>"
-__doc__ = """A Service to provide romeo config over droned's command port"""
+__doc__ = """A Service to provide romeo config over droned's command port
+
+Rendered responses are cached by path and output format until romeo is
+reloaded, every response carries an ETag so clients that send it back in
+If-None-Match are answered with 304 Not Modified.
+"""
 from kitt.interfaces import moduleProvides, IDroneDService
 from kitt.util import dictwrapper, getException
 from twisted.web.resource import Resource
@@ -24,14 +29,19 @@ from twisted.web.server import NOT_DONE_YET
 from twisted.web.error import NoResource
 from twisted.python.failure import Failure
 from droned.models.event import Event
+from collections import deque
+import hashlib
 import romeo
 
 moduleProvides(IDroneDService)
 parentService = None
 service = None
 SERVICENAME = 'remote_config'
-SERVICECONFIG = dictwrapper({})
-dependant_service = 'drone'
+SERVICECONFIG = dictwrapper({
+    'REMOTE_CONFIG_CACHE_SIZE': 1024, #number of rendered responses to keep
+})
+SERVICEDEPENDS = ('drone',)
+dependant_service = SERVICEDEPENDS[0]
 
 #output formatters
 try: import simplejson as json
@@ -67,6 +77,134 @@ class _service(object):
         return sys.modules[self.__class__.__module__]
 __module__ = _service().module #feels kinda hacky
 
+###############################################################################
+# Response Cache
+###############################################################################
+class CachedResponse(object):
+    """A rendered response and the validator that identifies it"""
+    def __init__(self, body, contentType):
+        self.body = body
+        self.contentType = contentType
+        self.etag = '"%s"' % hashlib.md5(body).hexdigest()
+
+    def render(self, request):
+        """write the headers and return the body, or 304 if unchanged
+
+           @param request L{twisted.web.server.Request}
+           @return C{str}
+        """
+        if self.contentType:
+            request.setHeader("Content-Type", self.contentType)
+        request.setHeader("ETag", self.etag)
+        match = request.getHeader('if-none-match') or ''
+        tags = [ i.strip() for i in match.split(',') ]
+        if self.etag in tags or '*' in tags:
+            request.setResponseCode(304)
+            return ''
+        return self.body
+
+
+class ResponseCache(object):
+    """Rendered responses and romeo lookups, dropped when romeo reloads.
+
+       romeo.reload replaces the set of environments, holding on to the set
+       we cached against is enough to notice a reload.
+    """
+    def __init__(self):
+        self.source = None
+        self.responses = {}
+        self.order = deque()
+        self.hits = 0
+        self.misses = 0
+        self._reset()
+
+    def _reset(self):
+        self.responses.clear()
+        self.order.clear()
+        self.keymaps = {}
+        self._environments = None
+        self._servers = None
+
+    def validate(self):
+        """forget everything if romeo has been reloaded"""
+        source = romeo.entity.namespace.get('romeo')
+        if source is not self.source:
+            self._reset()
+            self.source = source
+
+    @staticmethod
+    def key(request):
+        return (request.path,
+            tuple(request.args.get('format', [])),
+            tuple(request.args.get('delimiter', []))
+        )
+
+    def get(self, request):
+        """the cached response for the request, the lookup is done once and
+           remembered on the request for the resource that renders it
+
+           @param request L{twisted.web.server.Request}
+           @return L{CachedResponse} or None
+        """
+        try: return request.cachedResponse
+        except AttributeError: pass
+        self.validate()
+        response = self.responses.get(self.key(request))
+        if response: self.hits += 1
+        else: self.misses += 1
+        request.cachedResponse = response
+        return response
+
+    def store(self, request, body):
+        """remember a freshly rendered response
+
+           @param request L{twisted.web.server.Request}
+           @param body C{str}
+           @return L{CachedResponse}
+        """
+        contentType = request.responseHeaders.getRawHeaders(
+                'content-type', [None])[-1]
+        response = CachedResponse(body, contentType)
+        key = self.key(request)
+        if key not in self.responses:
+            self.order.append(key)
+        self.responses[key] = response
+        while len(self.order) > SERVICECONFIG.REMOTE_CONFIG_CACHE_SIZE:
+            self.responses.pop(self.order.popleft(), None)
+        return response
+
+    def keymap(self, entity):
+        """case insensitive lookup table of the keys below an entity
+
+           @param entity L{romeo.foundation.RomeoKeyValue}
+           @return C{dict} {KEY.upper(): KEY}
+        """
+        self.validate()
+        keymap = self.keymaps.get(entity)
+        if keymap is None:
+            keymap = self.keymaps[entity] = dict(
+                (i.upper(), i) for i in entity.keys())
+        return keymap
+
+    @property
+    def environments(self):
+        self.validate()
+        if self._environments is None:
+            self._environments = [ i.get('NAME').VALUE for i in \
+                    romeo.listEnvironments() ]
+        return self._environments
+
+    @property
+    def servers(self):
+        self.validate()
+        if self._servers is None:
+            self._servers = [ i.VALUE for i in \
+                    romeo.grammars.search('select HOSTNAME') ]
+        return self._servers
+
+cache = ResponseCache()
+
+
 def make_dict(romeo_key_value):
     """Converts a RomeoKeyValue object to a dictionary.
 
@@ -158,8 +296,16 @@ class _ConfigResource(Resource):
         if r is self: return self
         return r.getChild(name, request)
 
-    @resource_error
     def render_GET(self, request):
+        response = cache.get(request)
+        if response is None:
+            body = self.render_data(request)
+            if not isinstance(body, str): return body #error resource
+            response = cache.store(request, body)
+        return response.render(request)
+
+    @resource_error
+    def render_data(self, request):
         if 'values' in request.args.get('format', []):
             return self.value_serialize(self.OUTPUT_DATA, request)
         if 'pickle' in request.args.get('format', []):
@@ -182,11 +328,31 @@ class ConfigResouce(_ConfigResource):
         self.putChild('environment', EnvironmentResource())
         self.putChild('server', ServerResource())
 
+    def getChildWithDefault(self, name, request):
+        """skip walking romeo when the response is already cached"""
+        if request.method in ('GET', 'HEAD'):
+            response = cache.get(request)
+            if response is not None:
+                return _CachedResource(response)
+        return _ConfigResource.getChildWithDefault(self, name, request)
+
+
+class _CachedResource(Resource):
+    """Serves a L{CachedResponse}"""
+    isLeaf = True
+
+    def __init__(self, response):
+        Resource.__init__(self)
+        self.response = response
+
+    def render_GET(self, request):
+        return self.response.render(request)
+
 
 class EnvironmentResource(_ConfigResource):
     """HTTP Resource /remote_config/environment"""
     isLeaf = False
-    environments = [ i.get('NAME').VALUE for i in romeo.listEnvironments() ]
+    environments = property(lambda s: cache.environments)
     OUTPUT_DATA = property(lambda s: {'ENVIRONMENTS': s.environments})
 
     def getChild(self, name, request):
@@ -198,7 +364,7 @@ class EnvironmentResource(_ConfigResource):
 class ServerResource(_ConfigResource):
     """HTTP Resource /remote_config/server"""
     isLeaf = False
-    servers = [ i.VALUE for i in romeo.grammars.search('select HOSTNAME') ]
+    servers = property(lambda s: cache.servers)
     OUTPUT_DATA = property(lambda s: {'SERVERS': s.servers})
 
     def getChild(self, name, request):
@@ -236,10 +402,9 @@ class RomeoResource(_ConfigResource):
             if not env:
                 raise romeo.EnvironmentalError('Serious issue for %s' % name.lower())
             return RomeoResource(name, env)
-        key = [ i for i in self.entity.keys() if i.upper() == name.upper() ]
+        key = cache.keymap(self.entity).get(name.upper())
         if not key:
             raise romeo.EnvironmentalError('no such romeo key %s' % name.lower())
-        key = key.pop()
         data = self.entity.get(key)
         if not self.isLeaf:
             self.data = data
@@ -37,12 +37,16 @@ extensible.
 - Provides relationships to disjoint information.
 - Supports inlining additional environment descriptions.
 - Supports encrypted fields.
+- Optionally shares one loaded hostdb between processes, see romeo.query.
 """
 __author__ = "Justin Venus <justin.venus@orbitz.com>"
 
 #This is used by the createrdb utility. DONOT Modify it
 CACHEDB = 'cache'
 
+#preprocessor passes and seconds per file from the last reload
+PREPROCESSOR_STATISTICS = {}
+
 try:
     from yaml import CLoader as _Loader
 except ImportError:
@@ -83,6 +87,19 @@ set the environment variable `ROMEO_IGNORE_FQDN` to suppress this warning.
 class EnvironmentalError(Exception): pass
 class IdentityCrisis(Exception): pass
 
+def _release():
+    """Drop the cached nodes that no loaded environment holds anymore, so
+       reloading changed data does not keep the old nodes alive.
+    """
+    live = set()
+    for env in entity.namespace.get('romeo', []):
+        live.add(env)
+        live.update(env.CHILDREN)
+    for node in list(foundation.RomeoKeyValue.objects):
+        if node in live: continue
+        foundation.RomeoKeyValue.delete(node)
+
+
 ###############################################################################
 # Public Methods
 ###############################################################################
@@ -98,6 +115,8 @@ def reload(datadir=None):
         datadir = _os.getenv('ROMEO_DATA','/etc/hostdb')
     entity.namespace.pop('romeo', None)
     entity.namespace['romeo'] = set()
+    if query.connect(datadir):
+        return #environments are fetched from the query server as needed
     cachedb = _os.path.join(datadir, CACHEDB)
 
     if _os.path.exists(cachedb):
@@ -109,6 +128,7 @@ def reload(datadir=None):
                 )
             except EOFError:
                 fd.close()
+                _release()
                 return
             except: continue
 
@@ -126,14 +146,20 @@ def reload(datadir=None):
                 foundation.RomeoKeyValue('ENVIRONMENT', rd)
             )
         except: _traceback.print_exc()
+    PREPROCESSOR_STATISTICS.clear()
+    PREPROCESSOR_STATISTICS.update(pp.statistics)
     pp.shutdown()
     Preprocessor.delete(pp) #invalidate the Entity now
+    _release()
 
 def listEnvironments():
     """List all known Romeo Environments.
 
        @return list of romeo.foundation.KeyValue instances
     """
+    if query.connection():
+        try: return query.connection().listEnvironments()
+        except query.QueryError: query.fallback()
     return list(entity.namespace.get('romeo',[]))
 
 def getEnvironment(name):
@@ -143,6 +169,9 @@ def getEnvironment(name):
        @param name (string)
        @return romeo.foundation.KeyValue instance
     """
+    if query.connection():
+        try: return query.connection().getEnvironment(name)
+        except query.QueryError: query.fallback()
     for node in foundation.RomeoKeyValue.search('NAME', value=name):
         for obj in node.ANCESTORS:
             if not obj.ROOTNODE: continue
@@ -152,6 +181,9 @@ def getEnvironment(name):
 
 def whoami(hostname=MYHOSTNAME):
     """Given a hostname return the Romeo object"""
+    if query.connection():
+        try: return query.connection().whoami(hostname)
+        except query.QueryError: query.fallback()
     try:
         for host in foundation.RomeoKeyValue.search('HOSTNAME', value=hostname):
             for ancestor in host.ANCESTORS:
@@ -170,6 +202,7 @@ import foundation
 import grammars
 import context
 import hostdb
+import query
 #FIXME in flux
 #import rules
 
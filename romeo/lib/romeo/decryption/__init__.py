@@ -16,7 +16,19 @@
 
 import os
 import sys
+import hashlib
 import traceback
+
+__doc__ = """
+Decryption of ``${ROMEO.decrypt <method>,<key file>,<data>}`` directives.
+
+Reloading romeo only records the directive, the data is decrypted the first
+time the value is asked for.  Plain text is kept in memory, never on disk,
+for the life of the process keyed by the method, the key file and a digest
+of the encrypted data.  Everything decrypted with a key file is forgotten
+as soon as that key file changes.
+"""
+
 class _decryptor(object):
     def __init__(self):
         self._storage = {}
@@ -55,11 +67,61 @@ class _decryptor(object):
         return self._storage[args[0]](*args[1:])
 
 _decrypt = _decryptor()
+
+
+class _DecryptionCache(object):
+    """plain text by (method, key file, sha256 of the encrypted data)"""
+    def __init__(self):
+        self._values = {}
+        self._stamps = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _stamp(path):
+        try: st = os.stat(path)
+        except OSError: return None
+        return (st.st_dev, st.st_ino, st.st_mtime, st.st_size)
+
+    def _validate(self, keyfile):
+        """forget the values of a key file that has changed"""
+        stamp = self._stamp(keyfile)
+        if keyfile in self._stamps and self._stamps[keyfile] != stamp:
+            self.forget(keyfile)
+        self._stamps[keyfile] = stamp
+
+    def __call__(self, *args):
+        """decrypt, or return what was decrypted before"""
+        keyfile = None
+        data = args[1:]
+        if len(args) > 2:
+            keyfile, data = args[1], args[2:]
+            self._validate(keyfile)
+        key = (args[0], keyfile, hashlib.sha256(','.join(data)).digest())
+        try:
+            value = self._values[key]
+            self.hits += 1
+            return value
+        except KeyError: pass
+        self.misses += 1
+        value = _decrypt(*args)
+        self._values[key] = value
+        return value
+
+    def forget(self, keyfile=None):
+        """drop the plain text of one key file or of all of them"""
+        for key in self._values.keys():
+            if keyfile is None or key[1] == keyfile:
+                del self._values[key]
+        if keyfile is None: self._stamps.clear()
+        else: self._stamps.pop(keyfile, None)
+
+_cache = _DecryptionCache()
 from romeo.entity import ParameterizedSingleton
 
 class _Decryption(object):
-    """encrypted data bucket, that decrypts the data on the fly."""
-    value = property(lambda s: _decrypt(*s._data))
+    """encrypted data bucket, that decrypts the data on first use."""
+    value = property(lambda s: _cache(*s._data))
     def __init__(self, directive_string):
         self._data = self.extract_args(directive_string)
 
@@ -85,5 +147,9 @@ def decrypt(directive_string):
         return directive_string
     return _Decryption(directive_string).value
 
+def forget(keyfile=None):
+    """drop decrypted values from memory, for one key file or all of them."""
+    _cache.forget(keyfile)
+
 #expose the class as a callable
-__all__ = ['decrypt', 'setup']
+__all__ = ['decrypt', 'setup', 'forget']
@@ -21,10 +21,24 @@ def rsa(public_key_file, hex_string):
        @return C{str} decrypted data
     """
     txt_string = binascii.a2b_hex(hex_string)
-    pub = _PublicKey(public_key_file)
+    pub = _load(public_key_file)
     return pub.decrypt(txt_string)
 
 
+_keys = {} #path -> (stamp, _PublicKey)
+
+def _load(public_key_file):
+    """the parsed public key, read again only when the file changes"""
+    st = os.stat(public_key_file)
+    stamp = (st.st_dev, st.st_ino, st.st_mtime, st.st_size)
+    cached = _keys.get(public_key_file)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    pub = _PublicKey(public_key_file)
+    _keys[public_key_file] = (stamp, pub)
+    return pub
+
+
 libc = CDLL( find_library("c") )
 libcrypto = CDLL( find_library("crypto") )
 
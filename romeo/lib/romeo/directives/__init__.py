@@ -18,6 +18,7 @@ import sys
 import os
 import types
 import re
+import time
 import traceback
 from cStringIO import StringIO
 from romeo import entity
@@ -34,11 +35,21 @@ class Preprocessor(entity.Entity):
        the root directory where romeo configs can be found. call
        preprocessor.process(fd) on each file object loaded form the romeo
        root directory.        
+
+       Files are scanned once for the directives they use and only those
+       directives are applied, in the order of their ``order`` attribute.
+       Directives that bring in new text (``expands``) cause one rescan.
+       The number of passes and the time spent on every file are kept
+       in ``statistics``.
     '''
+    #finds every directive in one scan, group 1 is the directive name
+    token_pattern = re.compile(r"\$\{ROMEO\.(\w+)[^\n]*?\}")
+
     def __init__(self,rootdir):
         self.root = rootdir
         self.group_states = {}
         self.directives = [] #available directives
+        self.statistics = {} #name -> {'passes':, 'time':, 'directives':}
         self.load_directives([Directive])
         
     def load_directives(self,inherits):
@@ -75,52 +86,72 @@ class Preprocessor(entity.Entity):
         for c in candidates:
             cinst = c( c.name,self.root,*c.init_args(self),**c.init_kwargs(self) )
             self.directives.append(cinst)       
+        #stable, so directives of the same order keep their load order
+        self.directives.sort(key=lambda d: d.order)
         
-    def _process(self,name,data,mode):
-        '''name = filename or other ID for this processing chain
-           data = the string to receive any processing
-           mode = specify which processor phase currently pre or post
+    def scan(self,data):
+        '''find the names of every directive used in data with a
+           single pass over the text.
         '''
-        td = data
-        for d in self.directives:
-            if not d.supports(mode): continue
-            d.set_mode(mode)
-            try: 
-                d.load(name,data)
-                if not d.is_used(): continue
-                d.is_valid()
-                data = d.apply()
-                d.reset()
-            except DirectiveException:
+        return set(self.token_pattern.findall(data))
+
+    def _apply(self,d,name,data,mode):
+        '''run one directive over data, returns the processed data'''
+        d.set_mode(mode)
+        try: 
+            d.load(name,data)
+            if mode != "pre" and not d.is_used():
                 d.reset()
-                traceback.print_exc()
+                return data
+            d.is_valid()
+            data = d.apply()
+            d.reset()
+        except DirectiveException:
+            d.reset()
+            traceback.print_exc()
         return data
-    
+
+    def _record(self,name,started,passes,used):
+        stats = self.statistics.setdefault(name,
+            {'passes': 0, 'time': 0.0, 'directives': []})
+        stats['passes'] += passes
+        stats['time'] += time.time() - started
+        stats['directives'].extend(used)
+
     def pre_process(self,fd,name):
         '''call this method to run all pre-processor directives
            against the file described by FD
-           #1 due to fact that there is not guaranteed order of
-              directive execution we keep running through our processing
-              loop until no changes have been detected.
+           #1 directives that are not in the file are never run.
+           #2 an expanding directive (include) may have brought in
+              directives that were not there before.
         '''
+        started = time.time()
         data = fd.read()
-        mdata = self._process(name, data, "pre")
-        while mdata != data: #1
-            data = mdata
-            mdata = self._process(name,data,"pre")
-        return mdata
+        found = self.scan(data)
+        used = []
+        for d in self.directives:
+            if not d.supports("pre"): continue
+            if not d.matches(found): continue #1
+            data = self._apply(d, name, data, "pre")
+            used.append(d.name)
+            if d.expands: found = self.scan(data) #2
+        self._record(name, started, len(used), used)
+        return data
     
     def post_process(self,obj,name):
         '''apply any post processing needed with actual output of
            structured data parser. modules may support one or both
            modes. 
         '''
+        started = time.time()
         data = obj
-        mdata = self._process(name, data, 'post')
-        while mdata != data: #1
-            data = mdata
-            mdata = self._process(name,data,"post")
-        return mdata
+        passes = 0
+        for d in self.directives:
+            if not d.supports("post"): continue
+            data = self._apply(d, name, data, "post")
+            passes += 1
+        self._record(name, started, passes, [])
+        return data
                
     def shutdown(self):
         del self.directives[:]
@@ -154,6 +185,8 @@ class Directive(object):
     '''
     name = "Directive" #this does not have to be unique. be careful of collisions
     modes = ["pre","post"]
+    order = 50 #directives are applied lowest order first
+    expands = False #True if apply can introduce new directives
     
     def __init__(self,name,rootdir,*args,**kwargs):
         '''setup state for your directive
@@ -170,6 +203,14 @@ class Directive(object):
     
     def supports(self,mode):
         return mode in self.modes
+
+    def matches(self,found):
+        '''whether any of the directive names the preprocessor found
+           in the data would be matched by our used_pattern.
+        '''
+        for token in found:
+            if token.startswith(self.name): return True
+        return False
     
     def set_mode(self,mode):
         self.mode = mode 
@@ -23,9 +23,26 @@ import os
 import re
 from romeo.directives import Directive,DirectiveException
 
+#path -> ([(path, stamp), ...], lines), shared by every preprocessor so
+#unchanged includes are only read once for the life of the process
+_cache = {}
+
 class Include(Directive):
+    '''Replaces ${ROMEO.include <file>} with the content of <file> from
+       the includes directory.  Every line after the first is indented to
+       the column of the line holding the directive, includes may be
+       nested.
+
+       Include files are expanded once, relative to column 0, and cached
+       by path.  A cached expansion is used for as long as the modification
+       time and size of every file that went into it are unchanged, so the
+       include graph is only walked (and checked for cycles) again after
+       one of those files changed.
+    '''
     name = "include"
     modes = ['pre']
+    order = 0 #everything else has to see the included text
+    expands = True
     
     @classmethod
     def init_kwargs(cls,pp):
@@ -36,38 +53,67 @@ class Include(Directive):
                 }
     
     def is_valid(self):
-        for line in self.get_lines():
-            m = self.used_pattern.search(line)
-            if not m: continue
-            args = self.extract_args(line[m.start():m.end()])
-            filepath = os.path.join(self.kwargs['includes_root'],args[0])
-            try: self.find_circular_refs(filepath)
-            except:
-                self.data.seek(0) 
-                raise #re-raise the original exception
-                
-    def find_circular_refs(self,target,files=None):
-        '''locate circular references as name indicates
-           if we see f1(include fX) ... fX(include f1)
-           raise and exception otherwise exit silent. 
+        '''expanding every include raises DirectiveException on
+           circular references.
+        '''
+        try:
+            for line in self.get_lines():
+                m = self.used_pattern.search(line)
+                if not m: continue
+                self.expand(self.target(line,m))
+        finally:
+            self.data.seek(0)
+
+    def target(self,line,m):
+        '''full path of the file included by the directive in line'''
+        args = self.extract_args(line[m.start():m.end()])
+        return os.path.join(self.kwargs['includes_root'],args[0])
+
+    @staticmethod
+    def stamp(filepath):
+        st = os.stat(filepath)
+        return (st.st_mtime, st.st_size)
+
+    def fresh(self,stamps):
+        '''whether none of the files have changed'''
+        try:
+            for filepath, stamp in stamps:
+                if self.stamp(filepath) != stamp: return False
+        except OSError: return False
+        return True
+
+    def expand(self,filepath,chain=()):
+        '''content of filepath with nested includes expanded, relative
+           to column 0.
+           #1 if we see f1(include fX) ... fX(include f1) raise an
+              exception.
         '''
-        if not files: files = [target]
-        else: files.append(target)
-        fd = open(target,'r')
-        for line in fd:
+        cached = _cache.get(filepath)
+        if cached and self.fresh(cached[0]): return cached[1]
+        chain = chain + (filepath,)
+        stamps = [(filepath, self.stamp(filepath))]
+        lines = []
+        fd = open(filepath,'r')
+        try: source = fd.readlines()
+        finally: fd.close()
+        for line in source:
+            if not line.endswith("\n"): line += "\n"
             m = self.used_pattern.search(line)
-            if not m: continue
-            args = self.extract_args(line[m.start():m.end()])
-            filepath = os.path.join(self.kwargs['includes_root'],args[0])
-            if filepath in files:
+            if not m:
+                lines.append(line)
+                continue
+            nested = self.target(line,m)
+            if nested in chain: #1
                 msg = "Circular reference while processing Romeo.include directive.\n"
-                msg += "%s referenced more than once\n" % filepath
+                msg += "%s referenced more than once\n" % nested
                 msg += "include chain is as follows:\n"
-                msg += " > ".join(files)
+                msg += " > ".join(chain[1:] + (nested,))
                 raise DirectiveException(msg)
-            else: self.find_circular_refs(filepath, files)
-        
-    
+            lines.extend(self.place(line,m,self.expand(nested,chain)))
+            stamps.extend(_cache[nested][0])
+        _cache[filepath] = (stamps, lines)
+        return lines
+
     def apply(self):
         out = []
         self.data.seek(0)
@@ -76,10 +122,7 @@ class Include(Directive):
             if not m:
                 out.append(line)
                 continue
-            args = self.extract_args(line[m.start():m.end()])
-            filepath = os.path.join(self.kwargs['includes_root'],args[0])
-            lines = self.build_content(line,filepath)
-            out.extend(lines)
+            out.extend(self.place(line,m,self.expand(self.target(line,m))))
         return "".join(out)
     
     def get_starting_whitespace(self,line):
@@ -87,28 +130,17 @@ class Include(Directive):
         if not m: return ""
         return line[m.start():m.end()]
     
-    def build_content(self,orig_line,filepath):
-        '''#1 this should allow us to handle imports occuring at
+    def place(self,orig_line,m,content):
+        '''put expanded content where the directive in orig_line was.
+           #1 this should allow us to handle imports occuring at
               indented lines.
         '''
-        m = self.used_pattern.search(orig_line)
+        head = orig_line[:m.start()]
+        rest = orig_line[m.end():]
+        if not content: return [head + rest]
         ws = self.get_starting_whitespace(orig_line) #1
-        replaced = orig_line[m.start():m.end()]
-        replicant = []
-        fd = open(filepath,'r')
-        for line in fd:
-            m = self.used_pattern.search(line)
-            if not m:
-                store = ws+line
-                #single space lines please.
-                while store.endswith("\n\n"): store = store.replace("\n\n","\n") 
-                replicant.append(ws+line)
-                continue
-            args = self.extract_args(line[m.start():m.end()])
-            new_filepath = os.path.join(self.kwargs['includes_root'],args[0])
-            replicant.extend( self.build_content(line,new_filepath) )
-        first = replicant[0]
-        replicant[0] = orig_line.replace(replaced,first)
-        return replicant
-            
-            
+        out = [head + content[0]]
+        out.extend([ws + line for line in content[1:]])
+        if rest.strip(): #keep anything that followed the directive
+            out[-1] = out[-1][:-1] + rest
+        return out
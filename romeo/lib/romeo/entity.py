@@ -138,6 +138,17 @@ class ParameterizedSingleton(type):
 
     def delete(classObj, instance):
         """Deletes the stored reference to an instance of the class."""
+        instanceID = getattr(instance, '_instanceID', None)
+        _instance = classObj._instanceMap.get(instanceID)
+        if isinstance(_instance, weakref.ref):
+            _instance = _instance()
+        if _instance is instance:
+            namespace['entities'].get(
+                instance.__class__.__name__,
+                {}
+            ).pop(instanceID, None)
+            classObj._instanceMap.pop(instanceID, None)
+            return
         for instanceID, _instance in classObj._instanceMap.items():
             if isinstance(_instance, weakref.ref):
                 _instance = _instance()
@@ -196,6 +207,7 @@ class ObjectsDescriptor(object):
 
 class Entity(object):
     """Abstract base class for models"""
+    __slots__ = () #subclasses decide if they want a __dict__
     COMPLEX_CONSTRUCTOR = property(lambda s: not s.__class__.isStandard(s))
     serializable = False
     reapable = False
@@ -281,7 +293,8 @@ class Entity(object):
 
 
 #we need a metaclass definition that works for python2 and python3
-Entity = ParameterizedSingleton('Entity', (Entity,), {})
+Entity = ParameterizedSingleton('Entity', (Entity,),
+        {'__slots__': ('_instanceID', '__weakref__')})
 
 __all__ = ['Entity', 'InValidEntity']
 
@@ -16,36 +16,81 @@
 
 
 from entity import Entity
+from array import array
+import weakref
 #avoid reference leaks
 import copy
 
 __doc__ = """
 Foundational library used by ROMEO to determine relationships
+
+Every RomeoKeyValue gets an integer id when it is created.  The graph is kept
+in adjacency arrays indexed by that id, which hold only the direct edges
+between a node and the key/value pairs inside it's value.  Descendants and
+ancestors are found by walking those edges.  The arrays only hold weak
+references to the nodes, when a node is collected it's edges are dropped and
+it's id is handed to the next new node.
 """
 
+#node id -> weak reference to the RomeoKeyValue, None if the id is free
+_nodes = []
+#node id -> array of the node ids directly inside/above it
+_kids = []
+_parents = []
+#ids of collected nodes
+_free = []
+
 __author__ = "Justin Venus <justin.venus@orbitz.com>"
 
-def _processKeyValues(adict):
-    """inspect dictionaries and lists to determine if relationships exist"""
-    pending = [adict]
-    pendlis = []
-
-    def do_seq(seq):
-        for dd in seq:
-            if isinstance(dd, dict):
-                pending.append(dd)
-            elif isinstance(dd, (list, tuple)):
-                pendlis.append(dd)
-
-    while pending or pendlis:
-        while pending:
-            d = pending.pop()
-            for key, val in d.iteritems():
+def _processKeyValues(value):
+    """inspect dictionaries and lists to determine the key/value pairs
+       directly inside of value, their own values are left to them.
+    """
+    pending = [value]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, dict):
+            for key, val in item.iteritems():
                 yield RomeoKeyValue(key, val) #we may throw duplicates, but it is ok
-            do_seq(d.itervalues())
-        while pendlis:
-            l = pendlis.pop()
-            do_seq(l)
+        elif isinstance(item, (list, tuple)):
+            pending.extend(item)
+
+
+def _forget(i):
+    """drop the edges of the collected node ``i`` and free it's id"""
+    for p in _parents[i]:
+        while i in _kids[p]: _kids[p].remove(i)
+    for k in _kids[i]:
+        while i in _parents[k]: _parents[k].remove(i)
+    _nodes[i] = None
+    _kids[i] = array('l')
+    _parents[i] = array('l')
+    _free.append(i)
+
+
+def _walk(start, edges):
+    """yield the node ids reachable from start, start excluded"""
+    seen = set([start])
+    pending = list(edges[start])
+    while pending:
+        i = pending.pop()
+        if i in seen: continue
+        seen.add(i)
+        yield i
+        pending.extend(edges[i])
+
+
+def _reaches(start, target, edges):
+    """whether target is reachable from start"""
+    seen = set()
+    pending = list(edges[start])
+    while pending:
+        i = pending.pop()
+        if i == target: return True
+        if i in seen: continue
+        seen.add(i)
+        pending.extend(edges[i])
+    return False
 
 #only used to test values in RomeoKeyValue ``search``
 class EmptyValue(Entity):
@@ -55,12 +100,15 @@ null = EmptyValue()
 
 class RomeoKeyValue(Entity):
     """Relational Key Value Pair Storage Object"""
+    __slots__ = ('_key', '_value', '_id')
     KEY = property(lambda s: s._key)
     VALUE = property(lambda s: s._value)
-    CHILDREN = property(lambda s: (i for i in s._children))
-    ANCESTORS = property(lambda s: (i for i in s._ancestors))
-    RELATED = property(lambda s: (i for i in s._ancestors | s._children))
-    ROOTNODE = property(lambda s: not bool(s._ancestors))
+    CHILDREN = property(lambda s: (_nodes[i]() for i in _walk(s._id, _kids)))
+    ANCESTORS = property(lambda s: (_nodes[i]() for i in \
+            _walk(s._id, _parents)))
+    PARENTS = property(lambda s: (_nodes[i]() for i in _parents[s._id]))
+    RELATED = property(lambda s: s._related())
+    ROOTNODE = property(lambda s: not _parents[s._id])
     BRANCHNODE = property(lambda s: not s.ROOTNODE)
     serializable = property(lambda s: s.ROOTNODE)
 
@@ -68,14 +116,30 @@ class RomeoKeyValue(Entity):
         self._key = key
         self._value = value
         #storage for nodes above and below us
-        self._children = set()
-        self._ancestors = set()
+        if _free:
+            self._id = _free.pop()
+        else:
+            self._id = len(_nodes)
+            _nodes.append(None)
+            _kids.append(array('l'))
+            _parents.append(array('l'))
+        _nodes[self._id] = weakref.ref(self, lambda r, i=self._id: _forget(i))
 
         #we need to inspect our values and discover decendants
-        for obj in _processKeyValues({self.KEY: self.VALUE}):
-             if obj is self: continue #skip dumb relationship to self
-             self._children.add(obj)
-             obj.add_ancestor(self)
+        seen = set()
+        for obj in _processKeyValues(self.VALUE):
+            if obj is self or obj._id in seen: continue
+            seen.add(obj._id)
+            obj.add_ancestor(self)
+
+    def _related(self):
+        seen = set()
+        for i in _walk(self._id, _parents):
+            seen.add(i)
+            yield _nodes[i]()
+        for i in _walk(self._id, _kids):
+            if i in seen: continue
+            yield _nodes[i]()
 
     def __getstate__(self):
         return {'KEY': self._key, 'VALUE': self._value}
@@ -126,11 +190,10 @@ class RomeoKeyValue(Entity):
             seen.add(obj)
 
     def add_ancestor(self, obj):
-        """Only used by RomeoKeyValue __init__"""
+        """Only used by RomeoKeyValue __init__, obj holds us directly"""
         assert isinstance(obj, RomeoKeyValue)
-        self._ancestors.add(obj)
-        for child in self.CHILDREN:
-            child.add_ancestor(obj)
+        _parents[self._id].append(obj._id)
+        _kids[obj._id].append(self._id)
 
     def isRelated(self, obj):
         """Test if the provided object is related to this instance
@@ -141,7 +204,7 @@ class RomeoKeyValue(Entity):
            @return bool
         """
         #easiest, case direct relationship
-        if bool(obj in self._children | self._ancestors):
+        if self.isChild(obj) or self.isAncestor(obj):
             return True
         #since this isn't a binary tree structure we have to look
         #for similarities and related top objects, avoid ROOTNODE
@@ -167,7 +230,8 @@ class RomeoKeyValue(Entity):
            @param obj (instance RomeoKeyValue)
            @return bool
         """
-        return bool(obj in self._children)
+        #walk up from obj, there are far fewer ancestors than descendants
+        return _reaches(obj._id, self._id, _parents)
 
     def isAncestor(self, obj):
         """Test if the provided object is an ancestor to this instance
@@ -175,7 +239,7 @@ class RomeoKeyValue(Entity):
            @param obj (instance RomeoKeyValue)
            @return bool
         """
-        return bool(obj in self._ancestors)
+        return _reaches(self._id, obj._id, _parents)
 
     @staticmethod
     def search(key, value=null):
@@ -76,6 +76,10 @@ def search(querystring):
        @param querystring (string)
        @return callable - called
     """
+    from romeo import query as _query
+    if _query.connection():
+        try: return _query.connection().search(querystring)
+        except _query.QueryError: _query.fallback()
     for regex,func in _Query._handler.iteritems():
         match = regex.search(querystring)
         if not match: continue
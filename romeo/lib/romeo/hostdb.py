@@ -15,6 +15,7 @@
 ###############################################################################
 
 import context
+import weakref
 
 __doc__ = """
 This package makes it a little bit easier to write higher level objects.
@@ -23,6 +24,11 @@ Warning you will still need the lower lever API to figure out complex
 relationships.  This package just makes simple things easier.
 """
 
+#RomeoKeyValue -> (special keys, {KEY: value of entity.get(KEY)})
+_indexes = weakref.WeakKeyDictionary()
+#(KEY, special keys) -> HOSTDBNode subclass
+_classes = {}
+
 class HOSTDBNode(context.EntityContext):
     """Special Class to encapsulate lower level ROMEO API"""
     entityAttr = None
@@ -32,15 +38,17 @@ class HOSTDBNode(context.EntityContext):
     def __init__(self, RomeoKeyValueInstance):
         """overrode the default constructor"""
         setattr(self, self.entityAttr, RomeoKeyValueInstance)
+        self.entity = RomeoKeyValueInstance
         self.data = {}
 
-    def __getattribute__(self, name):
+    def __getattr__(self, name):
+        #only called when normal lookup fails, node classes carry a get_
+        #method for each of their special keys
         if name.startswith('get_'):
-            return lambda: _gettr_(self, name.replace('get_',''))
-        try: return context.EntityContext.__getattribute__(self, name)
-        except AttributeError:
-             if name in self.specialKeys: return self.get(name)
-             raise #re-raise original exception
+            key = name[4:]
+            return lambda: _gettr_(self, key)
+        if name in self.specialKeys: return self.get(name)
+        raise AttributeError(name)
 
     def __repr__(self):
         if self.__class__.__name__ == 'ENVIRONMENT':
@@ -48,9 +56,29 @@ class HOSTDBNode(context.EntityContext):
         return "HOSTDBNODE(%s)" % (self.__class__.__name__,)
 
 
+def _index(entity):
+    """the keys below entity and what entity.get returns for each of them,
+       computed once per node.
+    """
+    try: return _indexes[entity]
+    except KeyError: pass
+    children = {}
+    for obj in entity.CHILDREN:
+        if obj.KEY == entity.KEY: continue #get returns our own VALUE
+        children.setdefault(obj.KEY, set()).add(obj)
+    lookup = {}
+    for key, objects in children.iteritems():
+        if len(objects) > 1: lookup[key] = list(objects)
+        else: lookup[key] = objects.pop()
+    lookup[entity.KEY] = entity.VALUE
+    keys = tuple(sorted(children.keys()))
+    index = _indexes[entity] = (keys, lookup)
+    return index
+
+
 def _gettr_(obj, key_name):
     entity = getattr(obj, obj.entityAttr)
-    x = entity.get(key_name)
+    x = _index(entity)[1].get(key_name)
     if hasattr(x, '__iter__'):
         return _iter_(entity, x)
     if isinstance(x, entity.__class__):
@@ -67,28 +95,38 @@ def _iter_(entity, objects):
             else: yield x.VALUE
         else: yield x
 
+def _accessor(key):
+    def accessor(self):
+        return _gettr_(self, key)
+    accessor.__name__ = 'get_' + key
+    return accessor
+
+def node_class(KEY, keys):
+    """the HOSTDBNode subclass for nodes with the given key and special keys,
+       one class per signature.
+    """
+    signature = (KEY, keys)
+    try: return _classes[signature]
+    except KeyError: pass
+    members = {  
+        'entityAttr': KEY,
+        'specialKeys': list(keys),
+    }
+    for key in keys:
+        members['get_' + key] = _accessor(key)
+    #create a new class node
+    cls = _classes[signature] = type(KEY, (HOSTDBNode,), members)
+    return cls
+
 def node_constructor(RomeoKeyValueInstance):
     from romeo.foundation import RomeoKeyValue
     if not isinstance(RomeoKeyValueInstance, RomeoKeyValue):
         raise TypeError('Cannot adapt <%s> to <HOSTDBNode>' % \
                 str(RomeoKeyValueInstance))
-
-    keys = [ i for i in RomeoKeyValueInstance.keys() if i != \
-            RomeoKeyValueInstance.KEY ]
-    members = {  
-        'entityAttr': str(RomeoKeyValueInstance.KEY),
-        'specialKeys': list(keys),
-        'entity': RomeoKeyValueInstance,
-    }
-
-    #create a new class node
-    instance = type(
-        str(RomeoKeyValueInstance.KEY),
-        (HOSTDBNode,),
-        members
-    )
+    keys = _index(RomeoKeyValueInstance)[0]
+    cls = node_class(str(RomeoKeyValueInstance.KEY), keys)
     #initilialize the instance now
-    return instance(RomeoKeyValueInstance)
+    return cls(RomeoKeyValueInstance)
 
 def getEnvironment(name):
     import romeo
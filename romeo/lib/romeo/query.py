@@ -0,0 +1,372 @@
+###############################################################################
+#   Copyright 2006 to the present, Orbitz Worldwide, LLC.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+###############################################################################
+
+#standard library imports
+import SocketServer as _SocketServer
+import threading as _threading
+import socket as _socket
+import struct as _struct
+import sys as _sys
+import os as _os
+try:
+    import cPickle as _pickle
+except ImportError:
+    import pickle as _pickle
+#romeo library imports
+from romeo.entity import namespace as _namespace
+from romeo.foundation import RomeoKeyValue as _RomeoKeyValue
+
+__doc__ = """
+Optional romeo query server.
+
+Parsing a large hostdb takes seconds, which short lived tools pay on every
+invocation.  A ``QueryServer`` keeps one loaded hostdb and answers queries
+over a unix domain socket.  Processes only use a server when ``ROMEO_SOCKET``
+in their environment names it's socket.  When it is listening for the data
+directory ``romeo.reload`` is asked to load, the romeo api (whoami,
+getEnvironment, listEnvironments and grammars.search) is answered by the
+server instead and only the environments that are actually needed are
+fetched, already parsed, and linked in the calling process.  If the server
+goes away the data directory is loaded locally, the next ``romeo.reload``
+tries the server again.
+
+A server listens on ``ROMEO_SOCKET`` too, or ``query.sock`` in the data
+directory when it is not set.
+"""
+
+SOCKET_NAME = 'query.sock'
+#response frames are a length prefix followed by a pickle
+_frame = _struct.Struct('!I')
+#client connection, whether this process is the server and whether it is
+#loading locally after the server went away
+_state = {'client': None, 'serving': False, 'local': False}
+
+class QueryError(Exception): pass
+
+
+def socketPath():
+    """path of the query server socket
+
+       @return (string) or None if no query server should be used
+    """
+    return _os.environ.get('ROMEO_SOCKET') or None
+
+
+def connection():
+    """the query server romeo is using
+
+       @return L{QueryClient} or None
+    """
+    return _state['client']
+
+
+def connect(datadir):
+    """Use a query server for ``datadir`` if one is listening.
+
+       @param datadir (string)
+       @return L{QueryClient} or None
+    """
+    disconnect()
+    if _state['serving'] or _state['local']: return None
+    path = socketPath()
+    if not path or not _os.path.exists(path): return None
+    client = QueryClient(path, datadir)
+    try:
+        client.connect()
+        if client.call('datadir') != client.datadir:
+            raise QueryError('%s serves another directory' % (path,))
+    except (_socket.error, QueryError):
+        client.close()
+        return None
+    _state['client'] = client
+    return client
+
+
+def disconnect():
+    """stop using the query server"""
+    client, _state['client'] = _state['client'], None
+    if client: client.close()
+
+
+def fallback():
+    """Stop using the query server and load it's data directory locally,
+       used when the server went away.  The next ``romeo.reload`` tries the
+       server again.
+    """
+    client = _state['client']
+    disconnect()
+    if not client: return
+    _state['local'] = True
+    try:
+        _sys.modules['romeo'].reload(datadir=client.datadir)
+    finally:
+        _state['local'] = False
+
+
+class QueryClient(object):
+    """Connection to a L{QueryServer}, results are returned as
+       RomeoKeyValue instances linked into their environment.
+    """
+    def __init__(self, path, datadir):
+        self.path = path
+        self.datadir = _os.path.abspath(datadir)
+        self.sock = None
+        self.stream = None
+        self.generation = None
+        #filename -> environment RomeoKeyValue
+        self.environments = {}
+
+    def connect(self):
+        owner = _os.stat(self.path).st_uid
+        #responses are unpickled, only trust root and ourself
+        if owner not in (0, _os.getuid()):
+            raise QueryError('%s is owned by uid %d' % (self.path, owner))
+        self.sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+        self.stream = self.sock.makefile('rb')
+
+    def close(self):
+        if self.stream: self.stream.close()
+        if self.sock: self.sock.close()
+        self.sock = self.stream = None
+
+    def read(self, size):
+        data = self.stream.read(size)
+        if len(data) != size:
+            raise QueryError('query server closed the connection')
+        return data
+
+    def call(self, op, argument=''):
+        """send one request and wait for the answer
+
+           @param op (string)
+           @param argument (string)
+
+           @exception QueryError - when the server goes away
+           @return (object)
+        """
+        try:
+            self.sock.sendall('%s %s\n' % (op, argument))
+            size = _frame.unpack(self.read(_frame.size))[0]
+            response = _pickle.loads(self.read(size))
+        except _socket.error, e:
+            raise QueryError(str(e))
+        status, generation = response[:2]
+        if generation != self.generation:
+            #the server reloaded, what we fetched is stale
+            self.generation = generation
+            self.environments.clear()
+            _namespace['romeo'] = set()
+        if status == 'ok':
+            return response[2]
+        name, message = response[2:]
+        romeo = _sys.modules['romeo']
+        exception = {
+            'IdentityCrisis': romeo.IdentityCrisis,
+            'EnvironmentalError': romeo.EnvironmentalError,
+            'NoMatch': romeo.grammars.NoMatch,
+        }.get(name, QueryError)
+        raise exception(message)
+
+    def environment(self, filename):
+        """fetch and link the environment loaded from ``filename``"""
+        if filename not in self.environments:
+            env = _RomeoKeyValue('ENVIRONMENT', self.call('fetch', filename))
+            _namespace.setdefault('romeo', set()).add(env)
+            self.environments[filename] = env
+        return self.environments[filename]
+
+    def node(self, location):
+        """find a node by it's location in an environment"""
+        filename, path = location
+        env = self.environment(filename)
+        if not path: return env
+        obj = env.VALUE
+        for step in path[:-1]:
+            obj = obj[step]
+        return _RomeoKeyValue(path[-1], obj[path[-1]])
+
+    def whoami(self, hostname):
+        return self.node(self.call('whoami', hostname))
+
+    def getEnvironment(self, name):
+        return self.environment(self.call('environment', name))
+
+    def listEnvironments(self):
+        return [ self.environment(f) for f in self.call('environments') ]
+
+    def search(self, querystring):
+        locations = self.call('search', querystring)
+        #fetch now, so a server going away is noticed by the caller
+        return iter([ self.node(location) for location in locations ])
+
+
+class QueryServer(_SocketServer.ThreadingMixIn, _SocketServer.UnixStreamServer):
+    """Holds a loaded hostdb and answers L{QueryClient} requests, the hostdb
+       is reloaded when anything in the data directory changes.
+    """
+    daemon_threads = True
+
+    def __init__(self, datadir, path=None):
+        self.datadir = _os.path.abspath(datadir)
+        self.path = path or socketPath() or \
+                _os.path.join(self.datadir, SOCKET_NAME)
+        self.lock = _threading.Lock()
+        self.generation = 0
+        self.signature = None
+        #filename -> environment RomeoKeyValue
+        self.environments = {}
+        #RomeoKeyValue -> (filename, path to it in the environment)
+        self.locations = {}
+        #connected sockets -> the threads answering them
+        self.connections = {}
+        _state['serving'] = True
+        self.refresh()
+        if _os.path.exists(self.path):
+            _os.unlink(self.path) #left over from an unclean shutdown
+        _SocketServer.UnixStreamServer.__init__(self, self.path, QueryHandler)
+
+    def handle_error(self, request, client_address):
+        #SocketServer swallows everything raised while a request is handed
+        #to a thread, including the SystemExit a SIGTERM stops us with
+        if isinstance(_sys.exc_info()[1], (SystemExit, KeyboardInterrupt)):
+            raise
+        _SocketServer.UnixStreamServer.handle_error(
+                self, request, client_address)
+
+    def server_close(self):
+        _SocketServer.UnixStreamServer.server_close(self)
+        #hang up on clients so their threads are done before we exit
+        for sock, thread in self.connections.items():
+            try: sock.shutdown(_socket.SHUT_RDWR)
+            except _socket.error: pass
+            thread.join(1.0)
+        if _os.path.exists(self.path):
+            _os.unlink(self.path)
+
+    def stamp(self):
+        """modification times and sizes of the data directory contents"""
+        stamps = []
+        for root, dirs, files in _os.walk(self.datadir):
+            for name in files:
+                path = _os.path.join(root, name)
+                if path == self.path: continue
+                try: info = _os.stat(path)
+                except OSError: continue
+                stamps.append((path, info.st_mtime, info.st_size))
+        stamps.sort()
+        return stamps
+
+    def refresh(self):
+        """reload romeo if the data directory changed"""
+        signature = self.stamp()
+        if signature == self.signature: return
+        romeo = _sys.modules['romeo']
+        romeo.reload(datadir=self.datadir)
+        self.environments.clear()
+        self.locations.clear()
+        for env in romeo.listEnvironments():
+            filename = [ i['FILENAME'] for i in env.VALUE \
+                    if isinstance(i, dict) and 'FILENAME' in i ][-1]
+            self.environments[filename] = env
+            self.index(filename, env)
+        self.signature = signature
+        self.generation += 1
+
+    def index(self, filename, env):
+        """remember where every node of ``env`` lives"""
+        self.locations.setdefault(env, (filename, ()))
+        pending = [(env.VALUE, ())]
+        while pending:
+            obj, path = pending.pop()
+            if isinstance(obj, dict):
+                for key, value in obj.iteritems():
+                    node = _RomeoKeyValue(key, value)
+                    self.locations.setdefault(node, (filename, path + (key,)))
+                    pending.append((value, path + (key,)))
+            elif isinstance(obj, (list, tuple)):
+                for i, value in enumerate(obj):
+                    pending.append((value, path + (i,)))
+
+    def answer(self, op, argument):
+        """@return the result of a request"""
+        romeo = _sys.modules['romeo']
+        if op == 'datadir':
+            return self.datadir
+        if op == 'fetch':
+            if argument not in self.environments:
+                raise romeo.EnvironmentalError('no environment %s' % (argument,))
+            return self.environments[argument].VALUE
+        if op == 'environments':
+            return sorted(self.environments)
+        if op == 'environment':
+            return self.locations[romeo.getEnvironment(argument)][0]
+        if op == 'whoami':
+            return self.locations[romeo.whoami(argument)]
+        if op == 'search':
+            #nodes left over from previous loads are not in any environment
+            return [ self.locations[node] for node in \
+                    romeo.grammars.search(argument) if node in self.locations ]
+        raise QueryError('unknown request %s' % (op,))
+
+    def respond(self, line):
+        """@return (string) the framed response to a request line"""
+        op, argument = (line.rstrip('\n').split(' ', 1) + [''])[:2]
+        self.lock.acquire()
+        try:
+            try:
+                self.refresh()
+                response = ('ok', self.generation, self.answer(op, argument))
+            except Exception, e:
+                response = ('error', self.generation, e.__class__.__name__, str(e))
+        finally:
+            self.lock.release()
+        data = _pickle.dumps(response, -1)
+        return _frame.pack(len(data)) + data
+
+
+class QueryHandler(_SocketServer.StreamRequestHandler):
+    """answers requests until the client hangs up"""
+    def setup(self):
+        _SocketServer.StreamRequestHandler.setup(self)
+        self.server.connections[self.request] = _threading.currentThread()
+
+    def finish(self):
+        self.server.connections.pop(self.request, None)
+        _SocketServer.StreamRequestHandler.finish(self)
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line: break
+            self.wfile.write(self.server.respond(line))
+
+
+def serve(datadir, path=None):
+    """load ``datadir`` and answer queries until interrupted
+
+       @param datadir (string)
+       @param path (string) - socket path [default: L{socketPath} or
+           ``query.sock`` in ``datadir``]
+    """
+    server = QueryServer(datadir, path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+__all__ = ['QueryClient', 'QueryServer', 'QueryError', 'connect',
+    'connection', 'disconnect', 'fallback', 'serve', 'socketPath']
@@ -14,8 +14,8 @@
 #   limitations under the License.
 ###############################################################################
 
-from romeo.entity import Entity
-from romeo.foundation import RomeoKeyValue, Environment
+from romeo.entity import Entity, namespace
+from romeo.foundation import RomeoKeyValue
 import yaml
 
 BUILTIN_SCHEMA = """
@@ -216,40 +216,36 @@ class _NodeValidator(Entity):
         #setup type validation
         self.policy['ROMEO_TYPE'] = type(self.policy.get('ROMEO_TYPE'))
 
-    def validate(self, obj):
-        """Given a RomeoKeyValue object Validate it against the schema"""
+    def validate(self, obj, subtreeTypes=None):
+        """Given a RomeoKeyValue object Validate it against the schema
+
+           Singletons are checked by L{_Schema.validate}, which counts keys
+           per environment.
+
+           @param obj (RomeoKeyValue)
+           @param subtreeTypes (L{_SubtreeTypes}) shared by the nodes of
+               obj's environment, walks obj's relations if None
+        """
         #test if the type is ok, NoneType is automatically acceptable
         if not isinstance(obj.VALUE, self.policy['ROMEO_TYPE']) and not \
                     isinstance(obj.VALUE, type(None)):
             raise TypeError('%s attribute VALUE does not match schema' % \
                     str(obj))
-        check_keys = set(self.policy.get('ROMEO_REQUIRED_KEYS',[]))
+        check_keys = self.requiredKeys
         if check_keys:
-            #filter the child keys against the expected keys
-            keys = check_keys & set([ child.KEY for child in obj.CHILDREN ])
             #make sure the related child keys are present
-            if not all([ i in check_keys for i in keys ]):
+            if check_keys - set([ child.KEY for child in obj.CHILDREN ]):
                 raise InvalidNode('%s is missing a required related key' % \
                     str(obj))
-
-        #check that if this singleton key shows up more than once in this env
-        if self.policy['ROMEO_SINGLETON']:
-            #remember objects can show up in multiple environements defs
-            envs = [ related for related in obj.RELATED if \
-                    isinstance(related, Environment) ]
-
-            #test to make sure this is a singleton in every environment
-            if not all([ len(list(env.searchInstance(self.name))) == 1 for env \
-                    in envs ]):
-                e = '%s singleton showed up multiple times per Environment' % \
-                        (self.name,)
-                raise InvalidNode(e)
         #determine if we need to check values
         if self.policy.get('ROMEO_VALUES', False):
             if isinstance(self.policy['ROMEO_VALUES'], dict):
-                self._check_dict(obj)
+                self._check_dict(obj, subtreeTypes=subtreeTypes)
+
+    requiredKeys = property(lambda s: frozenset(
+            s.policy.get('ROMEO_REQUIRED_KEYS', [])))
         
-    def _check_dict(self, obj, testdict=None):
+    def _check_dict(self, obj, testdict=None, subtreeTypes=None):
         if not testdict:
             testdict = self.policy.get('ROMEO_VALUES', {})
         assert isinstance(testdict, dict)
@@ -259,6 +255,17 @@ class _NodeValidator(Entity):
             raise InvalidPolicy('Values must inherit from the schema')
         if not _NodeValidator.exists(key):
             raise InvalidNode('%s invalid schema key %s' % (obj, key))
+        if subtreeTypes is not None:
+            #our ancestors, our own subtree and the subtrees of our parents
+            if any(( o.KEY == key and isinstance(o.VALUE, Type) \
+                    for o in obj.ANCESTORS )):
+                return #yay we validated a complex schema!!!
+            for node in [obj] + list(obj.PARENTS):
+                types = subtreeTypes[node].get(key, ())
+                if any(( issubclass(t, Type) for t in types )):
+                    return #yay we validated a complex schema!!!
+            e = '%s unable to validate relationship %s' % (obj, key)
+            raise InvalidNode(e)
         try: #thow assertion error when a match is found to stop iteration
             for o in obj.RELATED:
                 if o.KEY == key and isinstance(o.VALUE, Type):
@@ -271,11 +278,24 @@ class _NodeValidator(Entity):
         except AssertionError: pass #yay we validated a complex schema!!!
 
 
+class _SubtreeTypes(dict):
+    """{node: {KEY: set of value types}} of the nodes below each node,
+       a subtree is walked the first time it is asked for.
+    """
+    def __missing__(self, node):
+        types = {}
+        for child in node.CHILDREN:
+            types.setdefault(child.KEY, set()).add(type(child.VALUE))
+        self[node] = types
+        return types
+
+
 class _Schema(Entity):
     schema = property(lambda s: s._schema)
     required = property(lambda s: s.schema['REQUIRED'])
     optional = property(lambda s: s.schema['OPTIONAL'])
     def __init__(self):
+        self._validated = set() #environments that passed validation
         #romeo schema is inflexible and hardcoded
         self._schema = {
             'REQUIRED': {
@@ -312,11 +332,50 @@ class _Schema(Entity):
             if not obj.policy['ROMEO_TYPE'] in self.required['ROMEO_TYPE']:
                 raise TypeError('%s type not exected in schema' % (obj.name,))
 
-    def validate(self):
-        """Validate RomeoKeyValue objects against the schema"""
-        for obj in RomeoKeyValue.objects:
-            if not _NodeValidator.exists(obj.KEY): continue
-            _NodeValidator(obj.KEY).validate(obj)
+        self._validated.clear() #the rules have changed
+
+    def validate(self, full=False):
+        """Validate RomeoKeyValue objects against the schema
+
+           Every loaded environment is traversed once, it's nodes are
+           grouped by key and each group is checked against the key's
+           policy.  Environments that passed before are skipped unless
+           ``full`` is set, so after a partial reload only the new or
+           changed environments are validated.
+
+           @param full (bool)
+           @raise InvalidNode, InvalidPolicy, TypeError
+           @return None
+        """
+        #the environments of the last reload
+        roots = list(namespace.get('romeo', ()))
+        if full:
+            self._validated.clear()
+        else:
+            self._validated &= set(roots) #forget environments that are gone
+        seen = set() #nodes can be shared by environments
+        for root in roots:
+            if root in self._validated: continue
+            self._validateEnvironment(root, seen)
+            self._validated.add(root)
+
+    def _validateEnvironment(self, root, seen):
+        groups = {} #KEY -> [node, ...]
+        subtreeTypes = _SubtreeTypes()
+        for node in [root] + list(root.CHILDREN):
+            groups.setdefault(node.KEY, []).append(node)
+        for key, nodes in groups.iteritems():
+            if not _NodeValidator.exists(key): continue
+            validator = _NodeValidator(key)
+            #check that this singleton key shows up only once in this env
+            if validator.policy['ROMEO_SINGLETON'] and len(nodes) > 1:
+                e = '%s singleton showed up multiple times per Environment' % \
+                        (key,)
+                raise InvalidNode(e)
+            for node in nodes:
+                if node in seen: continue
+                validator.validate(node, subtreeTypes)
+                seen.add(node)
 
 _schema = _Schema()
 
@@ -0,0 +1,55 @@
+import unittest
+import tempfile
+import os
+import sys
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY,'..','lib'))
+
+from romeo import decryption
+
+calls = []
+def reverse(keyfile, data): #stands in for a real decryption plugin
+    calls.append(data)
+    return data[::-1]
+
+class TestDecryption(unittest.TestCase):
+    def setUp(self):
+        decryption._decrypt._storage['reverse'] = reverse
+        fd, self.keyfile = tempfile.mkstemp()
+        os.write(fd, 'key one')
+        os.close(fd)
+        self.directive = '${ROMEO.decrypt reverse,%s,terces}' % self.keyfile
+        del calls[:]
+
+    def tearDown(self):
+        decryption.forget()
+        decryption._decrypt._storage.pop('reverse', None)
+        os.unlink(self.keyfile)
+
+    def test_lazy(self):
+        decryption.setup(self.directive)
+        self.assertListEqual(calls, [])
+        self.assertEqual(decryption.decrypt(self.directive), 'secret')
+        self.assertListEqual(calls, ['terces'])
+
+    def test_cached(self):
+        decryption.setup(self.directive)
+        for i in range(3):
+            self.assertEqual(decryption.decrypt(self.directive), 'secret')
+        self.assertListEqual(calls, ['terces'])
+
+    def test_key_change(self):
+        decryption.setup(self.directive)
+        decryption.decrypt(self.directive)
+        f = open(self.keyfile, 'w')
+        f.write('key number two')
+        f.close()
+        self.assertEqual(decryption.decrypt(self.directive), 'secret')
+        self.assertListEqual(calls, ['terces', 'terces'])
+
+    def test_not_encrypted(self):
+        self.assertEqual(decryption.decrypt('plain'), 'plain')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import shutil
+import tempfile
+import os
+import sys
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY,'..','lib'))
+
+try: #newer python versions
+    from io import BytesIO
+except ImportError: #legacy python
+    from StringIO import StringIO as BytesIO
+
+import yaml
+from romeo.directives import Preprocessor
+
+MAIN_CONFIG = """
+- NAME: directives
+${ROMEO.include lists.yaml}
+- SERVER:
+    HOSTNAME: one
+    SERVICES: ${ROMEO.merge_lists *first,*second}
+"""
+
+INCLUDED_LISTS = """- FIRST: &first
+    - a
+    - b
+- SECOND: &second
+    - c
+"""
+
+class TestDirectives(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'includes'))
+        f = open(os.path.join(self.root, 'includes', 'lists.yaml'), 'w')
+        f.write(INCLUDED_LISTS)
+        f.close()
+        self.pp = Preprocessor(self.root)
+
+    def tearDown(self):
+        self.pp.shutdown()
+        Preprocessor.delete(self.pp)
+        shutil.rmtree(self.root, True)
+
+    def test_scan(self):
+        found = self.pp.scan(MAIN_CONFIG)
+        self.assertEqual(found, set(['merge_lists', 'include']))
+        self.assertEqual(self.pp.scan('- NAME: plain\n'), set())
+
+    def test_single_pass(self):
+        text = self.pp.pre_process(BytesIO(MAIN_CONFIG), 'main.yaml')
+        self.assertTrue('${ROMEO' not in text)
+        data = self.pp.post_process(yaml.load(text, Loader=yaml.Loader), 'main.yaml')
+        self.assertListEqual(data[3]['SERVER']['SERVICES'], ['a', 'b', 'c'])
+        stats = self.pp.statistics['main.yaml']
+        #include, then merge_lists, then the post side of merge_lists
+        self.assertEqual(stats['directives'], ['include', 'merge_lists'])
+        self.assertEqual(stats['passes'], 3)
+        self.assertTrue(stats['time'] >= 0.0)
+
+    def test_unused(self):
+        text = self.pp.pre_process(BytesIO('- NAME: plain\n'), 'plain.yaml')
+        self.assertEqual(text, '- NAME: plain\n')
+        self.assertEqual(self.pp.statistics['plain.yaml']['passes'], 0)
+
+    def write_include(self, name, data):
+        path = os.path.join(self.root, 'includes', name)
+        f = open(path, 'w')
+        f.write(data)
+        f.close()
+        return path
+
+    def test_nested_include(self):
+        self.write_include('jvm.yaml', 'JVM:\n  - ${ROMEO.include heap.yaml}\n')
+        self.write_include('heap.yaml', '-Xmx1g\n-Xms1g\n')
+        source = '- SERVER:\n    ${ROMEO.include jvm.yaml}\n'
+        text = self.pp.pre_process(BytesIO(source), 'nested.yaml')
+        self.assertEqual(text, '- SERVER:\n    JVM:\n      - -Xmx1g\n' \
+                '      -Xms1g\n')
+
+    def test_include_cache(self):
+        from romeo.directives import include
+        path = self.write_include('once.yaml', '- ONE: 1\n')
+        source = '${ROMEO.include once.yaml}\n'
+        self.pp.pre_process(BytesIO(source), 'a.yaml')
+        lines = include._cache[path][1]
+        self.pp.pre_process(BytesIO(source), 'b.yaml')
+        self.assertIs(include._cache[path][1], lines)
+        #a changed include is expanded again
+        self.write_include('once.yaml', '- ONE: 1\n- TWO: 2\n')
+        os.utime(path, (0, 0))
+        text = self.pp.pre_process(BytesIO(source), 'c.yaml')
+        self.assertEqual(text, '- ONE: 1\n- TWO: 2\n')
+
+    def test_circular_include(self):
+        from romeo.directives import include, DirectiveException
+        self.write_include('ping.yaml', '${ROMEO.include pong.yaml}\n')
+        self.write_include('pong.yaml', '${ROMEO.include ping.yaml}\n')
+        directive = [ d for d in self.pp.directives if d.name == 'include' ][0]
+        self.assertRaises(DirectiveException, directive.expand,
+                os.path.join(self.root, 'includes', 'ping.yaml'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import subprocess
+import tempfile
+import shutil
+import time
+import os
+import sys
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+LIBRARY = os.path.join(DIRECTORY,'..','lib')
+sys.path.insert(0, LIBRARY)
+
+import romeo
+from romeo.foundation import RomeoKeyValue
+
+CONFIG = """
+- NAME: query-%(name)s
+- SERVER:
+      HOSTNAME: %(name)s.example.net
+      ARTIFACTS:
+          - SHORTNAME: %(name)s-app
+"""
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.nodes = set(RomeoKeyValue.objects)
+        self.datadir = tempfile.mkdtemp()
+        for name in ('one', 'two'):
+            self.write(name)
+        env = dict(os.environ, PYTHONPATH=LIBRARY)
+        env.pop('ROMEO_SOCKET', None)
+        self.server = subprocess.Popen([sys.executable,
+                os.path.join(DIRECTORY, '..', 'bin', 'romeo-query'),
+                self.datadir], env=env)
+        self.socket = os.path.join(self.datadir, romeo.query.SOCKET_NAME)
+        for i in range(100):
+            if os.path.exists(self.socket): break
+            time.sleep(0.1)
+        self.environ = os.environ.get('ROMEO_SOCKET')
+        os.environ['ROMEO_SOCKET'] = self.socket
+
+    def tearDown(self):
+        romeo.query.disconnect()
+        if self.environ is None:
+            os.environ.pop('ROMEO_SOCKET', None)
+        else:
+            os.environ['ROMEO_SOCKET'] = self.environ
+        if self.server.poll() is None:
+            self.server.terminate()
+            self.server.wait()
+        shutil.rmtree(self.datadir, True)
+        #search is global, forget the environments this test loaded
+        romeo.entity.namespace['romeo'] = set()
+        for node in list(RomeoKeyValue.objects):
+            if node not in self.nodes:
+                RomeoKeyValue.delete(node)
+
+    def write(self, name):
+        f = open(os.path.join(self.datadir, name + '.yaml'), 'w')
+        f.write(CONFIG % {'name': name})
+        f.close()
+
+    def test_remote(self):
+        romeo.reload(datadir=self.datadir)
+        client = romeo.query.connection()
+        self.assertTrue(client)
+        #nothing is fetched until it is needed
+        self.assertEqual(client.environments, {})
+        me = romeo.whoami('one.example.net')
+        self.assertEqual(me.KEY, 'SERVER')
+        self.assertEqual(len(client.environments), 1)
+        env = romeo.getEnvironment('query-one')
+        self.assertTrue(env.isChild(me))
+        self.assertTrue(me.isAncestor(env))
+        shortnames = sorted(i.VALUE for i in romeo.grammars.search('select SHORTNAME'))
+        self.assertListEqual(shortnames, ['one-app', 'two-app'])
+        self.assertEqual(len(romeo.listEnvironments()), 2)
+        self.assertRaises(romeo.IdentityCrisis, romeo.whoami, 'nosuchhost')
+        self.assertRaises(romeo.grammars.NoMatch, romeo.grammars.search, '')
+
+    def test_changed(self):
+        romeo.reload(datadir=self.datadir)
+        self.assertRaises(romeo.EnvironmentalError, romeo.getEnvironment,
+                'query-three')
+        self.write('three')
+        env = romeo.getEnvironment('query-three')
+        self.assertTrue(env.isChild(romeo.whoami('three.example.net')))
+
+    def test_disabled(self):
+        #the server is only used when ROMEO_SOCKET names it
+        del os.environ['ROMEO_SOCKET']
+        romeo.reload(datadir=self.datadir)
+        self.assertIs(romeo.query.connection(), None)
+        self.assertEqual(romeo.whoami('two.example.net').KEY, 'SERVER')
+
+    def test_fallback(self):
+        romeo.reload(datadir=self.datadir)
+        self.assertTrue(romeo.query.connection())
+        self.server.terminate()
+        self.server.wait()
+        #the data directory is loaded locally when the server goes away
+        me = romeo.whoami('two.example.net')
+        self.assertEqual(me.KEY, 'SERVER')
+        self.assertIs(romeo.query.connection(), None)
+        self.assertTrue(romeo.getEnvironment('query-two').isChild(me))
+        shortnames = sorted(i.VALUE for i in romeo.grammars.search('select SHORTNAME'))
+        self.assertListEqual(shortnames, ['one-app', 'two-app'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import os
 import sys
+import gc
 
 DIRECTORY = os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, os.path.join(DIRECTORY,'..','lib'))
@@ -71,5 +72,56 @@ class TestRomeo(unittest.TestCase):
         self.assertIsInstance(envDict, dict)
         self.assertIs(romeo.hostdb.whoami(romeo.MYHOSTNAME).entity, romeo.whoami())
 
+    def test_hostdb_cache(self):
+        env = romeo.getEnvironment(MY_SWEET_ENVIRONMENT)
+        first = romeo.hostdb.node_constructor(env)
+        second = romeo.hostdb.node_constructor(env)
+        #one class per key signature, but every adaptation has it's own context
+        self.assertIs(first.__class__, second.__class__)
+        self.assertIsNot(first, second)
+        first['extra'] = True
+        self.assertFalse('extra' in second)
+        self.assertEqual(first.get_NAME(), MY_SWEET_ENVIRONMENT)
+        self.assertEqual(first.NAME, MY_SWEET_ENVIRONMENT)
+        self.assertIs(first.get_NOSUCHKEY(), None)
+        hostnames = sorted(s.get_HOSTNAME() for s in first.get_SERVER())
+        self.assertListEqual(hostnames, sorted([romeo.MYHOSTNAME, 'not_here']))
+
+    def test_compact_nodes(self):
+        me = romeo.whoami()
+        env = romeo.getEnvironment(MY_SWEET_ENVIRONMENT)
+        #slotted nodes do not carry an instance dictionary
+        self.assertFalse(hasattr(me, '__dict__'))
+        #descendants and ancestors are still transitive
+        hostname = romeo.foundation.RomeoKeyValue('HOSTNAME', romeo.MYHOSTNAME)
+        self.assertTrue(hostname in set(env.CHILDREN))
+        self.assertTrue(env in set(hostname.ANCESTORS))
+        self.assertTrue(me in set(hostname.RELATED))
+        self.assertTrue(env.ROOTNODE)
+        self.assertTrue(hostname.BRANCHNODE)
+
+    def test_reload_nodes(self):
+        nodes = romeo.foundation._nodes
+        sizes, counts = [], []
+        for hostname in ('changed1', 'changed2', 'changed3'):
+            f = open(self.mysweetconfig, 'wb')
+            f.write(MY_SWEET_ROMEO_CONFIG % {
+                'environment': MY_SWEET_ENVIRONMENT, 'hostname': hostname})
+            f.close()
+            romeo.reload(datadir=DIRECTORY)
+            gc.collect()
+            sizes.append(len(nodes))
+            #only the nodes of the loaded environment stay alive
+            live = [n for n in nodes if n is not None and n() is not None]
+            self.assertEqual(len(live),
+                len(list(romeo.foundation.RomeoKeyValue.objects)))
+            counts.append(len(live))
+        #replaced nodes are released and hand their ids to the next reload
+        self.assertEqual(counts[1], counts[2])
+        self.assertEqual(sizes[1], sizes[2])
+        env = romeo.getEnvironment(MY_SWEET_ENVIRONMENT)
+        hostnames = [n.VALUE for n in env.search('HOSTNAME')]
+        self.assertListEqual(sorted(hostnames), ['changed3', 'not_here'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import shutil
+import tempfile
+import os
+import sys
+
+DIRECTORY = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(DIRECTORY,'..','lib'))
+
+import romeo
+from romeo import rules
+
+SCHEMA = """
+- ROMEO:
+    ROMEO_NAME: RULES_NAME
+    ROMEO_REQUIRED: yes
+    ROMEO_SINGLETON: yes
+    ROMEO_TYPE: ''
+- ROMEO:
+    ROMEO_NAME: RULES_SERVER
+    ROMEO_REQUIRED: no
+    ROMEO_SINGLETON: no
+    ROMEO_TYPE: {}
+    ROMEO_REQUIRED_KEYS:
+        - RULES_HOST
+- ROMEO:
+    ROMEO_NAME: RULES_HOST
+    ROMEO_REQUIRED: no
+    ROMEO_SINGLETON: no
+    ROMEO_TYPE: ''
+- ROMEO: &RULES_ITEM
+    ROMEO_NAME: RULES_ITEM
+    ROMEO_REQUIRED: no
+    ROMEO_SINGLETON: no
+    ROMEO_TYPE: {}
+- ROMEO:
+    ROMEO_NAME: RULES_ITEMS
+    ROMEO_REQUIRED: no
+    ROMEO_SINGLETON: no
+    ROMEO_TYPE: []
+    ROMEO_VALUES: *RULES_ITEM
+"""
+
+VALID = """
+- RULES_NAME: %(name)s
+- RULES_SERVER:
+    RULES_HOST: %(name)s-host
+"""
+
+class TestRules(unittest.TestCase):
+    def setUp(self):
+        self.datadir = tempfile.mkdtemp()
+        rules.load(SCHEMA)
+
+    def tearDown(self):
+        shutil.rmtree(self.datadir, True)
+        for validator in list(rules._NodeValidator.objects):
+            if validator.name.startswith('RULES_'):
+                rules._NodeValidator.delete(validator)
+
+    def write(self, name, data):
+        f = open(os.path.join(self.datadir, name + '.yaml'), 'w')
+        f.write(data)
+        f.close()
+
+    def test_valid(self):
+        self.write('one', VALID % {'name': 'one'})
+        self.write('two', VALID % {'name': 'two'})
+        romeo.reload(datadir=self.datadir)
+        rules.validate(full=True)
+
+    def test_singleton(self):
+        self.write('twice', VALID % {'name': 'twice'} + '- RULES_NAME: again\n')
+        romeo.reload(datadir=self.datadir)
+        self.assertRaises(rules.InvalidNode, rules.validate, True)
+
+    def test_required_keys(self):
+        self.write('nohost', '- RULES_NAME: nohost\n- RULES_SERVER:\n' \
+                '    OTHER: value\n')
+        romeo.reload(datadir=self.datadir)
+        self.assertRaises(rules.InvalidNode, rules.validate, True)
+
+    def test_values(self):
+        self.write('items', VALID % {'name': 'items'} + \
+                '    RULES_ITEMS:\n' \
+                '      - RULES_ITEM: {OTHER: value}\n')
+        romeo.reload(datadir=self.datadir)
+        rules.validate(full=True)
+
+    def test_values_elsewhere(self):
+        #a matching key outside of the node's relations does not count
+        self.write('stray', VALID % {'name': 'stray'} + \
+                '    RULES_ITEMS:\n' \
+                '      - OTHER: value\n' \
+                '- RULES_ITEM: {OTHER: value}\n')
+        romeo.reload(datadir=self.datadir)
+        self.assertRaises(rules.InvalidNode, rules.validate, True)
+
+    def test_incremental(self):
+        self.write('first', VALID % {'name': 'first'})
+        romeo.reload(datadir=self.datadir)
+        rules.validate(full=True)
+        validated = set(rules._schema._validated)
+        self.write('second', VALID % {'name': 'second'})
+        romeo.reload(datadir=self.datadir)
+        rules.validate()
+        #only the new environment had to be validated
+        self.assertEqual(len(rules._schema._validated - validated), 1)
+
+if __name__ == '__main__':
+    unittest.main()